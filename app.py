@@ -1,26 +1,75 @@
 from flask import Flask
 from flask_login import LoginManager
 from flask_session import Session
-from models.user import db, User
+from models.user import db, snapshot_schema
 from routes.auth import auth_bp
 from routes.oauth import oauth_bp, oauth, init_oauth
+from routes.well_known import well_known_bp
+from routes.admin import admin_bp
+from routes.profile import profile_bp
 from config.config import Config
+from utils.token_cache import token_cache
+from utils.profile_cache import profile_cache
+from utils.shared_cache import shared_cache
+from utils.session_store import init_session_store
+from services.password_hasher import password_hasher
+from services.token_reaper import token_reaper
+from services.login_recorder import login_recorder
+from services.user_transfer import user_transfer
+from services.email_backfill import email_backfill
+from services.email_validation import email_validation
+from services.user_service import UserService
+from utils.metrics import metrics
+from utils.key_ring import key_ring
+from utils.revocation import revocation_set
+from utils.db_routing import configure_binds
+from utils.email_filter import email_filter
 
-def create_app():
+def create_app(config_object=Config):
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_object)
     
     # Initialize extensions
+    metrics.init_app(app)
+    configure_binds(app)
     db.init_app(app)
     oauth.init_app(app)
-    Session(app)
+    if app.config['SESSION_TYPE'] == 'sharded':
+        init_session_store(app)
+    else:
+        Session(app)
+    key_ring.init_app(app)
+    token_cache.init_app(app)
+    profile_cache.init_app(app)
+    # A change to the packed user columns moves workers to a fresh cache file
+    shared_cache.init_app(app, schema=snapshot_schema())
+    password_hasher.init_app(app)
+    token_reaper.init_app(app)
+    login_recorder.init_app(app)
+    user_transfer.init_app(app)
+    email_backfill.init_app(app)
+    email_validation.init_app(app)
+    email_filter.init_app(app)
     
     login_manager = LoginManager()
     login_manager.init_app(app)
     
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return UserService.get_user(int(user_id))
+    
+    if metrics.enabled:
+        for prefix, source in (
+            ('token_cache', token_cache),
+            ('shared_cache', shared_cache),
+            ('profile_cache', profile_cache),
+            ('revocation', revocation_set),
+            ('token_reaper', token_reaper),
+            ('email_validation', email_validation),
+            ('login_recorder', login_recorder),
+            ('email_filter', email_filter)
+        ):
+            metrics.register_stats(prefix, source.stats)
     
     # Initialize OAuth providers
     init_oauth(app)
@@ -28,10 +77,21 @@ def create_app():
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(oauth_bp, url_prefix='/oauth')
+    app.register_blueprint(well_known_bp)
+    app.register_blueprint(admin_bp, url_prefix='/admin')
+    app.register_blueprint(profile_bp, url_prefix='/profile')
+    
+    @app.cli.command('init-db')
+    def init_db():
+        """Create missing database tables"""
+        # Replicas get the schema through replication
+        db.create_all(bind_key=None)
     
-    # Create database tables
-    with app.app_context():
-        db.create_all()
+    # Schema creation is a deploy step; AUTO_CREATE_TABLES is for local dev
+    if app.config.get('AUTO_CREATE_TABLES'):
+        with app.app_context():
+            db.create_all(bind_key=None)
+    revocation_set.init_app(app)
     
     return app
 
@@ -0,0 +1,153 @@
+"""ASGI entry point, e.g. ``uvicorn --factory asgi:create_asgi_app``.
+
+OAuth callbacks are served by the async pipeline in routes/oauth_async.py
+when OAUTH_STATELESS_STATE is on; every other request goes to the Flask
+app on a thread pool.
+"""
+import asyncio
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from app import create_app
+from config.config import Config
+from routes.oauth_async import AsyncOAuthCallbacks
+from utils.http_client import async_provider_http
+
+# Request bodies above this are spooled to a temporary file
+MAX_BODY_IN_MEMORY = 1024 * 1024
+
+
+class WSGIBridge:
+    """Serves a WSGI app over ASGI, one request per thread of our own pool.
+
+    The request body is read before the app runs. The response is sent as
+    the app yields it, so streamed responses (user export) stay streamed.
+    """
+
+    def __init__(self, wsgi_app, executor):
+        self.wsgi_app = wsgi_app
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            raise ValueError('WSGI apps only serve HTTP, not %s' % scope['type'])
+        body = tempfile.SpooledTemporaryFile(max_size=MAX_BODY_IN_MEMORY)
+        try:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                body.write(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            body.seek(0)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.executor, self.run, environ_for(scope, body), loop, send)
+        finally:
+            body.close()
+
+    def run(self, environ, loop, send):
+        """Run the app on this worker thread, forwarding its response to send"""
+        response = {}
+
+        def emit(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(key.lower().encode('latin-1'), value.encode('latin-1'))
+                                   for key, value in headers]
+
+        def start():
+            if not response.get('sent'):
+                emit({'type': 'http.response.start', 'status': response['status'],
+                      'headers': response['headers']})
+                response['sent'] = True
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in result:
+                if chunk:
+                    start()
+                    emit({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            start()
+            emit({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+
+def environ_for(scope, body):
+    """PEP 3333 environ for an ASGI HTTP scope"""
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': 'HTTP/%s' % scope.get('http_version', '1.1'),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+        environ['REMOTE_PORT'] = str(scope['client'][1])
+    for key, value in scope.get('headers', ()):
+        name = key.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        value = value.decode('latin-1')
+        if name in environ:
+            value = environ[name] + ('; ' if name == 'HTTP_COOKIE' else ',') + value
+        environ[name] = value
+    return environ
+
+
+class OAuthASGIApp:
+    """Routes OAuth callbacks to the async pipeline and the rest to Flask"""
+
+    def __init__(self, app, wsgi_workers=32):
+        self.app = app
+        self.callbacks = AsyncOAuthCallbacks(app)
+        self.executor = ThreadPoolExecutor(
+            max_workers=app.config.get('ASGI_WSGI_WORKERS', wsgi_workers),
+            thread_name_prefix='wsgi'
+        )
+        self.wsgi = WSGIBridge(app.wsgi_app, self.executor)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        provider = self.callbacks.handles(scope)
+        if provider is not None:
+            return await self.callbacks(scope, receive, send, provider)
+        await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await async_provider_http.aclose()
+                self.callbacks.shutdown()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_asgi_app(config_object=Config):
+    return OAuthASGIApp(create_app(config_object))
@@ -0,0 +1,58 @@
+"""Microbenchmark of the HS256 codec against PyJWT.
+
+Encodes and decodes a typical access token with both and reports the
+time per operation and the speedup:
+
+    python -m benchmarks.jwt_codec --iterations 100000
+"""
+import argparse
+import os
+import sys
+import timeit
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jwt
+from utils.jwt_codec import HS256Codec
+
+SECRET = 'bench-secret-key'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--iterations', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5, help='Best of this many runs')
+    args = parser.parse_args(argv)
+
+    codec = HS256Codec(SECRET)
+    payload = {
+        'user_id': 12345,
+        'exp': datetime.utcnow() + timedelta(minutes=30),
+        'type': 'access',
+        'fam': uuid.uuid4().hex,
+        'jti': uuid.uuid4().hex
+    }
+    token = jwt.encode(payload, SECRET, algorithm='HS256')
+    # Same bytes either way, so tokens stay interchangeable
+    assert codec.decode(token) == jwt.decode(token, SECRET, algorithms=['HS256'])
+    assert jwt.decode(codec.encode(payload), SECRET, algorithms=['HS256']) == codec.decode(token)
+
+    cases = (
+        ('encode', lambda: jwt.encode(payload, SECRET, algorithm='HS256'), lambda: codec.encode(payload)),
+        ('decode', lambda: jwt.decode(token, SECRET, algorithms=['HS256']), lambda: codec.decode(token))
+    )
+    print('%-8s %12s %12s %8s' % ('op', 'pyjwt us', 'codec us', 'speedup'))
+    for name, baseline, fast in cases:
+        slow_us = _per_call(baseline, args.iterations, args.repeat)
+        fast_us = _per_call(fast, args.iterations, args.repeat)
+        print('%-8s %12.2f %12.2f %7.1fx' % (name, slow_us, fast_us, slow_us / fast_us))
+
+
+def _per_call(fn, iterations, repeat):
+    return min(timeit.repeat(fn, number=iterations, repeat=repeat)) / iterations * 1e6
+
+
+if __name__ == '__main__':
+    main()
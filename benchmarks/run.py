@@ -0,0 +1,264 @@
+"""End-to-end benchmark for the auth and OAuth endpoints.
+
+Runs create_app() in-process against a throwaway SQLite database and a
+local stub OAuth provider, drives each scenario at the given concurrency
+and reports throughput, p50/p95/p99 latency and SQL statements per
+request. Results can be written as a JSON baseline and diffed later:
+
+    python -m benchmarks.run --concurrency 8 --requests 400 --output baseline.json
+    python -m benchmarks.run --compare baseline.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('OAUTHLIB_INSECURE_TRANSPORT', '1')
+
+from flask import g, jsonify
+from sqlalchemy import event
+from app import create_app
+from benchmarks.stub_provider import StubOAuthProvider, PROFILE_ENDPOINTS
+from config.config import Config
+from middleware.auth_middleware import auth_required
+from models.user import User, db
+from services.auth_service import AuthService
+from utils.token_manager import TokenManager
+
+BENCH_PASSWORD = 'bench-password'
+
+
+class SQLCounter:
+    """Counts statements per thread through SQLAlchemy engine events"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def install(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self._local.count = getattr(self._local, 'count', 0) + 1
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+
+def build_app(args, stub):
+    database = os.path.join(tempfile.mkdtemp(prefix='bench-'), 'bench.db')
+    overrides = dict(stub.config_overrides())
+    overrides.update({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///%s' % database,
+        'SESSION_STORE_PATH': os.path.join(os.path.dirname(database), 'sessions.sqlite3'),
+        'BCRYPT_ROUNDS': args.bcrypt_rounds,
+        'OAUTH_STATELESS_STATE': args.stateless_oauth,
+        # Keep DNS out of the measurement
+        'EMAIL_VALIDATION_MODE': 'syntax',
+        'AUTO_CREATE_TABLES': True,
+        'TESTING': True
+    })
+    config = type('BenchConfig', (Config,), overrides)
+    app = create_app(config)
+
+    @auth_required
+    def protected():
+        return jsonify(g.user.to_dict())
+
+    app.add_url_rule('/bench/protected', 'bench_protected', protected)
+    return app
+
+
+def seed(app, users):
+    """Create users with passwords and issue tokens for them"""
+    with app.app_context():
+        password = AuthService.hash_password(BENCH_PASSWORD).decode('utf-8')
+        db.session.add_all(User(email='seed-%d@example.org' % i, name='Seed %d' % i, password=password)
+                           for i in range(users))
+        db.session.commit()
+        return [TokenManager.generate_and_store_tokens(user.id) for user in User.query.all()]
+
+
+def scenarios(app, tokens):
+    """Map scenario name to a function(client, i) that issues one request"""
+    def register(client, i):
+        return client.post('/auth/register', json={
+            'email': 'new-%d-%d@example.org' % (os.getpid(), i), 'password': BENCH_PASSWORD
+        })
+
+    def login(client, i):
+        return client.post('/auth/login', json={
+            'email': 'seed-%d@example.org' % (i % len(tokens)), 'password': BENCH_PASSWORD
+        })
+
+    def protected(client, i):
+        access_token = tokens[i % len(tokens)][0]
+        return client.get('/bench/protected', headers={'Authorization': 'Bearer %s' % access_token})
+
+    def callback(provider):
+        def run(client, i):
+            url = '/oauth/login/%s/callback?code=%s-%d' % (provider, provider, i)
+            if client.oauth_state:
+                url += '&state=' + client.oauth_state
+            return client.get(url)
+
+        def prepare(client, i):
+            # The login leg leaves the redirect URI in the session, or the
+            # handshake in a cookie that the callback's state must match
+            location = client.get('/oauth/login/%s' % provider).headers['Location']
+            client.oauth_state = parse_qs(urlsplit(location).query).get('state', [None])[0]
+        run.prepare = prepare
+        return run
+
+    chains = [refresh_token for _, refresh_token in tokens]
+    claimed = itertools.count()
+
+    def refresh(client, i):
+        # Each client rotates its own seed user's chain; sharing one would
+        # replay a spent token and revoke the family
+        if getattr(client, 'chain', None) is None:
+            client.chain = next(claimed) % len(chains)
+        response = client.post('/profile/refresh-token', json={'refresh_token': chains[client.chain]})
+        if response.status_code == 200:
+            chains[client.chain] = response.get_json()['refresh_token']
+        return response
+
+    table = {
+        'register': register,
+        'login': login,
+        'protected': protected,
+        'refresh': refresh
+    }
+    for provider in PROFILE_ENDPOINTS:
+        table['callback_%s' % provider] = callback(provider)
+    return table
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_scenario(app, counter, fn, requests, concurrency):
+    latencies = []
+    statements = []
+    errors = 0
+    lock = threading.Lock()
+    local = threading.local()
+
+    def one(i):
+        nonlocal errors
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        prepare = getattr(fn, 'prepare', None)
+        if prepare:
+            prepare(client, i)
+        counter.reset()
+        started = time.perf_counter()
+        response = fn(client, i)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            statements.append(counter.count)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': requests,
+        'errors': errors,
+        'throughput_rps': round(requests / wall, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'sql_per_request': round(sum(statements) / max(len(statements), 1), 2)
+    }
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)['scenarios']
+    print('\nvs %s' % baseline_path)
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        deltas = []
+        for metric in ('throughput_rps', 'p50_ms', 'p99_ms', 'sql_per_request'):
+            if base[metric]:
+                deltas.append('%s %+.1f%%' % (metric, (result[metric] - base[metric]) / base[metric] * 100))
+        print('  %-20s %s' % (name, '  '.join(deltas)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+    parser.add_argument('--scenarios', default=None, help='Comma-separated subset to run')
+    parser.add_argument('--seed-users', type=int, default=50)
+    parser.add_argument('--bcrypt-rounds', type=int, default=Config.BCRYPT_ROUNDS)
+    parser.add_argument('--provider-latency', type=float, default=0.0,
+                        help='Seconds of simulated latency per provider call')
+    parser.add_argument('--stateless-oauth', action='store_true',
+                        help='Carry OAuth state in a sealed cookie instead of the session')
+    parser.add_argument('--output', help='Write results as a JSON baseline')
+    parser.add_argument('--compare', help='Diff results against a JSON baseline')
+    args = parser.parse_args(argv)
+
+    stub = StubOAuthProvider(latency=args.provider_latency).start()
+    app = build_app(args, stub)
+    counter = SQLCounter()
+    with app.app_context():
+        counter.install(db.engine)
+    tokens = seed(app, args.seed_users)
+
+    table = scenarios(app, tokens)
+    selected = args.scenarios.split(',') if args.scenarios else list(table)
+    results = {}
+    print('%-20s %9s %7s %9s %9s %9s %7s' % ('scenario', 'req/s', 'errors', 'p50 ms', 'p95 ms', 'p99 ms', 'sql/req'))
+    for name in selected:
+        result = results[name] = run_scenario(app, counter, table[name], args.requests, args.concurrency)
+        print('%-20s %9.1f %7d %9.2f %9.2f %9.2f %7.2f' % (
+            name, result['throughput_rps'], result['errors'], result['p50_ms'],
+            result['p95_ms'], result['p99_ms'], result['sql_per_request']))
+    stub.stop()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                    'python': platform.python_version(),
+                    'concurrency': args.concurrency,
+                    'requests': args.requests,
+                    'bcrypt_rounds': args.bcrypt_rounds,
+                    'provider_latency': args.provider_latency,
+                    'stateless_oauth': args.stateless_oauth
+                },
+                'scenarios': results
+            }, f, indent=2, sort_keys=True)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
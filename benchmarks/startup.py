@@ -0,0 +1,61 @@
+"""Cold start benchmark: module import and create_app() time.
+
+Each run is a fresh interpreter, so nothing is cached in sys.modules.
+Reports the median and best of the runs, optionally as JSON:
+
+    python -m benchmarks.startup --runs 10 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app()
+booted = time.perf_counter()
+json.dump({'import_ms': (imported - started) * 1000, 'create_app_ms': (booted - imported) * 1000}, sys.stdout)
+'''
+
+
+def measure(env):
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output', help='Write results as JSON')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='startup-')
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite:///%s' % os.path.join(workdir, 'startup.db'))
+    env.setdefault('SESSION_STORE_PATH', os.path.join(workdir, 'sessions.sqlite3'))
+
+    runs = [measure(env) for _ in range(args.runs)]
+    results = {}
+    print('%-14s %10s %10s' % ('phase', 'median ms', 'best ms'))
+    for phase in ('import_ms', 'create_app_ms'):
+        values = [run[phase] for run in runs]
+        results[phase] = {'median': round(statistics.median(values), 2), 'best': round(min(values), 2)}
+        print('%-14s %10.2f %10.2f' % (phase[:-3], results[phase]['median'], results[phase]['best']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'runs': args.runs, 'python': sys.version.split()[0], 'phases': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
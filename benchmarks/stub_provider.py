@@ -0,0 +1,121 @@
+import json
+import threading
+import time
+import uuid
+import rsa
+from jose import jwk, jwt
+from werkzeug.serving import make_server, WSGIRequestHandler
+from werkzeug.wrappers import Request, Response
+
+# Userinfo path and payload shape per provider, as the callbacks expect them
+PROFILE_ENDPOINTS = {
+    'google': 'userinfo',
+    'facebook': 'me',
+    'github': 'user',
+    'linkedin': 'people/~'
+}
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class StubOAuthProvider:
+    """Local OAuth2/OIDC provider for benchmarks.
+
+    Serves token, userinfo and JWKS endpoints for every supported provider
+    under ``/<provider>/...`` so the app can be pointed at it through the
+    <PROVIDER>_*_URL config keys. An optional latency simulates a remote
+    provider.
+    """
+
+    def __init__(self, latency=0.0, client_id='bench-client'):
+        self.latency = latency
+        self.client_id = client_id
+        self.requests = 0
+        self._kid = uuid.uuid4().hex
+        public_key, private_key = rsa.newkeys(1024)
+        self._private_pem = private_key.save_pkcs1().decode()
+        self._jwk = jwk.construct(public_key.save_pkcs1().decode(), 'RS256').to_dict()
+        self._jwk['kid'] = self._kid
+        self._server = None
+        self.base_url = None
+
+    def start(self):
+        self._server = make_server('127.0.0.1', 0, self._wsgi, threaded=True,
+                                   request_handler=_QuietHandler)
+        self.base_url = 'http://127.0.0.1:%d' % self._server.server_port
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+    def config_overrides(self):
+        """Config keys that point every provider at this stub"""
+        config = {'GOOGLE_JWKS_URL': '%s/google/jwks' % self.base_url}
+        for provider in PROFILE_ENDPOINTS:
+            prefix = provider.upper()
+            config['%s_CLIENT_ID' % prefix] = self.client_id
+            config['%s_CLIENT_SECRET' % prefix] = 'bench-secret'
+            config['%s_BASE_URL' % prefix] = '%s/%s/' % (self.base_url, provider)
+            config['%s_ACCESS_TOKEN_URL' % prefix] = '%s/%s/token' % (self.base_url, provider)
+            config['%s_AUTHORIZE_URL' % prefix] = '%s/%s/authorize' % (self.base_url, provider)
+        config['GOOGLE_OIDC_ISSUERS'] = (self.base_url,)
+        return config
+
+    @staticmethod
+    def identity(code):
+        # The authorization code doubles as the user identity
+        return 'bench-%s' % code, 'bench-%s@example.org' % code
+
+    @Request.application
+    def _wsgi(self, request):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        provider, _, path = request.path.strip('/').partition('/')
+        if provider not in PROFILE_ENDPOINTS:
+            return Response('unknown provider', status=404)
+
+        if path == 'token':
+            code = request.values.get('code', 'anonymous')
+            access_token = 'at-%s' % code
+            payload = {'access_token': access_token, 'token_type': 'Bearer', 'expires_in': 3600}
+            if provider == 'google':
+                payload['id_token'] = self._id_token(code, access_token)
+            return self._json(payload)
+        if path == 'jwks':
+            return self._json({'keys': [self._jwk]}, headers={'Cache-Control': 'public, max-age=3600'})
+        if provider == 'github' and path == 'user/emails':
+            _, email = self.identity(request.headers.get('Authorization', 'Bearer at-anonymous').split('at-', 1)[-1])
+            return self._json([{'email': email, 'primary': True, 'verified': True}])
+        if path == PROFILE_ENDPOINTS[provider]:
+            code = request.headers.get('Authorization', 'Bearer at-anonymous').split('at-', 1)[-1]
+            user_id, email = self.identity(code)
+            if provider == 'linkedin':
+                return self._json({'id': user_id, 'emailAddress': email, 'formattedName': 'Bench User'})
+            return self._json({'id': user_id, 'email': email, 'name': 'Bench User'})
+        return Response('not found', status=404)
+
+    def _id_token(self, code, access_token):
+        user_id, email = self.identity(code)
+        now = int(time.time())
+        claims = {
+            'iss': self.base_url,
+            'aud': self.client_id,
+            'sub': user_id,
+            'email': email,
+            'email_verified': True,
+            'name': 'Bench User',
+            'iat': now,
+            'exp': now + 3600
+        }
+        return jwt.encode(claims, self._private_pem, algorithm='RS256',
+                          headers={'kid': self._kid}, access_token=access_token)
+
+    @staticmethod
+    def _json(payload, headers=None):
+        return Response(json.dumps(payload), content_type='application/json', headers=headers)
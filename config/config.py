@@ -9,9 +9,28 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY') or 'dev-key-please-change'
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Run create_all on boot instead of `flask init-db` (local development)
+    AUTO_CREATE_TABLES = os.getenv('AUTO_CREATE_TABLES', 'false').lower() == 'true'
+    # Comma-separated read replica URLs; SELECTs go there, writes to the primary
+    SQLALCHEMY_REPLICA_URIS = os.getenv('DATABASE_REPLICA_URLS')
+    # Per-bind pool overrides as JSON, e.g. {"replica_0": {"pool_size": 20}}
+    SQLALCHEMY_BIND_OPTIONS = os.getenv('SQLALCHEMY_BIND_OPTIONS')
     
-    # Session configuration
-    SESSION_TYPE = 'filesystem'
+    # Connection pool for every bind (sizing is ignored for SQLite)
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    
+    # Session configuration ('sharded' or any Flask-Session type)
+    SESSION_TYPE = os.getenv('SESSION_TYPE', 'sharded')
+    # Defaults to sessions.sqlite3 in the app's instance folder
+    SESSION_STORE_PATH = os.getenv('SESSION_STORE_PATH')
+    SESSION_SHARDS = int(os.getenv('SESSION_SHARDS', 16))
+    # Sessions kept in memory across all shards; the rest are read from SQLite
+    SESSION_MEMORY_SIZE = int(os.getenv('SESSION_MEMORY_SIZE', 100000))
+    SESSION_COMPACT_INTERVAL = int(os.getenv('SESSION_COMPACT_INTERVAL', 60))
     PERMANENT_SESSION_LIFETIME = timedelta(days=30)
     
     # Frontend URL for redirects
@@ -21,12 +40,109 @@ class Config:
     ACCESS_TOKEN_LIFETIME = timedelta(minutes=30)
     REFRESH_TOKEN_LIFETIME = timedelta(days=30)
     
+    # Prometheus-style /metrics endpoint and hot-path timing
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+    # Bearer token for scraping /metrics; the endpoint is off without one
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    
+    # JWT signing: HS256 with SECRET_KEY unless a key ring manifest is given
+    JWT_KEY_RING = os.getenv('JWT_KEY_RING')
+    JWT_KEY_PUBLISH_AHEAD = timedelta(hours=int(os.getenv('JWT_KEY_PUBLISH_AHEAD_HOURS', 24)))
+    JWT_ACCEPT_LEGACY_HS256 = os.getenv('JWT_ACCEPT_LEGACY_HS256', 'false').lower() == 'true'
+    JWKS_MAX_AGE = int(os.getenv('JWKS_MAX_AGE', 3600))
+    
+    # 'stateful' checks UserToken on every verify, 'stateless' checks an
+    # in-process revocation set synced from RevocationEvent instead
+    TOKEN_VERIFICATION_MODE = os.getenv('TOKEN_VERIFICATION_MODE', 'stateful')
+    REVOCATION_POLL_INTERVAL = float(os.getenv('REVOCATION_POLL_INTERVAL', 1))
+    REVOCATION_BLOOM_CAPACITY = int(os.getenv('REVOCATION_BLOOM_CAPACITY', 100000))
+    REVOCATION_BLOOM_ERROR_RATE = 0.001
+    
+    # Verified access token cache (0 disables). With SHARED_CACHE_PATH set a
+    # revocation reaches every worker at once; without it other workers may
+    # accept a revoked token for up to TOKEN_CACHE_TTL seconds
+    TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+    TOKEN_CACHE_TTL = timedelta(seconds=int(os.getenv('TOKEN_CACHE_TTL', 10)))
+    
+    # Serialized /profile/me payloads by user version (0 disables)
+    PROFILE_CACHE_SIZE = int(os.getenv('PROFILE_CACHE_SIZE', 10000))
+    
+    # Host-wide cache shared by all workers through an mmap'd file, e.g.
+    # /dev/shm/oauth-cache (unset disables; needs fcntl, so not on Windows).
+    # The file name gets a layout suffix; files of past deploys can be removed
+    # once no worker runs them
+    SHARED_CACHE_PATH = os.getenv('SHARED_CACHE_PATH')
+    SHARED_CACHE_SLOTS = int(os.getenv('SHARED_CACHE_SLOTS', 65536))
+    SHARED_CACHE_SLOT_SIZE = int(os.getenv('SHARED_CACHE_SLOT_SIZE', 512))
+    SHARED_CACHE_TTL = timedelta(seconds=int(os.getenv('SHARED_CACHE_TTL', 300)))
+    
+    # Expired token reaper (interval in seconds, 0 disables the in-process scheduler)
+    TOKEN_REAPER_INTERVAL = int(os.getenv('TOKEN_REAPER_INTERVAL', 0))
+    TOKEN_REAPER_BATCH_SIZE = int(os.getenv('TOKEN_REAPER_BATCH_SIZE', 1000))
+    TOKEN_REAPER_PAUSE = float(os.getenv('TOKEN_REAPER_PAUSE', 0.05))
+    TOKEN_REAPER_INACTIVE_GRACE = timedelta(hours=int(os.getenv('TOKEN_REAPER_INACTIVE_GRACE_HOURS', 24)))
+    
+    # Queue last_login updates and login audits, flushed in bulk in the background
+    # (audits are only kept in this mode)
+    LOGIN_WRITE_BEHIND = os.getenv('LOGIN_WRITE_BEHIND', 'false').lower() == 'true'
+    LOGIN_FLUSH_INTERVAL = float(os.getenv('LOGIN_FLUSH_INTERVAL', 1))
+    LOGIN_QUEUE_HIGH_WATER = int(os.getenv('LOGIN_QUEUE_HIGH_WATER', 5000))
+    
+    # Email checks on register: 'syntax', 'cached' (domain MX lookups
+    # through a TTL cache, undeliverable domains are rejected) or 'async'
+    # (accepted, then verified in the background into User.email_deliverable)
+    EMAIL_VALIDATION_MODE = os.getenv('EMAIL_VALIDATION_MODE', 'cached')
+    EMAIL_DOMAIN_CACHE_TTL = int(os.getenv('EMAIL_DOMAIN_CACHE_TTL', 3600))
+    EMAIL_DOMAIN_NEGATIVE_TTL = int(os.getenv('EMAIL_DOMAIN_NEGATIVE_TTL', 300))
+    EMAIL_DNS_TIMEOUT = float(os.getenv('EMAIL_DNS_TIMEOUT', 2))
+    
+    # Bloom filter of registered emails so most signups skip the lookup;
+    # EMAIL_FILTER_PATH is the snapshot written by `flask rebuild-email-filter`
+    EMAIL_FILTER_ENABLED = os.getenv('EMAIL_FILTER_ENABLED', 'true').lower() == 'true'
+    EMAIL_FILTER_CAPACITY = int(os.getenv('EMAIL_FILTER_CAPACITY', 1000000))
+    EMAIL_FILTER_ERROR_RATE = float(os.getenv('EMAIL_FILTER_ERROR_RATE', 0.01))
+    EMAIL_FILTER_PATH = os.getenv('EMAIL_FILTER_PATH')
+    
+    # Bulk user import/export; the /admin API is disabled without a token
+    ADMIN_API_TOKEN = os.getenv('ADMIN_API_TOKEN')
+    USER_TRANSFER_CHUNK_SIZE = int(os.getenv('USER_TRANSFER_CHUNK_SIZE', 1000))
+    
+    # Password hashing
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+    BCRYPT_WORKERS = int(os.getenv('BCRYPT_WORKERS', os.cpu_count() or 2))
+    BCRYPT_QUEUE_DEPTH = int(os.getenv('BCRYPT_QUEUE_DEPTH', 32))
+    BCRYPT_RETRY_AFTER = int(os.getenv('BCRYPT_RETRY_AFTER', 1))
+    
     # OAuth Configs
     GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
     GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
+    GOOGLE_OIDC = os.getenv('GOOGLE_OIDC', 'true').lower() == 'true'
+    GOOGLE_JWKS_URL = os.getenv('GOOGLE_JWKS_URL', 'https://www.googleapis.com/oauth2/v3/certs')
+    GOOGLE_OIDC_ISSUERS = ('https://accounts.google.com', 'accounts.google.com')
+    GOOGLE_OIDC_ALGORITHMS = ('RS256',)
     FACEBOOK_CLIENT_ID = os.getenv('FACEBOOK_CLIENT_ID')
     FACEBOOK_CLIENT_SECRET = os.getenv('FACEBOOK_CLIENT_SECRET')
     GITHUB_CLIENT_ID = os.getenv('GITHUB_CLIENT_ID')
     GITHUB_CLIENT_SECRET = os.getenv('GITHUB_CLIENT_SECRET')
     LINKEDIN_CLIENT_ID = os.getenv('LINKEDIN_CLIENT_ID')
-    LINKEDIN_CLIENT_SECRET = os.getenv('LINKEDIN_CLIENT_SECRET')
\ No newline at end of file
+    LINKEDIN_CLIENT_SECRET = os.getenv('LINKEDIN_CLIENT_SECRET')
+    
+    # Extra providers or overrides of the built-in ones, as JSON keyed by
+    # provider name (see utils/oauth_providers.py); each needs <NAME>_CLIENT_ID
+    OAUTH_PROVIDERS = os.getenv('OAUTH_PROVIDERS')
+    
+    # Keep OAuth state, PKCE verifier and next_url in a sealed cookie
+    # instead of the server-side session
+    OAUTH_STATELESS_STATE = os.getenv('OAUTH_STATELESS_STATE', 'false').lower() == 'true'
+    OAUTH_STATE_MAX_AGE = int(os.getenv('OAUTH_STATE_MAX_AGE', 600))
+    
+    # Outbound provider HTTP client
+    OAUTH_HTTP_POOL_SIZE = int(os.getenv('OAUTH_HTTP_POOL_SIZE', 20))
+    OAUTH_HTTP_CONNECT_TIMEOUT = float(os.getenv('OAUTH_HTTP_CONNECT_TIMEOUT', 3))
+    OAUTH_HTTP_READ_TIMEOUT = float(os.getenv('OAUTH_HTTP_READ_TIMEOUT', 10))
+    OAUTH_HTTP_RETRIES = int(os.getenv('OAUTH_HTTP_RETRIES', 2))
+    
+    # ASGI entry point (asgi.py): async OAuth callbacks and the Flask fallback
+    ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv('ASYNC_HTTP_MAX_CONNECTIONS', 100))
+    ASYNC_DB_WORKERS = int(os.getenv('ASYNC_DB_WORKERS', 16))
+    ASGI_WSGI_WORKERS = int(os.getenv('ASGI_WSGI_WORKERS', 32))
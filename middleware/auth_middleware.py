@@ -1,7 +1,7 @@
+import hmac
 from functools import wraps
-from flask import request, jsonify, g
+from flask import request, jsonify, g, current_app
 from utils.token_manager import TokenManager
-from models.user import User
 
 def auth_required(f):
     @wraps(f)
@@ -12,17 +12,34 @@ def auth_required(f):
             return jsonify({'error': 'No token provided'}), 401
         
         token = auth_header.split(' ')[1]
-        user_id = TokenManager.verify_token(token)
+        user_id, user = TokenManager.authenticate(token)
         
         if user_id == 'expired':
             return jsonify({'error': 'Token expired', 'code': 'TOKEN_EXPIRED'}), 401
         if not user_id:
             return jsonify({'error': 'Invalid token'}), 401
-            
-        user = User.query.get(user_id)
         if not user:
             return jsonify({'error': 'User not found'}), 401
             
         g.user = user
         return f(*args, **kwargs)
     return decorated
+
+def static_token_required(config_key):
+    """Require the bearer token set in config_key; the endpoint is off without one"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            expected = current_app.config.get(config_key)
+            if not expected:
+                return jsonify({'error': 'Not found'}), 404
+            
+            auth_header = request.headers.get('Authorization', '')
+            token = auth_header[len('Bearer '):] if auth_header.startswith('Bearer ') else ''
+            if not hmac.compare_digest(token.encode('utf-8'), expected.encode('utf-8')):
+                return jsonify({'error': 'Invalid token'}), 401
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+admin_required = static_token_required('ADMIN_API_TOKEN')
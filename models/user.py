@@ -1,17 +1,63 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
 from datetime import datetime
+import hashlib
+import json
+from utils.db_routing import RoutingSession
 
-db = SQLAlchemy()
+# Reads may go to a replica, see utils.db_routing
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class UserToken(db.Model):
+    """A token family: one login and every token refreshed from it.
+
+    Access tokens carry the family id and stay valid while the family is
+    active, so minting one writes nothing. Each refresh rotates
+    refresh_digest and bumps generation.
+    """
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    access_token = db.Column(db.String(500), nullable=False)
-    refresh_token = db.Column(db.String(500), nullable=False)
+    family_id = db.Column(db.String(32), nullable=False, unique=True)
+    # SHA-256 hex digest of the current refresh token, never the token itself
+    refresh_digest = db.Column(db.String(64), nullable=False, unique=True)
+    generation = db.Column(db.Integer, nullable=False, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    expires_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
     is_active = db.Column(db.Boolean, default=True)
+    
+    __table_args__ = (
+        # Partial index for the "active tokens of a user" predicate
+        db.Index(
+            'ix_user_token_active_user', 'user_id',
+            postgresql_where=db.text('is_active'),
+            sqlite_where=db.text('is_active')
+        ),
+        # Lets the token reaper find deactivated rows without a full scan
+        db.Index(
+            'ix_user_token_inactive_created', 'created_at',
+            postgresql_where=db.text('NOT is_active'),
+            sqlite_where=db.text('NOT is_active')
+        ),
+    )
+
+class RevocationEvent(db.Model):
+    """Append-only log of revoked token families, polled by every worker"""
+    id = db.Column(db.Integer, primary_key=True)
+    family_id = db.Column(db.String(32), nullable=False)
+    # No access token of the family outlives this point, so neither does the event
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class LoginAudit(db.Model):
+    """One row per successful OAuth login"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    provider = db.Column(db.String(20), nullable=False)
+    ip = db.Column(db.String(45))
+    user_agent = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 class UserOAuthProvider(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -24,13 +70,29 @@ class UserOAuthProvider(db.Model):
         db.UniqueConstraint('user_id', 'provider', name='unique_user_provider'),
     )
 
+def normalize_email(email):
+    """Lookup key for an address: addresses differing only in case are one account"""
+    return email.strip().lower()
+
+
+def _normalized_email_default(context):
+    return normalize_email(context.get_current_parameters()['email'])
+
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    email = db.Column(db.String(120), unique=True, nullable=False)
+    # As entered; every lookup and uniqueness check uses email_normalized
+    email = db.Column(db.String(120), nullable=False)
+    email_normalized = db.Column(db.String(120), unique=True, nullable=False,
+                                 default=_normalized_email_default)
     password = db.Column(db.String(200))
     name = db.Column(db.String(120))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime)
+    # None until the email domain has been checked
+    email_deliverable = db.Column(db.Boolean)
+    # Bumped whenever to_dict() changes; keys the cached profile and its ETag
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     
     # Relationships
     oauth_providers = db.relationship('UserOAuthProvider', backref='user', lazy=True)
@@ -43,4 +105,86 @@ class User(UserMixin, db.Model):
             'name': self.name,
             'oauth_providers': [{'provider': p.provider} for p in self.oauth_providers],
             'last_login': self.last_login.isoformat() if self.last_login else None
-        }
\ No newline at end of file
+        }
+    
+    def to_snapshot(self):
+        """Plain column values, safe to keep outside the session"""
+        snapshot = _columns(self)
+        # Only carry providers along when they are already loaded
+        if 'oauth_providers' in self.__dict__:
+            snapshot['oauth_providers'] = [_columns(p) for p in self.oauth_providers]
+        return snapshot
+    
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """Attach a snapshot to the current session without querying"""
+        snapshot = dict(snapshot)
+        providers = snapshot.pop('oauth_providers', None)
+        user = _attach(cls(**snapshot))
+        if providers is not None and 'oauth_providers' not in user.__dict__:
+            set_committed_value(user, 'oauth_providers',
+                                [_attach(UserOAuthProvider(**p)) for p in providers])
+        return user
+
+
+# Credentials never leave the process in a packed snapshot
+_UNPACKED_COLUMNS = {'password'}
+
+
+def pack_snapshot(snapshot):
+    """Compact bytes for a User snapshot, columns by position"""
+    record = _pack_row(User, snapshot)
+    if 'oauth_providers' in snapshot:
+        record.append([_pack_row(UserOAuthProvider, p) for p in snapshot['oauth_providers']])
+    return json.dumps(record, separators=(',', ':')).encode('utf-8')
+
+
+def unpack_snapshot(data):
+    """Inverse of pack_snapshot; packed-out columns load lazily on access"""
+    record = json.loads(data)
+    columns = _packed_columns(User)
+    snapshot = _unpack_row(columns, record)
+    if len(record) > len(columns):
+        snapshot['oauth_providers'] = [_unpack_row(_packed_columns(UserOAuthProvider), p)
+                                       for p in record[-1]]
+    return snapshot
+
+
+def snapshot_schema():
+    """Digest of the packed snapshot layout; changes with any packed column"""
+    layout = ';'.join(','.join('%s:%s' % (column.name, column.type) for column in _packed_columns(model))
+                      for model in (User, UserOAuthProvider))
+    return hashlib.blake2b(layout.encode('utf-8'), digest_size=8).digest()
+
+
+def _packed_columns(model):
+    return [column for column in model.__table__.columns if column.name not in _UNPACKED_COLUMNS]
+
+
+def _pack_row(model, values):
+    row = []
+    for column in _packed_columns(model):
+        value = values.get(column.name)
+        row.append(value.isoformat() if isinstance(value, datetime) else value)
+    return row
+
+
+def _unpack_row(columns, row):
+    values = {}
+    for column, value in zip(columns, row):
+        if value is not None and isinstance(column.type, db.DateTime):
+            value = datetime.fromisoformat(value)
+        values[column.name] = value
+    return values
+
+
+def _columns(instance):
+    # Loaded values only, so unloaded columns are not fetched just to copy them
+    state = instance.__dict__
+    return {column.name: state[column.name] for column in instance.__table__.columns
+            if column.name in state}
+
+
+def _attach(instance):
+    make_transient_to_detached(instance)
+    return db.session.merge(instance, load=False)
@@ -1,8 +1,14 @@
 from flask import Blueprint
 from .auth import auth_bp
 from .oauth import oauth_bp
+from .well_known import well_known_bp
+from .admin import admin_bp
+from .profile import profile_bp
 
 # You can add any shared route utilities here if needed
 def init_routes(app):
     app.register_blueprint(auth_bp, url_prefix='/auth')
-    app.register_blueprint(oauth_bp, url_prefix='/oauth')
\ No newline at end of file
+    app.register_blueprint(oauth_bp, url_prefix='/oauth')
+    app.register_blueprint(well_known_bp)
+    app.register_blueprint(admin_bp, url_prefix='/admin')
+    app.register_blueprint(profile_bp, url_prefix='/profile')
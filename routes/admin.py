@@ -0,0 +1,41 @@
+import io
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from middleware.auth_middleware import admin_required
+from services.user_transfer import user_transfer, FORMATS
+
+admin_bp = Blueprint('admin', __name__)
+
+MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+@admin_bp.route('/users/import', methods=['POST'])
+@admin_required
+def import_users():
+    """Bulk import users from an NDJSON or CSV request body.
+
+    The body is read as a stream, so large files are never buffered.
+    Rows with errors are listed in the report and do not stop the import.
+    """
+    fmt = 'csv' if request.mimetype == 'text/csv' else request.args.get('format', 'ndjson')
+    if fmt not in FORMATS:
+        return jsonify({'error': 'Unsupported format'}), 400
+
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    chunk_size = request.args.get('chunk_size', type=int)
+    report = user_transfer.import_users(user_transfer.read(stream, fmt), chunk_size=chunk_size)
+    return jsonify(report.to_dict())
+
+@admin_bp.route('/users/export', methods=['GET'])
+@admin_required
+def export_users():
+    """Stream all users as NDJSON or CSV"""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in FORMATS:
+        return jsonify({'error': 'Unsupported format'}), 400
+
+    include_passwords = request.args.get('include_passwords') == 'true'
+    rows = user_transfer.export_users(include_passwords=include_passwords)
+    return Response(
+        stream_with_context(user_transfer.serialize(rows, fmt)),
+        mimetype=MIMETYPES[fmt],
+        headers={'Content-Disposition': 'attachment; filename=users.%s' % fmt}
+    )
@@ -1,8 +1,13 @@
-from flask import Blueprint, request, jsonify, session
-from models.user import User, db
+from flask import Blueprint, request, jsonify
+from models.user import User, db, normalize_email
 from services.auth_service import AuthService
+from services.user_service import UserService
+from services.email_validation import email_validation
+from utils.email_filter import email_filter
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import set_committed_value
 from flask_login import login_user, logout_user, login_required
-from email_validator import validate_email, EmailNotValidError
+from email_validator import EmailNotValidError
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -11,37 +16,64 @@ def register():
     data = request.json
     
     try:
-        # Validate email
-        validate_email(data['email'])
+        # Validate email; DNS only as EMAIL_VALIDATION_MODE allows
+        _, deliverable = email_validation.validate(data['email'])
     except EmailNotValidError:
         return jsonify({'error': 'Invalid email'}), 400
     
-    if User.query.filter_by(email=data['email']).first():
+    # The filter rules out most new addresses without a query; the unique
+    # index catches whatever it misses
+    email = normalize_email(data['email'])
+    if email_filter.might_exist(email) and UserService.email_exists(email):
         return jsonify({'error': 'Email already registered'}), 400
     
     user = User(
         email=data['email'],
+        email_normalized=email,
         password=AuthService.hash_password(data['password']).decode('utf-8'),
-        name=data.get('name', '')
+        name=data.get('name', ''),
+        email_deliverable=deliverable
     )
     
     db.session.add(user)
-    db.session.commit()
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        # Registered through another worker; answer the next attempt without a hash
+        email_filter.add(email)
+        return jsonify({'error': 'Email already registered'}), 400
     
+    # A new user has no providers; serialize before commit expires the row
+    set_committed_value(user, 'oauth_providers', [])
     token = AuthService.generate_token(user.id)
-    return jsonify({'token': token, 'user': user.to_dict()})
+    user_data = user.to_dict()
+    user_id = user.id
+    db.session.commit()
+    email_filter.add(email)
+    
+    if deliverable is None:
+        email_validation.verify_later(user_id, data['email'])
+    return jsonify({'token': token, 'user': user_data})
 
 @auth_bp.route('/login', methods=['POST'])
 def login():
     data = request.json
-    user = User.query.filter_by(email=data['email']).first()
+    user = UserService.get_user_by_email(data['email'])
     
     if not user or not AuthService.check_password(data['password'], user.password.encode('utf-8')):
         return jsonify({'error': 'Invalid credentials'}), 401
     
+    user_data = user.to_dict()
+    
+    # Upgrade hashes made with an outdated bcrypt cost
+    if AuthService.needs_rehash(user.password):
+        user.password = AuthService.hash_password(data['password']).decode('utf-8')
+        db.session.commit()
+    
     login_user(user)
     token = AuthService.generate_token(user.id)
-    return jsonify({'token': token, 'user': user.to_dict()})
+    return jsonify({'token': token, 'user': user_data})
 
 @auth_bp.route('/logout', methods=['POST'])
 @login_required
@@ -1,263 +1,178 @@
 # routes/oauth.py
-from flask import Blueprint, request, jsonify, current_app, url_for, redirect, session
-from flask_oauthlib.client import OAuth
-from models.user import User, UserOAuthProvider, db  # Import UserOAuthProvider here
-from services.auth_service import AuthService
 from datetime import datetime
+from flask import Blueprint, request, jsonify, url_for, redirect, session, after_this_request
+from flask_oauthlib.client import OAuth, OAuthException
+from models.user import db, normalize_email
+from services.user_service import UserService
+from services.login_recorder import login_recorder
 from utils.token_manager import TokenManager
+from utils.http_client import provider_http, async_provider_http
+from utils.oauth_providers import providers
+from utils.oauth_state import oauth_handshake
+from utils.email_filter import email_filter
 
 
 oauth = OAuth()
 oauth_bp = Blueprint('oauth', __name__)
 
 def init_oauth(app):
-    """Initialize OAuth providers with the app context"""
-    
-    # Google OAuth setup
-    google = oauth.remote_app(
-        'google',
-        consumer_key=app.config.get('GOOGLE_CLIENT_ID'),
-        consumer_secret=app.config.get('GOOGLE_CLIENT_SECRET'),
-        request_token_params={'scope': 'email profile'},
-        base_url='https://www.googleapis.com/oauth2/v1/',
-        request_token_url=None,
-        access_token_method='POST',
-        access_token_url='https://accounts.google.com/o/oauth2/token',
-        authorize_url='https://accounts.google.com/o/oauth2/auth'
-    )
-
-    # Facebook OAuth setup
-    facebook = oauth.remote_app(
-        'facebook',
-        consumer_key=app.config.get('FACEBOOK_CLIENT_ID'),
-        consumer_secret=app.config.get('FACEBOOK_CLIENT_SECRET'),
-        request_token_params={'scope': 'email'},
-        base_url='https://graph.facebook.com/',
-        request_token_url=None,
-        access_token_url='/oauth/access_token',
-        access_token_method='GET',
-        authorize_url='https://www.facebook.com/dialog/oauth'
-    )
-
-    # GitHub OAuth setup
-    github = oauth.remote_app(
-        'github',
-        consumer_key=app.config.get('GITHUB_CLIENT_ID'),
-        consumer_secret=app.config.get('GITHUB_CLIENT_SECRET'),
-        request_token_params={'scope': 'user:email'},
-        base_url='https://api.github.com/',
-        request_token_url=None,
-        access_token_method='POST',
-        access_token_url='https://github.com/login/oauth/access_token',
-        authorize_url='https://github.com/login/oauth/authorize'
-    )
-
-    # LinkedIn OAuth setup
-    linkedin = oauth.remote_app(
-        'linkedin',
-        consumer_key=app.config.get('LINKEDIN_CLIENT_ID'),
-        consumer_secret=app.config.get('LINKEDIN_CLIENT_SECRET'),
-        request_token_params={'scope': 'r_liteprofile r_emailaddress'},
-        base_url='https://api.linkedin.com/v2/',
-        request_token_url=None,
-        access_token_method='POST',
-        access_token_url='https://www.linkedin.com/oauth/v2/accessToken',
-        authorize_url='https://www.linkedin.com/oauth/v2/authorization'
-    )
-
-    # Token getters
-    @google.tokengetter
-    def get_google_oauth_token():
-        return session.get('google_token')
-
-    @facebook.tokengetter
-    def get_facebook_oauth_token():
-        return session.get('facebook_token')
-
-    @github.tokengetter
-    def get_github_oauth_token():
-        return session.get('github_token')
-
-    @linkedin.tokengetter
-    def get_linkedin_oauth_token():
-        return session.get('linkedin_token')
-
-    # Store providers in app context
-    app.google = google
-    app.facebook = facebook
-    app.github = github
-    app.linkedin = linkedin
+    """Set up the provider HTTP clients and registry; providers are built on first use"""
+    provider_http.init_app(app)
+    async_provider_http.init_app(app)
+    oauth_handshake.init_app(app)
+    providers.init_app(app, oauth)
+
+def _verified_claims(name, resp):
+    """Claims of a locally verified id_token, or None to fall back to userinfo"""
+    verifier = providers.oidc(name)
+    if verifier is None or not resp.get('id_token'):
+        return None
+    claims = verifier.verify(resp['id_token'], access_token=resp.get('access_token'))
+    if not claims or not claims.get('email') or claims.get('email_verified') is False:
+        return None
+    return claims
+
+def _callback_url(name):
+    return url_for('oauth.oauth_callback', provider=name, _external=True)
+
+def _complete_login(name):
+    """Token response and next_url for a provider callback.
+
+    In stateless mode both come from the sealed handshake cookie and the
+    code exchange carries the PKCE verifier; otherwise they come from the
+    session as before. The response is None when the provider denied
+    access or the handshake does not check out.
+    """
+    remote = providers.get(name)
+    if not oauth_handshake.enabled:
+        resp = remote.authorized_response()
+        return resp, session.pop('next_url', None)
+
+    handshake = oauth_handshake.complete(name, request.args.get('state'),
+                                        request.cookies.get(oauth_handshake.cookie_name))
+    after_this_request(oauth_handshake.clear_cookie)
+    if handshake is None or 'code' not in request.args:
+        return None, None
+    resp = remote.exchange_code(request.args['code'], _callback_url(name),
+                                code_verifier=handshake['verifier'])
+    return resp, handshake.get('next')
+
+def _fetch_profile(name, resp, url):
+    """Call a provider API with the access token from resp"""
+    remote = providers.get(name)
+    token = (resp['access_token'], '')
+    if oauth_handshake.enabled:
+        return remote.get(url, token=token)
+    session['%s_token' % name] = token
+    return remote.get(url)
 
 # OAuth routes
-from flask import request, session, url_for, jsonify, current_app
-from flask_oauthlib.client import OAuth
-
-# Assuming OAuth setup has been done previously for all providers (Google, LinkedIn, Facebook, GitHub)
 
 @oauth_bp.route('/login/<provider>')
 def oauth_login(provider):
     """
     Initiates the OAuth login flow for the specified provider.
-    The 'next' parameter is stored in the session to redirect the user after successful authentication.
+    The 'next' parameter is kept in the session, or in the sealed handshake
+    cookie in stateless mode, to redirect the user after successful authentication.
     """
+    remote = providers.get(provider)
+    if remote is None:
+        return jsonify({'error': 'Provider not supported'}), 400
     next_url = request.args.get('next')
+    
+    if oauth_handshake.enabled:
+        state, code_challenge, sealed = oauth_handshake.begin(provider, next_url)
+        response = redirect(remote.authorize_url_for(
+            _callback_url(provider),
+            state,
+            code_challenge=code_challenge,
+            code_challenge_method='S256'
+        ))
+        oauth_handshake.set_cookie(response, sealed)
+        return response
+    
     if next_url:
         session['next_url'] = next_url
-    
-    if provider == 'google':
-        return current_app.google.authorize(callback=url_for('oauth.google_callback', _external=True))
-    elif provider == 'linkedin':
-        return current_app.linkedin.authorize(callback=url_for('oauth.linkedin_callback', _external=True))
-    elif provider == 'facebook':
-        return current_app.facebook.authorize(callback=url_for('oauth.facebook_callback', _external=True))
-    elif provider == 'github':
-        return current_app.github.authorize(callback=url_for('oauth.github_callback', _external=True))
-    else:
-        return jsonify({'error': 'Provider not supported'}), 400
+    return remote.authorize(callback=_callback_url(provider))
 
-@oauth_bp.route('/login/google/callback')
-def google_callback():
+@oauth_bp.route('/login/<provider>/callback')
+def oauth_callback(provider):
     """
-    Handles the callback from Google OAuth.
-    Retrieves user info and processes the user data, then redirects accordingly.
+    Handles the callback from any configured provider.
+    OIDC providers are identified from the verified id_token, the others
+    from their profile API, then the user is logged in.
     """
-    resp = current_app.google.authorized_response()
+    if providers.get(provider) is None:
+        return jsonify({'error': 'Provider not supported'}), 400
+    resp, next_url = _complete_login(provider)
     if resp is None or resp.get('access_token') is None:
         return jsonify({'error': 'Access denied'}), 401
     
-    session['google_token'] = (resp['access_token'], '')
-    me = current_app.google.get('userinfo')
-    
-    next_url = session.pop('next_url', None)
-    return handle_oauth_user(
-        email=me.data['email'],
-        name=me.data['name'],
-        provider='google',
-        provider_id=me.data['id'],
-        next_url=next_url
-    )
-
-@oauth_bp.route('/login/linkedin/callback')
-def linkedin_callback():
-    """
-    Handles the callback from LinkedIn OAuth.
-    Retrieves user info and processes the user data, then redirects accordingly.
-    """
-    resp = current_app.linkedin.authorized_response()
-    if resp is None or resp.get('access_token') is None:
-        return jsonify({'error': 'Access denied'}), 401
+    # Identity straight from the verified id_token, no userinfo round trip
+    claims = _verified_claims(provider, resp)
+    if claims is not None:
+        return handle_oauth_user(
+            email=claims['email'],
+            name=claims.get('name'),
+            provider=provider,
+            provider_id=claims['sub'],
+            next_url=next_url
+        )
     
-    session['linkedin_token'] = (resp['access_token'], '')
-    me = current_app.linkedin.get('people/~')
+    profiles = [_fetch_profile(provider, resp, path).data for path in providers.profile_paths(provider)]
+    # Only needed when the profile hides the email, e.g. a private GitHub address
+    profiles += [_fetch_profile(provider, resp, path).data
+                 for path in providers.email_paths(provider, profiles)]
+    email, name, provider_id = providers.identity(provider, profiles)
     
-    next_url = session.pop('next_url', None)
     return handle_oauth_user(
-        email=me.data['emailAddress'],
-        name=me.data['formattedName'],
-        provider='linkedin',
-        provider_id=me.data['id'],
+        email=email,
+        name=name,
+        provider=provider,
+        provider_id=provider_id,
         next_url=next_url
     )
 
-@oauth_bp.route('/login/facebook/callback')
-def facebook_callback():
-    """
-    Handles the callback from Facebook OAuth.
-    Retrieves user info and processes the user data, then redirects accordingly.
-    """
-    resp = current_app.facebook.authorized_response()
-    if resp is None or resp.get('access_token') is None:
-        return jsonify({'error': 'Access denied'}), 401
-    
-    session['facebook_token'] = (resp['access_token'], '')
-    me = current_app.facebook.get('me?fields=id,name,email')
-    
-    next_url = session.pop('next_url', None)
-    return handle_oauth_user(
-        email=me.data['email'],
-        name=me.data['name'],
-        provider='facebook',
-        provider_id=me.data['id'],
-        next_url=next_url
-    )
 
-@oauth_bp.route('/login/github/callback')
-def github_callback():
-    """
-    Handles the callback from GitHub OAuth.
-    Retrieves user info and processes the user data, then redirects accordingly.
-    """
-    resp = current_app.github.authorized_response()
-    if resp is None or resp.get('access_token') is None:
-        return jsonify({'error': 'Access denied'}), 401
-    
-    session['github_token'] = (resp['access_token'], '')
-    me = current_app.github.get('user')
-    
-    next_url = session.pop('next_url', None)
-    return handle_oauth_user(
-        email=me.data['email'],
-        name=me.data['name'],
-        provider='github',
-        provider_id=me.data['id'],
-        next_url=next_url
-    )
+@oauth_bp.errorhandler(OAuthException)
+def handle_provider_error(error):
+    """Provider token exchange or API call failed"""
+    return jsonify({'error': 'OAuth provider error', 'code': error.type or 'provider_error'}), 502
 
 
 def handle_oauth_user(email, name, provider, provider_id, next_url=None):
-    """Enhanced OAuth user handling with multiple providers support"""
-    user = User.query.filter_by(email=email).first()
-            
-    if user:
-        # Check if this provider is already linked
-        existing_provider = UserOAuthProvider.query.filter_by(
-            user_id=user.id,
-            provider=provider
-        ).first()
-                
-        if not existing_provider:
-            # Add new provider to existing user
-            new_provider = UserOAuthProvider(
-                user_id=user.id,
-                provider=provider,
-                provider_user_id=provider_id
-            )
-            db.session.add(new_provider)
-    else:
-        # Create new user
-        user = User(
-            email=email,
-            name=name
-        )
-        db.session.add(user)
-        db.session.flush()  # Get user.id
-                
-        # Add OAuth provider
-        oauth_provider = UserOAuthProvider(
-            user_id=user.id,
-            provider=provider,
-            provider_user_id=provider_id
-        )
-        db.session.add(oauth_provider)
-            
-    # Update last login
-    user.last_login = datetime.utcnow()
+    """Log the provider user in and return the user and tokens as JSON"""
+    return jsonify(login_oauth_user(email, name, provider, provider_id,
+                                    ip=request.remote_addr, user_agent=request.user_agent.string))
+
+
+def login_oauth_user(email, name, provider, provider_id, ip=None, user_agent=None):
+    """Upsert the user, provider link, last_login and tokens in one transaction.
+
+    With the login recorder in write-behind mode last_login and a login
+    audit row are queued instead; otherwise last_login is written here
+    and no audit is kept. Needs only an app context, so
+    the async callbacks can run it on their database pool.
+    """
+    login_at = datetime.utcnow()
+    user = UserService.upsert_oauth_user(email, name, provider, provider_id, login_at=login_at,
+                                         update_last_login=not login_recorder.enabled)
+    access_token, refresh_token = TokenManager.generate_and_store_tokens(user.id, commit=False)
+    login_recorder.record(user.id, provider, login_at, ip=ip, user_agent=user_agent)
     db.session.commit()
+    UserService.invalidate(user.id)
+    email_filter.add(normalize_email(email))
             
-    # Generate and store tokens
-    access_token, refresh_token = TokenManager.generate_and_store_tokens(user.id)
-            
-    # Return user info and tokens as JSON
-    response_data = {
+    # User info and tokens
+    return {
         'user': {
             'id': user.id,
             'email': user.email,
             'name': user.name,
-            'last_login': user.last_login.isoformat()
+            'last_login': login_at.isoformat()
         },
         'tokens': {
             'access_token': access_token,
             'refresh_token': refresh_token
         }
     }
-    return jsonify(response_data)
@@ -0,0 +1,117 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+from flask_oauthlib.client import OAuthException
+from werkzeug.http import parse_cookie
+from routes.oauth import login_oauth_user, _verified_claims
+from utils.oauth_providers import providers
+from utils.oauth_state import oauth_handshake
+
+
+class AsyncOAuthCallbacks:
+    """OAuth callbacks that await the provider instead of blocking a worker.
+
+    The code exchange and profile calls go through the shared async HTTP
+    client, and the profile requests a provider needs (GitHub's user and
+    emails) are sent concurrently. Only the database work and the local
+    id_token check run on a bounded thread pool, so in-flight callbacks
+    cost a coroutine each while waiting on the provider.
+
+    Needs OAUTH_STATELESS_STATE, since the handshake is then read from a
+    cookie rather than the session store.
+    """
+
+    def __init__(self, app, db_workers=16):
+        self.app = app
+        self.executor = ThreadPoolExecutor(
+            max_workers=app.config.get('ASYNC_DB_WORKERS', db_workers),
+            thread_name_prefix='oauth-db'
+        )
+
+    @property
+    def enabled(self):
+        return oauth_handshake.enabled
+
+    def handles(self, scope):
+        """Provider name if scope is a callback served here, else None"""
+        if not self.enabled or scope['type'] != 'http' or scope['method'] != 'GET':
+            return None
+        parts = scope['path'].strip('/').split('/')
+        if len(parts) == 4 and parts[:2] == ['oauth', 'login'] and parts[3] == 'callback' \
+                and providers.get(parts[2]) is not None:
+            return parts[2]
+        return None
+
+    async def __call__(self, scope, receive, send, provider):
+        try:
+            payload, status = await self.callback(scope, provider)
+        except OAuthException as e:
+            payload, status = {'error': 'OAuth provider error', 'code': e.type or 'provider_error'}, 502
+        response = self.app.json.response(payload)
+        response.status_code = status
+        oauth_handshake.clear_cookie(response)
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(key.lower().encode('latin-1'), value.encode('latin-1'))
+                        for key, value in response.headers.items()]
+        })
+        await send({'type': 'http.response.body', 'body': response.get_data()})
+
+    async def callback(self, scope, provider):
+        """Return (JSON payload, status) for one callback"""
+        headers = {key.decode('latin-1'): value.decode('latin-1') for key, value in scope['headers']}
+        args = dict(parse_qsl(scope['query_string'].decode('latin-1')))
+        cookies = parse_cookie(headers.get('cookie', ''))
+        handshake = oauth_handshake.complete(provider, args.get('state'),
+                                            cookies.get(oauth_handshake.cookie_name))
+        if handshake is None or 'code' not in args:
+            return {'error': 'Access denied'}, 401
+
+        remote = providers.get(provider)
+        resp = await remote.exchange_code_async(args['code'], self._callback_url(scope, headers, provider),
+                                                code_verifier=handshake['verifier'])
+        if resp is None or resp.get('access_token') is None:
+            return {'error': 'Access denied'}, 401
+
+        claims = None
+        if providers.oidc(provider) is not None and resp.get('id_token'):
+            claims = await self.run(_verified_claims, provider, resp)
+        if claims is not None:
+            email, name, provider_id = claims['email'], claims.get('name'), claims['sub']
+        else:
+            token = (resp['access_token'], '')
+            profiles = await asyncio.gather(*(remote.get_async(path, token)
+                                              for path in providers.profile_paths(provider)))
+            # Only needed when the profile hides the email, e.g. a private GitHub address
+            profiles += await asyncio.gather(*(remote.get_async(path, token)
+                                               for path in providers.email_paths(provider, profiles)))
+            email, name, provider_id = providers.identity(provider, profiles)
+
+        client = scope.get('client')
+        user = await self.run(login_oauth_user, email, name, provider, provider_id,
+                              ip=client[0] if client else None,
+                              user_agent=headers.get('user-agent', ''))
+        return user, 200
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn in an app context on the database pool"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, lambda: self._in_app_context(fn, *args, **kwargs)
+        )
+
+    def _in_app_context(self, fn, *args, **kwargs):
+        with self.app.app_context():
+            return fn(*args, **kwargs)
+
+    def _callback_url(self, scope, headers, provider):
+        # Must match the redirect_uri the login leg built with url_for
+        adapter = self.app.url_map.bind(
+            headers.get('host') or '%s:%d' % tuple(scope.get('server') or ('localhost', 80)),
+            script_name=scope.get('root_path') or '/',
+            url_scheme=scope.get('scheme', 'http')
+        )
+        return adapter.build('oauth.oauth_callback', {'provider': provider}, force_external=True)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -1,26 +1,44 @@
-from flask import Blueprint, jsonify, g, request
+from flask import Blueprint, jsonify, g, request, current_app
 from middleware.auth_middleware import auth_required
 from utils.token_manager import TokenManager
-from models.user import User, db
+from utils.profile_cache import profile_cache
 
 profile_bp = Blueprint('profile', __name__)
 
+REFRESH_ERRORS = {
+    'expired': 'Refresh token expired',
+    'invalid': 'Invalid refresh token',
+    'reused': 'Refresh token reuse detected, please log in again'
+}
+
 @profile_bp.route('/me', methods=['GET'])
 @auth_required
 def get_profile():
-    """Get current user's profile"""
-    return jsonify(g.user.to_dict())
+    """Get current user's profile.
+
+    The ETag follows User.version, so a client revalidating with
+    If-None-Match gets a 304 without the profile being serialized.
+    """
+    etag = profile_cache.etag(g.user)
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(profile_cache.payload(g.user), mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Authorization')
+    return response
 
 @profile_bp.route('/refresh-token', methods=['POST'])
 def refresh_token():
-    """Generate new access token using refresh token"""
-    refresh_token = request.json.get('refresh_token')
+    """Rotate a refresh token and issue a new access token"""
+    refresh_token = (request.get_json(silent=True) or {}).get('refresh_token')
     if not refresh_token:
         return jsonify({'error': 'Refresh token required'}), 400
         
-    user_id = TokenManager.verify_token(refresh_token, 'refresh')
-    if not user_id or user_id == 'expired':
-        return jsonify({'error': 'Invalid or expired refresh token'}), 401
+    tokens, error = TokenManager.refresh(refresh_token)
+    if error:
+        return jsonify({'error': REFRESH_ERRORS[error]}), 401
         
-    access_token, _ = TokenManager.generate_tokens(user_id)
-    return jsonify({'access_token': access_token})
\ No newline at end of file
+    access_token, refresh_token = tokens
+    return jsonify({'access_token': access_token, 'refresh_token': refresh_token})
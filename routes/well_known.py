@@ -0,0 +1,18 @@
+from flask import Blueprint, Response, request
+from utils.key_ring import key_ring
+import hashlib
+
+well_known_bp = Blueprint('well_known', __name__)
+
+@well_known_bp.route('/.well-known/jwks.json')
+def jwks():
+    """Public signing keys for verifying our access tokens locally"""
+    body = key_ring.jwks()
+    etag = hashlib.sha256(body.encode('utf-8')).hexdigest()[:32]
+    headers = {
+        'Cache-Control': 'public, max-age=%d, stale-while-revalidate=60' % key_ring.max_age,
+        'ETag': '"%s"' % etag
+    }
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    return Response(body, mimetype='application/json', headers=headers)
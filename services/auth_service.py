@@ -1,17 +1,20 @@
-import bcrypt
 import jwt
 from datetime import datetime, timedelta
-from models.user import User, db
-from flask import current_app
+from services.password_hasher import password_hasher
+from utils.token_manager import TokenManager
 
 class AuthService:
     @staticmethod
     def hash_password(password):
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        return password_hasher.hash(password)
     
     @staticmethod
     def check_password(password, hashed):
-        return bcrypt.checkpw(password.encode('utf-8'), hashed)
+        return password_hasher.check(password, hashed)
+    
+    @staticmethod
+    def needs_rehash(hashed):
+        return password_hasher.needs_rehash(hashed)
     
     @staticmethod
     def generate_token(user_id):
@@ -19,12 +22,12 @@ class AuthService:
             'user_id': user_id,
             'exp': datetime.utcnow() + timedelta(days=1)
         }
-        return jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
+        return TokenManager.encode(payload)
     
     @staticmethod
     def verify_token(token):
         try:
-            payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+            payload = TokenManager.decode(token)
             return payload['user_id']
-        except:
+        except jwt.InvalidTokenError:
             return None
\ No newline at end of file
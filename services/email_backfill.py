@@ -0,0 +1,178 @@
+import click
+from models.user import User, UserOAuthProvider, UserToken, LoginAudit, db, normalize_email
+from services.user_service import UserService
+from utils.db_routing import pin_primary
+
+INDEX_NAME = 'uq_user_email_normalized'
+# Columns User gained after tables were first created, with any DDL past
+# the type. email_normalized stays nullable until create_index().
+ADDED_COLUMNS = (
+    ('email_normalized', ''),
+    ('email_deliverable', ''),
+    ('version', 'NOT NULL DEFAULT 1'),
+)
+
+
+class EmailBackfill:
+    """Upgrades a users table from before User.email_normalized.
+
+    Run as ``flask backfill-email-normalized`` after deploying the code
+    and before serving traffic. Every step is safe to re-run:
+
+    1. add the columns in ADDED_COLUMNS that the table lacks;
+    2. fill it in id-ordered batches, one short transaction each;
+    3. list accounts whose emails differ only in case, and with --merge
+       fold each group into its one account with credentials; a group
+       where several accounts can log in is left to be resolved by hand;
+    4. once no such group is left, create the unique index (and on
+       PostgreSQL make the column NOT NULL).
+
+    The old unique constraint on email can stay: equal emails normalize
+    equally, so it never rejects anything the new index would allow.
+
+    A database created before these columns is upgraded with:
+
+        flask reset-user-tokens --yes
+        flask init-db
+        flask backfill-email-normalized --merge
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+
+    def init_app(self, app):
+        self.batch_size = app.config.get('USER_TRANSFER_CHUNK_SIZE', self.batch_size)
+
+        @app.cli.command('backfill-email-normalized')
+        @click.option('--batch-size', type=int, default=None, help='Users updated per transaction')
+        @click.option('--merge', is_flag=True, help='Merge accounts whose emails differ only in case')
+        def backfill_command(batch_size, merge):
+            """Fill User.email_normalized and create its unique index"""
+            # Replica lag would hide the rows just written
+            pin_primary(db.session)
+            for name in self.add_columns():
+                click.echo('added column user.%s' % name)
+            click.echo('normalized %d emails' % self.fill(batch_size=batch_size))
+
+            for normalized, ids in self.collisions():
+                listed = ', '.join(map(str, ids))
+                if not merge:
+                    click.echo('collision %s: users %s' % (normalized, listed))
+                    continue
+                keep = self.merge(ids)
+                if keep is None:
+                    click.echo('collision %s: users %s each have a password or provider login, '
+                               'resolve by hand' % (normalized, listed))
+                else:
+                    click.echo('merged users %s into %d' % (
+                        ', '.join(str(user_id) for user_id in ids if user_id != keep), keep))
+            if self.collisions():
+                raise click.ClickException('Unique index not created, resolve the collisions above '
+                                           '(or rerun with --merge)')
+            if self.create_index():
+                click.echo('created unique index on user.email_normalized')
+
+    def add_columns(self):
+        """Add the ADDED_COLUMNS a table created before them lacks, return their names"""
+        existing = {column['name'] for column in db.inspect(db.engine).get_columns(User.__tablename__)}
+        dialect = db.engine.dialect
+        table = dialect.identifier_preparer.format_table(User.__table__)
+        added = []
+        with db.engine.begin() as conn:
+            for name, extra in ADDED_COLUMNS:
+                if name in existing:
+                    continue
+                column = User.__table__.c[name]
+                ddl = 'ALTER TABLE %s ADD COLUMN %s %s %s' % (
+                    table, dialect.identifier_preparer.format_column(column),
+                    column.type.compile(dialect=dialect), extra)
+                conn.execute(db.text(ddl.rstrip()))
+                added.append(name)
+        return added
+
+    def fill(self, batch_size=None):
+        """Normalize every email not yet normalized, return how many were"""
+        batch_size = batch_size or self.batch_size
+        users = User.__table__
+        stmt = users.update().where(users.c.id == db.bindparam('b_id')).values(
+            email_normalized=db.bindparam('b_normalized')
+        )
+        last_id = 0
+        total = 0
+        while True:
+            rows = db.session.execute(
+                db.select(users.c.id, users.c.email)
+                .where(users.c.id > last_id, users.c.email_normalized == None)
+                .order_by(users.c.id).limit(batch_size)
+            ).all()
+            if not rows:
+                return total
+            db.session.execute(stmt, [{'b_id': row.id, 'b_normalized': normalize_email(row.email)}
+                                      for row in rows])
+            db.session.commit()
+            total += len(rows)
+            last_id = rows[-1].id
+
+    def collisions(self):
+        """[(email_normalized, [user ids, oldest first])] for addresses held by several users"""
+        users = User.__table__
+        duplicated = db.select(users.c.email_normalized).group_by(users.c.email_normalized) \
+            .having(db.func.count() > 1).subquery()
+        groups = {}
+        for row in db.session.execute(
+            db.select(users.c.email_normalized, users.c.id)
+            .where(users.c.email_normalized.in_(db.select(duplicated.c.email_normalized)))
+            .order_by(users.c.email_normalized, users.c.id)
+        ):
+            groups.setdefault(row.email_normalized, []).append(row.id)
+        return list(groups.items())
+
+    def merge(self, ids):
+        """Fold a collision group into one account; its id, or None if left alone.
+
+        Credentials never move between accounts: copying a password or
+        provider link onto another account would let whoever registered
+        the look-alike address log into it. So the group is only merged
+        when at most one account has a password or provider link, and
+        that account (else the oldest) is kept as it is. The others only
+        hand over their login audits; their tokens and rows are deleted.
+        """
+        holders = set(db.session.scalars(
+            db.select(User.id).where(User.id.in_(ids), User.password != None)
+        ))
+        holders.update(db.session.scalars(
+            db.select(UserOAuthProvider.user_id).where(UserOAuthProvider.user_id.in_(ids))
+        ))
+        if len(holders) > 1:
+            return None
+        keep = holders.pop() if holders else ids[0]
+        others = [user_id for user_id in ids if user_id != keep]
+
+        LoginAudit.query.filter(LoginAudit.user_id.in_(others)).update(
+            {'user_id': keep}, synchronize_session=False)
+        UserToken.query.filter(UserToken.user_id.in_(others)).delete(synchronize_session=False)
+        User.query.filter(User.id.in_(others)).delete(synchronize_session=False)
+        User.query.filter_by(id=keep).update({'version': User.version + 1}, synchronize_session=False)
+        db.session.commit()
+        for user_id in ids:
+            UserService.invalidate(user_id)
+        return keep
+
+    def create_index(self):
+        """Create the unique index unless one already covers the column; True if created"""
+        inspector = db.inspect(db.engine)
+        table = User.__tablename__
+        unique = [index['column_names'] for index in inspector.get_indexes(table) if index['unique']]
+        unique += [constraint['column_names'] for constraint in inspector.get_unique_constraints(table)]
+        if ['email_normalized'] in unique:
+            return False
+        # Plain DDL, so the index is not attached to the model's metadata
+        quoted = db.engine.dialect.identifier_preparer.format_table(User.__table__)
+        with db.engine.begin() as conn:
+            conn.execute(db.text('CREATE UNIQUE INDEX %s ON %s (email_normalized)' % (INDEX_NAME, quoted)))
+            if db.engine.dialect.name == 'postgresql':
+                conn.execute(db.text('ALTER TABLE %s ALTER COLUMN email_normalized SET NOT NULL' % quoted))
+        return True
+
+
+email_backfill = EmailBackfill()
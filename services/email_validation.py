@@ -0,0 +1,149 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from email_validator import validate_email, EmailUndeliverableError
+from models.user import User, db
+from services.user_service import UserService
+
+MODES = ('syntax', 'cached', 'async')
+
+
+class EmailValidation:
+    """Email checks that keep DNS off the registration path.
+
+    EMAIL_VALIDATION_MODE picks how deliverability is handled:
+
+    - ``syntax``: syntax only, no DNS at all.
+    - ``cached`` (default): syntax, then the domain's MX lookup from a TTL
+      cache. Undeliverable domains are rejected as before; only a cold
+      domain waits on DNS, and a timeout lets the address through.
+    - ``async``: syntax only on the request, so undeliverable domains are
+      accepted. The domain is checked on a background pool after signup
+      and recorded in User.email_deliverable.
+
+    Domain results are cached (shorter for failures and unknowns).
+    Concurrent lookups of one domain share a single DNS query.
+    """
+
+    def __init__(self, mode='cached', ttl=3600, negative_ttl=300, timeout=2.0, max_domains=10000):
+        self.mode = mode
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.max_domains = max_domains
+        self._app = None
+        self._domains = {}   # ascii domain -> (expires, error or None, known)
+        self._inflight = {}  # ascii domain -> Future of (error or None, known)
+        self._lock = threading.Lock()
+        self._resolver = None
+        self._executor = None
+        self.hits = 0
+        self.lookups = 0
+        self.coalesced = 0
+
+    def init_app(self, app):
+        self.mode = app.config.get('EMAIL_VALIDATION_MODE', self.mode)
+        if self.mode not in MODES:
+            raise ValueError('EMAIL_VALIDATION_MODE must be one of %s' % ', '.join(MODES))
+        self.ttl = app.config.get('EMAIL_DOMAIN_CACHE_TTL', self.ttl)
+        self.negative_ttl = app.config.get('EMAIL_DOMAIN_NEGATIVE_TTL', self.negative_ttl)
+        self.timeout = app.config.get('EMAIL_DNS_TIMEOUT', self.timeout)
+        self._app = app
+        self._resolver = None
+        if self.mode == 'async' and self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='email-verify')
+
+    def validate(self, email):
+        """Check an address for the current mode.
+
+        Returns (ValidatedEmail, deliverable) where deliverable is True
+        when the domain is known to accept mail and None when unchecked.
+        Raises EmailNotValidError for bad syntax or, in cached mode, an
+        undeliverable domain.
+        """
+        validated = validate_email(email, check_deliverability=False)
+        if self.mode != 'cached':
+            return validated, None
+        error, known = self.check_domain(validated.ascii_domain, validated.domain)
+        if error:
+            raise EmailUndeliverableError(error)
+        return validated, True if known else None
+
+    def verify_later(self, user_id, email):
+        """In async mode, check the domain after signup and store the result"""
+        if self.mode != 'async' or self._executor is None:
+            return
+        self._executor.submit(self._verify, self._app, user_id, email)
+
+    def _verify(self, app, user_id, email):
+        try:
+            validated = validate_email(email, check_deliverability=False)
+            error, known = self.check_domain(validated.ascii_domain, validated.domain)
+            if not known:
+                return
+            with app.app_context():
+                try:
+                    User.query.filter_by(id=user_id).update({'email_deliverable': error is None})
+                    db.session.commit()
+                finally:
+                    db.session.remove()
+            UserService.invalidate(user_id)
+        except Exception:
+            app.logger.exception('Deliverability check failed for user %s', user_id)
+
+    def check_domain(self, domain, domain_i18n=None):
+        """Return (error or None, known) for a domain, from cache when fresh"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._domains.get(domain)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1], entry[2]
+            future = self._inflight.get(domain)
+            leader = future is None
+            if leader:
+                future = self._inflight[domain] = Future()
+        if not leader:
+            self.coalesced += 1
+            return future.result()
+
+        try:
+            result = self._lookup(domain, domain_i18n or domain)
+        except Exception:
+            result = (None, False)
+        with self._lock:
+            ttl = self.ttl if result[1] and result[0] is None else self.negative_ttl
+            self._domains.pop(domain, None)
+            self._domains[domain] = (time.monotonic() + ttl, result[0], result[1])
+            while len(self._domains) > self.max_domains:
+                self._domains.pop(next(iter(self._domains)))
+            del self._inflight[domain]
+        future.set_result(result)
+        return result
+
+    def _lookup(self, domain, domain_i18n):
+        self.lookups += 1
+        # dnspython is only imported once a domain actually needs a lookup
+        from email_validator.deliverability import validate_email_deliverability
+        if self._resolver is None:
+            # Own resolver so the timeout does not leak into dnspython's default
+            import dns.resolver
+            resolver = dns.resolver.Resolver()
+            resolver.lifetime = self.timeout
+            self._resolver = resolver
+        try:
+            info = validate_email_deliverability(domain, domain_i18n, dns_resolver=self._resolver)
+        except EmailUndeliverableError as e:
+            return str(e), True
+        return None, 'unknown-deliverability' not in info
+
+    def stats(self):
+        return {
+            'domains': len(self._domains),
+            'hits': self.hits,
+            'lookups': self.lookups,
+            'coalesced': self.coalesced
+        }
+
+
+email_validation = EmailValidation()
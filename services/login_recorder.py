@@ -0,0 +1,210 @@
+import atexit
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from models.user import User, LoginAudit, db
+from services.user_service import UserService
+
+
+class LoginRecorder:
+    """Write-behind queue for User.last_login and LoginAudit rows.
+
+    With LOGIN_WRITE_BEHIND off, record() does nothing: the caller sets
+    last_login itself and no audit rows are written. With it on, logins are
+    queued when the caller's transaction commits (never for a user row
+    that may still roll back) and a background thread flushes them every
+    LOGIN_FLUSH_INTERVAL seconds in one transaction: last_login updates
+    coalesce per user (the newest wins, and an older value never
+    overwrites a newer one in the table), and audits go in one bulk
+    insert. If the batch violates a constraint (say a user was deleted
+    meanwhile), it is written again row by row and only the offending
+    audits are dropped. Nothing waits longer than one interval plus a flush. Once
+    LOGIN_QUEUE_HIGH_WATER entries are pending, the caller flushes
+    inline, so a stalled flusher slows logins down instead of eating
+    memory. The queue is flushed at interpreter exit.
+    """
+
+    def __init__(self, interval=1.0, high_water=5000):
+        self.enabled = False
+        self.interval = interval
+        self.high_water = high_water
+        self._app = None
+        self._last_login = {}  # user_id -> newest login time
+        self._audits = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._listening = False
+        self.flushes = 0
+        self.flushed_logins = 0
+        self.flushed_audits = 0
+        self.inline_flushes = 0
+        self.failures = 0
+        self.dropped_audits = 0
+        self.last_flush_seconds = 0.0
+
+    def init_app(self, app):
+        self.enabled = app.config.get('LOGIN_WRITE_BEHIND', False)
+        self.interval = app.config.get('LOGIN_FLUSH_INTERVAL', self.interval)
+        self.high_water = app.config.get('LOGIN_QUEUE_HIGH_WATER', self.high_water)
+        self._app = app
+        if not self._listening:
+            event.listen(db.session, 'after_commit', self._on_commit)
+            event.listen(db.session, 'after_rollback', self._on_rollback)
+            self._listening = True
+        if self.enabled:
+            self.start()
+
+    @property
+    def pending(self):
+        return len(self._audits)
+
+    def record(self, user_id, provider, at, ip=None, user_agent=None):
+        """Record a successful login at ``at`` (naive UTC), effective on commit"""
+        if not self.enabled:
+            return
+        audit = {
+            'user_id': user_id,
+            'provider': provider,
+            'ip': ip,
+            'user_agent': (user_agent or '')[:255] or None,
+            'created_at': at
+        }
+        db.session.info.setdefault('queued_logins', []).append(audit)
+
+    def _on_commit(self, session):
+        audits = session.info.pop('queued_logins', None)
+        if not audits:
+            return
+        with self._lock:
+            for audit in audits:
+                current = self._last_login.get(audit['user_id'])
+                if current is None or audit['created_at'] > current:
+                    self._last_login[audit['user_id']] = audit['created_at']
+            self._audits.extend(audits)
+            backlog = len(self._audits)
+        if backlog >= self.high_water:
+            # Backpressure: make the caller pay for draining the queue
+            self.inline_flushes += 1
+            self.flush()
+
+    def _on_rollback(self, session):
+        session.info.pop('queued_logins', None)
+
+    def flush(self):
+        """Write everything queued so far, return the number of audits written"""
+        with self._flush_lock:
+            with self._lock:
+                last_login, self._last_login = self._last_login, {}
+                audits, self._audits = self._audits, []
+            if not audits and not last_login:
+                return 0
+
+            started = time.monotonic()
+            dropped = 0
+            with self._app.app_context():
+                try:
+                    try:
+                        self._write(last_login, audits)
+                    except IntegrityError:
+                        # e.g. a user deleted meanwhile; retrying the batch would fail forever
+                        db.session.rollback()
+                        dropped = self._write_rows(last_login, audits)
+                        self.dropped_audits += dropped
+                        self._app.logger.warning('Dropped %d of %d queued login audits', dropped, len(audits))
+                except Exception:
+                    db.session.rollback()
+                    self.failures += 1
+                    self._requeue(last_login, audits)
+                    self._app.logger.exception('Login write-behind flush failed')
+                    return 0
+                finally:
+                    db.session.remove()
+
+            # Cached snapshots still carry the old last_login
+            for user_id in last_login:
+                UserService.invalidate(user_id)
+
+            self.flushes += 1
+            self.flushed_logins += len(last_login)
+            self.flushed_audits += len(audits) - dropped
+            self.last_flush_seconds = time.monotonic() - started
+            return len(audits) - dropped
+
+    def _write(self, last_login, audits):
+        self._update_last_login(last_login)
+        if audits:
+            db.session.execute(LoginAudit.__table__.insert(), audits)
+        db.session.commit()
+
+    def _write_rows(self, last_login, audits):
+        """Write a batch that failed as a whole one audit at a time, return how many were dropped"""
+        self._update_last_login(last_login)
+        dropped = 0
+        for audit in audits:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(LoginAudit.__table__.insert(), [audit])
+            except IntegrityError:
+                dropped += 1
+        db.session.commit()
+        return dropped
+
+    @staticmethod
+    def _update_last_login(last_login):
+        if not last_login:
+            return
+        users = User.__table__
+        stmt = users.update().where(
+            users.c.id == db.bindparam('b_id'),
+            db.or_(users.c.last_login == None, users.c.last_login < db.bindparam('b_at'))
+        ).values(last_login=db.bindparam('b_at'), version=users.c.version + 1)
+        db.session.execute(stmt, [{'b_id': user_id, 'b_at': at} for user_id, at in last_login.items()])
+
+    def _requeue(self, last_login, audits):
+        # Put a failed batch back in front of anything queued meanwhile,
+        # keeping at most high_water audits so a dead database cannot grow it forever
+        with self._lock:
+            for user_id, at in last_login.items():
+                current = self._last_login.get(user_id)
+                if current is None or at > current:
+                    self._last_login[user_id] = at
+            self._audits = (audits + self._audits)[-self.high_water:]
+
+    def start(self):
+        """Flush every ``interval`` seconds on a daemon thread"""
+        if self._thread is not None:
+            return
+
+        def run():
+            while not self._stop.wait(self.interval):
+                self.flush()
+
+        self._thread = threading.Thread(target=run, name='login-write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Stop the flusher and drain the queue"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.interval + 5)
+            self._thread = None
+        self.flush()
+
+    def stats(self):
+        return {
+            'pending': self.pending,
+            'flushes': self.flushes,
+            'flushed_logins': self.flushed_logins,
+            'flushed_audits': self.flushed_audits,
+            'inline_flushes': self.inline_flushes,
+            'failures': self.failures,
+            'dropped_audits': self.dropped_audits,
+            'last_flush_seconds': self.last_flush_seconds
+        }
+
+
+login_recorder = LoginRecorder()
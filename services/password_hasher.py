@@ -0,0 +1,84 @@
+import os
+import threading
+import bcrypt
+from concurrent.futures import ThreadPoolExecutor
+from flask import jsonify
+from utils.metrics import metrics
+
+
+class HasherBusy(Exception):
+    """Raised when the bcrypt queue is full"""
+
+    def __init__(self, retry_after):
+        super().__init__('Password hashing queue is full')
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """Runs bcrypt on a dedicated, size-limited thread pool.
+
+    bcrypt releases the GIL, so a small pool keeps hashing parallel while
+    capping how many request threads it can tie up. Once ``workers +
+    queue_depth`` jobs are in flight further calls fail fast with
+    HasherBusy instead of queueing behind them.
+    """
+
+    def __init__(self, rounds=12, workers=None, queue_depth=32, retry_after=1):
+        self.rounds = rounds
+        self.workers = workers or os.cpu_count() or 2
+        self.queue_depth = queue_depth
+        self.retry_after = retry_after
+        self._executor = None
+        self._slots = None
+
+    def init_app(self, app):
+        self.rounds = app.config.get('BCRYPT_ROUNDS', self.rounds)
+        self.workers = app.config.get('BCRYPT_WORKERS') or self.workers
+        self.queue_depth = app.config.get('BCRYPT_QUEUE_DEPTH', self.queue_depth)
+        self.retry_after = app.config.get('BCRYPT_RETRY_AFTER', self.retry_after)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_depth)
+
+        @app.errorhandler(HasherBusy)
+        def handle_busy(error):
+            response = jsonify({'error': 'Server busy, please retry', 'code': 'HASHER_BUSY'})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(error.retry_after)
+            return response
+
+    @metrics.timed('bcrypt_hash')
+    def hash(self, password):
+        """Hash a password with the configured cost"""
+        return self._run(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(self.rounds))
+
+    @metrics.timed('bcrypt_check')
+    def check(self, password, hashed):
+        """Check a password against a stored bcrypt hash"""
+        return self._run(bcrypt.checkpw, password.encode('utf-8'), hashed)
+
+    def needs_rehash(self, hashed):
+        """True when a stored hash was made with a different cost"""
+        if isinstance(hashed, bytes):
+            hashed = hashed.decode('utf-8')
+        try:
+            return int(hashed.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def _run(self, fn, *args):
+        if self._executor is None:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy(self.retry_after)
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,163 @@
+import threading
+import time
+from datetime import datetime, timedelta
+import click
+from models.user import UserToken, RevocationEvent, db
+
+
+class TokenReaper:
+    """Deletes expired and long-inactive UserToken rows in bounded batches.
+
+    Each batch is its own short transaction followed by a pause, so the
+    purge never holds locks for long. Expired RevocationEvent rows are
+    purged the same way. Runnable as ``flask purge-tokens`` or on a
+    background thread when TOKEN_REAPER_INTERVAL is set.
+
+    ``flask reset-user-tokens`` is the upgrade step for a user_token table
+    from before token families (access_token/refresh_token columns): it
+    drops and recreates the table, logging every user out. Run it before
+    ``flask init-db``; it does nothing once the table matches the model.
+    """
+
+    def __init__(self, batch_size=1000, pause=0.05, inactive_grace=timedelta(days=1)):
+        self.batch_size = batch_size
+        self.pause = pause
+        self.inactive_grace = inactive_grace
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.batches = 0
+        self.rows_deleted = 0
+        self.last_run_at = None
+        self.last_run_deleted = 0
+        self.last_run_seconds = 0.0
+
+    def init_app(self, app):
+        self.batch_size = app.config.get('TOKEN_REAPER_BATCH_SIZE', self.batch_size)
+        self.pause = app.config.get('TOKEN_REAPER_PAUSE', self.pause)
+        self.inactive_grace = app.config.get('TOKEN_REAPER_INACTIVE_GRACE', self.inactive_grace)
+
+        @app.cli.command('purge-tokens')
+        @click.option('--batch-size', type=int, default=None, help='Rows deleted per transaction')
+        @click.option('--pause', type=float, default=None, help='Seconds to sleep between batches')
+        @click.option('--max-batches', type=int, default=None, help='Stop after this many batches')
+        def purge_tokens(batch_size, pause, max_batches):
+            """Delete expired and inactive user tokens and revocation events"""
+            def progress(deleted, total):
+                click.echo('deleted %d rows (%d total)' % (deleted, total))
+
+            total = self.purge(batch_size=batch_size, pause=pause,
+                               max_batches=max_batches, progress=progress)
+            click.echo('purged %d tokens' % total)
+
+        @app.cli.command('reset-user-tokens')
+        @click.option('--force', is_flag=True, help='Recreate the table even if it is current')
+        @click.option('--yes', is_flag=True, help='Do not ask for confirmation')
+        def reset_user_tokens(force, yes):
+            """Drop and recreate user_token when its schema is outdated"""
+            if not force and self.token_table_current():
+                click.echo('user_token is current, nothing to reset')
+                return
+            if not yes:
+                click.confirm('This deletes every user token and logs all users out. Continue?',
+                              abort=True)
+            self.reset_token_table()
+            click.echo('recreated table user_token')
+
+        interval = app.config.get('TOKEN_REAPER_INTERVAL')
+        if interval:
+            self.start(app, interval)
+
+    def purge(self, batch_size=None, pause=None, max_batches=None, progress=None):
+        """Purge dead tokens, return the number of rows deleted"""
+        batch_size = batch_size or self.batch_size
+        pause = self.pause if pause is None else pause
+        started = time.monotonic()
+        now = datetime.utcnow()
+        predicates = [
+            (UserToken, UserToken.expires_at < now),
+            (UserToken, db.and_(UserToken.is_active == False, UserToken.created_at < now - self.inactive_grace)),
+            (RevocationEvent, RevocationEvent.expires_at < now)
+        ]
+
+        total = 0
+        batches = 0
+        for model, predicate in predicates:
+            while max_batches is None or batches < max_batches:
+                ids = [row.id for row in db.session.query(model.id).filter(predicate).limit(batch_size)]
+                if not ids:
+                    break
+                deleted = model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+                db.session.commit()
+                total += deleted
+                batches += 1
+                with self._lock:
+                    self.batches += 1
+                    self.rows_deleted += deleted
+                if progress:
+                    progress(deleted, total)
+                if len(ids) < batch_size:
+                    break
+                if pause:
+                    time.sleep(pause)
+
+        with self._lock:
+            self.runs += 1
+            self.last_run_at = now
+            self.last_run_deleted = total
+            self.last_run_seconds = time.monotonic() - started
+        return total
+
+    def token_table_current(self):
+        """True if user_token is missing (init-db creates it) or has the model's columns"""
+        table = UserToken.__table__
+        inspector = db.inspect(db.engine)
+        if not inspector.has_table(table.name):
+            return True
+        return {column['name'] for column in inspector.get_columns(table.name)} == set(table.columns.keys())
+
+    def reset_token_table(self):
+        """Drop user_token with all its rows and create it from the model"""
+        table = UserToken.__table__
+        table.drop(db.engine, checkfirst=True)
+        table.create(db.engine)
+
+    def start(self, app, interval):
+        """Run purge() every ``interval`` seconds on a daemon thread"""
+        if self._thread is not None:
+            return
+        if hasattr(interval, 'total_seconds'):
+            interval = interval.total_seconds()
+
+        def run():
+            while not self._stop.wait(interval):
+                with app.app_context():
+                    try:
+                        self.purge()
+                    except Exception:
+                        db.session.rollback()
+                        app.logger.exception('Token reaper run failed')
+                    finally:
+                        db.session.remove()
+
+        self._thread = threading.Thread(target=run, name='token-reaper', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        """Progress counters for monitoring"""
+        with self._lock:
+            return {
+                'runs': self.runs,
+                'batches': self.batches,
+                'rows_deleted': self.rows_deleted,
+                'last_run_at': self.last_run_at.isoformat() if self.last_run_at else None,
+                'last_run_deleted': self.last_run_deleted,
+                'last_run_seconds': self.last_run_seconds
+            }
+
+
+token_reaper = TokenReaper()
@@ -0,0 +1,171 @@
+from datetime import datetime
+from flask import g, has_request_context
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import joinedload
+from models.user import User, UserOAuthProvider, db, normalize_email, pack_snapshot, unpack_snapshot
+from utils.shared_cache import shared_cache
+from utils.token_cache import token_cache
+from utils.profile_cache import profile_cache
+from utils.db_routing import has_replicas, pin_primary
+
+# Dialects with a native INSERT ... ON CONFLICT
+_UPSERT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert
+}
+
+
+class UserService:
+    @staticmethod
+    def get_user(user_id):
+        """Load a user and its providers in one query, at most once per request.
+
+        Users are shared with the other workers on the host through the
+        shared cache, so only the first worker to see a user queries it.
+        """
+        cache = UserService._identity_cache()
+        if cache is not None and user_id in cache:
+            return cache[user_id]
+
+        key = 'u:%d' % user_id
+        shared = shared_cache.get(key)
+        if shared is not None:
+            user = User.from_snapshot(unpack_snapshot(shared[1]))
+        else:
+            version = shared_cache.version(user_id) if shared_cache.enabled else None
+            user = UserService._load(id=user_id)
+            if user:
+                shared_cache.set(key, user_id, pack_snapshot(user.to_snapshot()), version=version)
+        UserService.remember(user, user_id)
+        return user
+
+    @staticmethod
+    def get_user_by_email(email):
+        """Load a user and its providers by email, case-insensitively, in one query"""
+        user = UserService._load(email_normalized=normalize_email(email))
+        if user:
+            UserService.remember(user)
+        return user
+
+    @staticmethod
+    def email_exists(email_normalized):
+        """Index-only existence check, pinned to the primary so fresh signups count"""
+        pin_primary(db.session)
+        return db.session.execute(
+            db.select(User.id).filter_by(email_normalized=email_normalized).limit(1)
+        ).first() is not None
+
+    @staticmethod
+    def _load(**criteria):
+        user = User.query.options(joinedload(User.oauth_providers)).filter_by(**criteria).first()
+        if user is None and has_replicas():
+            # Maybe just created and not replicated yet
+            pin_primary(db.session)
+            user = User.query.options(joinedload(User.oauth_providers)).filter_by(**criteria).first()
+        return user
+
+    @staticmethod
+    def upsert_oauth_user(email, name, provider, provider_id, login_at=None, update_last_login=True):
+        """Create or update a user and link a provider without committing.
+
+        Uses INSERT ... ON CONFLICT so concurrent first logins for the same
+        email converge on one row instead of failing on the unique index.
+        With update_last_login=False an existing row is not written at all
+        (the login recorder sets last_login later) unless a provider is newly
+        linked. User.version is bumped whenever the profile changes. Returns
+        a row with id, email, name and last_login.
+        """
+        now = login_at or datetime.utcnow()
+        normalized = normalize_email(email)
+        insert = _UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+        if insert is None:
+            return UserService._upsert_oauth_user_orm(email, normalized, name, provider, provider_id,
+                                                      now, update_last_login)
+
+        columns = (User.id, User.email, User.name, User.last_login)
+        stmt = insert(User).values(email=email, email_normalized=normalized, name=name,
+                                   created_at=now, last_login=now, version=1)
+        existing = False
+        if update_last_login:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[User.email_normalized],
+                set_={'last_login': stmt.excluded.last_login, 'version': User.version + 1}
+            ).returning(*columns)
+            user = db.session.execute(stmt).one()
+        else:
+            # No row lock on returning users; RETURNING is empty on conflict
+            stmt = stmt.on_conflict_do_nothing(index_elements=[User.email_normalized]).returning(*columns)
+            user = db.session.execute(stmt).first()
+            if user is None:
+                existing = True
+                user = db.session.execute(db.select(*columns).filter_by(email_normalized=normalized)).one()
+
+        link = insert(UserOAuthProvider).values(
+            user_id=user.id,
+            provider=provider,
+            provider_user_id=str(provider_id),
+            created_at=now
+        ).on_conflict_do_nothing(index_elements=['user_id', 'provider'])
+        if db.session.execute(link).rowcount and existing:
+            # The profile lists providers, so a new link is a new version
+            UserService._bump_version(user.id)
+        return user
+
+    @staticmethod
+    def _upsert_oauth_user_orm(email, normalized, name, provider, provider_id, now, update_last_login):
+        # Fallback for dialects without ON CONFLICT support
+        user = User.query.filter_by(email_normalized=normalized).first()
+        changed = False
+        created = user is None
+        if created:
+            user = User(email=email, email_normalized=normalized, name=name, last_login=now, version=1)
+            db.session.add(user)
+            db.session.flush()
+
+        existing_provider = UserOAuthProvider.query.filter_by(
+            user_id=user.id,
+            provider=provider
+        ).first()
+        if not existing_provider:
+            db.session.add(UserOAuthProvider(
+                user_id=user.id,
+                provider=provider,
+                provider_user_id=str(provider_id)
+            ))
+            changed = True
+
+        if update_last_login:
+            user.last_login = now
+            changed = True
+        if changed and not created:
+            user.version = User.version + 1
+        db.session.flush()
+        return user
+
+    @staticmethod
+    def _bump_version(user_id):
+        db.session.execute(
+            db.update(User).where(User.id == user_id).values(version=User.version + 1)
+        )
+
+    @staticmethod
+    def invalidate(user_id):
+        """Drop a user's cached tokens and records, in every worker"""
+        token_cache.invalidate_user(user_id)
+        shared_cache.invalidate_user(user_id)
+        profile_cache.invalidate_user(user_id)
+
+    @staticmethod
+    def remember(user, user_id=None):
+        """Put a user into the request-scoped identity cache"""
+        cache = UserService._identity_cache()
+        if cache is not None:
+            cache[user_id if user_id is not None else user.id] = user
+
+    @staticmethod
+    def _identity_cache():
+        if not has_request_context():
+            return None
+        if '_user_identity_cache' not in g:
+            g._user_identity_cache = {}
+        return g._user_identity_cache
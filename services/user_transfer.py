@@ -0,0 +1,299 @@
+import csv
+import io
+import json
+import re
+from datetime import datetime
+import click
+from email_validator import validate_email, EmailNotValidError
+from sqlalchemy.exc import IntegrityError
+from models.user import User, UserOAuthProvider, db, normalize_email
+from utils.email_filter import email_filter
+
+FORMATS = ('ndjson', 'csv')
+CSV_FIELDS = ('email', 'name', 'password_hash', 'created_at', 'last_login', 'providers')
+BCRYPT_HASH = re.compile(r'^\$2[aby]?\$\d{2}\$[./A-Za-z0-9]{53}$')
+
+
+class ImportReport:
+    """Counters and per-row errors of one import.
+
+    Only the first ``max_errors`` errors are kept, so a bad file cannot
+    make the report grow without bound.
+    """
+
+    def __init__(self, max_errors=1000):
+        self.max_errors = max_errors
+        self.imported = 0
+        self.providers = 0
+        self.skipped = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line, email, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'email': email, 'error': message})
+
+    def to_dict(self):
+        return {
+            'imported': self.imported,
+            'providers': self.providers,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors)
+        }
+
+
+class UserTransfer:
+    """Bulk user import and export for tenant migrations.
+
+    Imports read NDJSON or CSV one row at a time and insert users and
+    provider links in chunks, one transaction per chunk. Passwords are
+    optional and must already be bcrypt hashes, so no hashing happens on
+    the way in. A bad row is reported with its line number and skipped;
+    the rest of its chunk still goes in. Exports walk the table by id and
+    yield rows, so neither direction holds more than a chunk in memory.
+    """
+
+    def __init__(self, chunk_size=1000):
+        self.chunk_size = chunk_size
+
+    def init_app(self, app):
+        self.chunk_size = app.config.get('USER_TRANSFER_CHUNK_SIZE', self.chunk_size)
+
+        @app.cli.group('users')
+        def users():
+            """Bulk user import and export"""
+
+        @users.command('import')
+        @click.argument('source', type=click.File('r', encoding='utf-8'))
+        @click.option('--format', 'fmt', type=click.Choice(FORMATS), default=None,
+                      help='Defaults to the file extension, else ndjson')
+        @click.option('--chunk-size', type=int, default=None, help='Rows per transaction')
+        def import_command(source, fmt, chunk_size):
+            """Import users from an NDJSON or CSV file ('-' for stdin)"""
+            fmt = fmt or _format_for(source.name)
+            report = self.import_users(self.read(source, fmt), chunk_size=chunk_size,
+                                       progress=lambda r: click.echo('imported %d users' % r.imported, err=True))
+            for error in report.errors:
+                click.echo('line %(line)s: %(email)s: %(error)s' % error, err=True)
+            click.echo(json.dumps({k: v for k, v in report.to_dict().items() if k != 'errors'}))
+
+        @users.command('export')
+        @click.argument('target', type=click.File('w', encoding='utf-8'), default='-')
+        @click.option('--format', 'fmt', type=click.Choice(FORMATS), default=None)
+        @click.option('--include-passwords', is_flag=True, help='Export bcrypt hashes too')
+        def export_command(target, fmt, include_passwords):
+            """Export users as NDJSON or CSV ('-' for stdout)"""
+            fmt = fmt or _format_for(target.name)
+            for chunk in self.serialize(self.export_users(include_passwords=include_passwords), fmt):
+                target.write(chunk)
+
+    @staticmethod
+    def read(stream, fmt='ndjson'):
+        """Yield (line, row dict) from a text stream"""
+        if fmt == 'csv':
+            reader = csv.DictReader(stream)
+            for row in reader:
+                row = {key: value for key, value in row.items() if value not in (None, '')}
+                if 'providers' in row:
+                    row['providers'] = [
+                        dict(zip(('provider', 'provider_user_id'), link.split(':', 1)))
+                        for link in row['providers'].split('|') if link
+                    ]
+                yield reader.line_num, row
+            return
+        for line, text in enumerate(stream, 1):
+            text = text.strip()
+            if not text:
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError:
+                row = None
+            yield line, row if isinstance(row, dict) else {'_invalid': 'Not a JSON object'}
+
+    def import_users(self, rows, chunk_size=None, report=None, progress=None):
+        """Insert (line, row) pairs in chunks and return an ImportReport.
+
+        Existing emails are skipped. Rows need an ``email`` and may carry
+        ``name``, ``password_hash`` (bcrypt), ``created_at``, ``last_login``
+        and ``providers`` ([{provider, provider_user_id}]).
+        """
+        chunk_size = chunk_size or self.chunk_size
+        report = report or ImportReport()
+        chunk = []
+        for line, row in rows:
+            parsed = _parse_row(row)
+            if isinstance(parsed, str):
+                report.error(line, row.get('email') if isinstance(row, dict) else None, parsed)
+                continue
+            chunk.append((line, parsed))
+            if len(chunk) >= chunk_size:
+                self._import_chunk(chunk, report)
+                chunk = []
+                if progress:
+                    progress(report)
+        if chunk:
+            self._import_chunk(chunk, report)
+            if progress:
+                progress(report)
+        return report
+
+    def _import_chunk(self, chunk, report):
+        emails = [user['email_normalized'] for _, (user, _) in chunk]
+        existing = set(db.session.execute(
+            db.select(User.email_normalized).where(User.email_normalized.in_(emails))
+        ).scalars())
+
+        fresh = []
+        seen = set()
+        for line, (user, providers) in chunk:
+            if user['email_normalized'] in existing:
+                report.skipped += 1
+            elif user['email_normalized'] in seen:
+                report.error(line, user['email'], 'Duplicate email in input')
+            else:
+                seen.add(user['email_normalized'])
+                fresh.append((line, user, providers))
+        if not fresh:
+            return
+
+        try:
+            self._insert(fresh, report)
+            db.session.commit()
+        except IntegrityError:
+            # Lost a race with another writer; redo the chunk row by row
+            db.session.rollback()
+            for row in fresh:
+                try:
+                    with db.session.begin_nested():
+                        self._insert([row], report)
+                except IntegrityError:
+                    report.error(row[0], row[1]['email'], 'Email already registered')
+            db.session.commit()
+        # Rows that lost a race are registered too, so all of them go in
+        for _, user, _ in fresh:
+            email_filter.add(user['email_normalized'])
+
+    @staticmethod
+    def _insert(rows, report):
+        inserted = db.session.execute(
+            db.insert(User).returning(User.id, User.email),
+            [user for _, user, _ in rows]
+        )
+        ids = {email: user_id for user_id, email in inserted}
+        links = [dict(link, user_id=ids[user['email']], created_at=datetime.utcnow())
+                 for _, user, providers in rows for link in providers]
+        if links:
+            db.session.execute(db.insert(UserOAuthProvider), links)
+        report.imported += len(rows)
+        report.providers += len(links)
+
+    def export_users(self, include_passwords=False, chunk_size=None):
+        """Yield every user as an import-compatible dict, in id order"""
+        chunk_size = chunk_size or self.chunk_size
+        last_id = 0
+        while True:
+            users = db.session.execute(
+                db.select(User.__table__).where(User.id > last_id).order_by(User.id).limit(chunk_size)
+            ).all()
+            if not users:
+                break
+            providers = {}
+            for link in db.session.execute(
+                db.select(UserOAuthProvider.user_id, UserOAuthProvider.provider,
+                          UserOAuthProvider.provider_user_id)
+                .where(UserOAuthProvider.user_id.in_([user.id for user in users]))
+                .order_by(UserOAuthProvider.id)
+            ):
+                providers.setdefault(link.user_id, []).append(
+                    {'provider': link.provider, 'provider_user_id': link.provider_user_id}
+                )
+            for user in users:
+                row = {
+                    'email': user.email,
+                    'name': user.name,
+                    'created_at': _isoformat(user.created_at),
+                    'last_login': _isoformat(user.last_login),
+                    'providers': providers.get(user.id, [])
+                }
+                if include_passwords and user.password:
+                    row['password_hash'] = user.password
+                yield row
+            last_id = users[-1].id
+            # Release the identity map between pages
+            db.session.expire_all()
+
+    @staticmethod
+    def serialize(rows, fmt='ndjson'):
+        """Yield export rows as NDJSON lines or CSV text"""
+        if fmt == 'ndjson':
+            for row in rows:
+                yield json.dumps(row, separators=(',', ':')) + '\n'
+            return
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, CSV_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            row = dict(row, providers='|'.join(
+                '%(provider)s:%(provider_user_id)s' % link for link in row['providers']
+            ))
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+
+def _parse_row(row):
+    """Return (user values, provider links) or an error message"""
+    if row.get('_invalid'):
+        return row['_invalid']
+    email = (row.get('email') or '').strip()
+    if not email:
+        return 'Missing email'
+    try:
+        validate_email(email, check_deliverability=False)
+    except EmailNotValidError as e:
+        return 'Invalid email: %s' % e
+
+    password = row.get('password_hash')
+    if password and not BCRYPT_HASH.match(password):
+        return 'password_hash is not a bcrypt hash'
+
+    # Every row carries the same keys so the chunk is one executemany
+    user = {'email': email, 'email_normalized': normalize_email(email), 'name': row.get('name'),
+            'password': password or None, 'created_at': None, 'last_login': None}
+    for field in ('created_at', 'last_login'):
+        value = row.get(field)
+        if value:
+            try:
+                user[field] = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                return 'Invalid %s' % field
+    user['created_at'] = user['created_at'] or datetime.utcnow()
+
+    providers = []
+    seen = set()
+    for link in row.get('providers') or []:
+        if not isinstance(link, dict) or not link.get('provider') or link.get('provider_user_id') in (None, ''):
+            return 'Invalid provider link'
+        if link['provider'] in seen:
+            return 'Duplicate provider %s' % link['provider']
+        seen.add(link['provider'])
+        providers.append({'provider': str(link['provider']),
+                          'provider_user_id': str(link['provider_user_id'])})
+    return user, providers
+
+
+def _format_for(name):
+    return 'csv' if name and name.endswith('.csv') else 'ndjson'
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+user_transfer = UserTransfer()
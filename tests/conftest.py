@@ -0,0 +1,39 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from app import create_app
+from config.config import Config
+
+PASSWORD = 'test-password'
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """create_app() against a throwaway SQLite database, config overrides as keywords"""
+    def make(**overrides):
+        settings = {
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///%s' % (tmp_path / 'app.db'),
+            'SESSION_STORE_PATH': str(tmp_path / 'sessions.sqlite3'),
+            'AUTO_CREATE_TABLES': True,
+            'TESTING': True,
+            'BCRYPT_ROUNDS': 4,
+            'EMAIL_VALIDATION_MODE': 'syntax',
+            # Loads on a background thread, tests that need it turn it on
+            'EMAIL_FILTER_ENABLED': False,
+            'LOGIN_WRITE_BEHIND': False,
+            'SHARED_CACHE_PATH': None,
+            'TOKEN_VERIFICATION_MODE': 'stateful'
+        }
+        settings.update(overrides)
+        return create_app(type('TestConfig', (Config,), settings))
+    return make
+
+
+def register(client, email, password=PASSWORD):
+    """Register through the API, return the new user's id"""
+    response = client.post('/auth/register', json={'email': email, 'password': password})
+    assert response.status_code == 200, response.json
+    return response.json['user']['id']
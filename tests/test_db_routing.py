@@ -0,0 +1,106 @@
+"""Read routing with a primary and one replica, both local SQLite files.
+
+The replica is a file copy of the primary taken by replicate(); writes
+made after the copy stand in for replication lag.
+"""
+import shutil
+import pytest
+from conftest import register
+from models.user import User, UserToken, db
+from services.user_service import UserService
+from utils.token_cache import token_cache
+from utils.token_manager import TokenManager
+
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    return make_app(SQLALCHEMY_REPLICA_URIS='sqlite:///%s' % (tmp_path / 'replica.db'))
+
+
+@pytest.fixture
+def replicate(app, tmp_path):
+    def copy():
+        with app.app_context():
+            db.engines['replica_0'].dispose()
+            db.engine.dispose()
+        shutil.copyfile(tmp_path / 'app.db', tmp_path / 'replica.db')
+    return copy
+
+
+def rename_on_primary(app, user_id, name):
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(db.update(User).where(User.id == user_id).values(name=name))
+
+
+def test_reads_go_to_replica(app, replicate):
+    user_id = register(app.test_client(), 'reader@example.io')
+    rename_on_primary(app, user_id, 'replicated')
+    replicate()
+    rename_on_primary(app, user_id, 'primary only')
+
+    with app.app_context():
+        assert db.session.execute(db.select(User.name).filter_by(id=user_id)).scalar() == 'replicated'
+        assert db.session.info['db_replica'] == 'replica_0'
+        assert not db.session.info.get('db_pinned')
+
+
+def test_session_stays_on_primary_after_write(app, replicate):
+    user_id = register(app.test_client(), 'writer@example.io')
+    other_id = register(app.test_client(), 'other@example.io')
+    rename_on_primary(app, user_id, 'replicated')
+    replicate()
+    rename_on_primary(app, user_id, 'primary only')
+
+    with app.app_context():
+        select = db.select(User.name).filter_by(id=user_id)
+        assert db.session.execute(select).scalar() == 'replicated'
+        db.session.execute(db.update(User).where(User.id == other_id).values(name='written'))
+        db.session.commit()
+        # Pinned for the rest of the session, commit included
+        assert db.session.info['db_pinned']
+        assert db.session.execute(select).scalar() == 'primary only'
+        assert db.session.execute(db.select(User.name).filter_by(id=other_id)).scalar() == 'written'
+
+
+def test_missing_row_falls_back_to_primary(app, replicate):
+    register(app.test_client(), 'old@example.io')
+    replicate()
+    # Not replicated yet
+    user_id = register(app.test_client(), 'new@example.io')
+
+    with app.app_context():
+        assert UserService.get_user_by_email('new@example.io').id == user_id
+    with app.test_request_context():
+        assert UserService.get_user(user_id).email == 'new@example.io'
+
+
+def test_token_lookup_on_primary(app, replicate):
+    user_id = register(app.test_client(), 'token@example.io')
+    replicate()
+    # The family exists on the primary only
+    with app.app_context():
+        access_token, _ = TokenManager.generate_and_store_tokens(user_id)
+    token_cache.clear()
+    with app.test_request_context():
+        assert TokenManager.authenticate(access_token)[0] == user_id
+
+
+def test_revoked_family_rejected_despite_lag(app, replicate):
+    user_id = register(app.test_client(), 'lagging@example.io')
+    with app.app_context():
+        old_token, _ = TokenManager.generate_and_store_tokens(user_id)
+    replicate()
+    # A second login revokes the first family, on the primary only
+    with app.app_context():
+        new_token, _ = TokenManager.generate_and_store_tokens(user_id)
+    token_cache.clear()
+
+    with app.app_context():
+        assert db.session.execute(
+            db.select(db.func.count()).select_from(UserToken).filter_by(is_active=True)
+        ).scalar() == 1
+    with app.test_request_context():
+        assert TokenManager.authenticate(old_token) == (None, None)
+    with app.test_request_context():
+        assert TokenManager.authenticate(new_token)[0] == user_id
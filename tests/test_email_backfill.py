@@ -0,0 +1,153 @@
+"""The documented upgrade of a database created before this schema.
+
+The fixture builds the original tables (user without email_normalized,
+email_deliverable or version, user_token holding raw tokens) and fills
+them; the tests then run the upgrade commands through the CLI runner.
+"""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import (Boolean, Column, DateTime, ForeignKey, Integer, MetaData, String, Table,
+                        UniqueConstraint)
+from conftest import register
+from models.user import LoginAudit, User, UserOAuthProvider, UserToken, db
+
+legacy = MetaData()
+legacy_user = Table(
+    'user', legacy,
+    Column('id', Integer, primary_key=True),
+    Column('email', String(120), unique=True, nullable=False),
+    Column('password', String(200)),
+    Column('name', String(120)),
+    Column('created_at', DateTime),
+    Column('last_login', DateTime)
+)
+legacy_provider = Table(
+    'user_o_auth_provider', legacy,
+    Column('id', Integer, primary_key=True),
+    Column('user_id', Integer, ForeignKey('user.id'), nullable=False),
+    Column('provider', String(20), nullable=False),
+    Column('provider_user_id', String(100), nullable=False),
+    Column('created_at', DateTime),
+    UniqueConstraint('user_id', 'provider', name='unique_user_provider')
+)
+legacy_token = Table(
+    'user_token', legacy,
+    Column('id', Integer, primary_key=True),
+    Column('user_id', Integer, ForeignKey('user.id'), nullable=False),
+    Column('access_token', String(500), nullable=False),
+    Column('refresh_token', String(500), nullable=False),
+    Column('created_at', DateTime),
+    Column('expires_at', DateTime, nullable=False),
+    Column('is_active', Boolean)
+)
+
+
+@pytest.fixture
+def make_legacy_app(make_app):
+    def make(users, links=()):
+        """users: (email, password, name) in id order; links: (user index, provider, provider id)"""
+        app = make_app(AUTO_CREATE_TABLES=False)
+        with app.app_context():
+            legacy.create_all(db.engine)
+            with db.engine.begin() as conn:
+                for email, password, name in users:
+                    conn.execute(legacy_user.insert().values(email=email, password=password, name=name))
+                for index, provider, provider_id in links:
+                    conn.execute(legacy_provider.insert().values(
+                        user_id=index + 1, provider=provider, provider_user_id=provider_id))
+                conn.execute(legacy_token.insert().values(
+                    user_id=1, access_token='a', refresh_token='r',
+                    expires_at=datetime.utcnow() + timedelta(days=1), is_active=True))
+        return app
+    return make
+
+
+def upgrade(app, *backfill_args):
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=['reset-user-tokens', '--yes']).exit_code == 0
+    assert runner.invoke(args=['init-db']).exit_code == 0
+    return runner.invoke(args=['backfill-email-normalized'] + list(backfill_args))
+
+
+def users(app):
+    with app.app_context():
+        return {user.id: user for user in User.query.order_by(User.id)}
+
+
+def test_upgrade_without_collisions(make_legacy_app):
+    app = make_legacy_app([('Alice@Example.io', 'hash-a', 'Alice'), ('bob@example.io', None, 'Bob')])
+    result = upgrade(app)
+    assert result.exit_code == 0, result.output
+    for column in ('email_normalized', 'email_deliverable', 'version'):
+        assert 'added column user.%s' % column in result.output
+    assert 'created unique index on user.email_normalized' in result.output
+
+    by_id = users(app)
+    assert by_id[1].email_normalized == 'alice@example.io'
+    assert by_id[1].version == 1
+    assert by_id[1].email_deliverable is None
+    with app.app_context():
+        assert UserToken.query.count() == 0
+
+    # The model works against the upgraded table, and the index holds
+    client = app.test_client()
+    register(client, 'carol@example.io')
+    response = client.post('/auth/register', json={'email': 'ALICE@example.io', 'password': 'x' * 12})
+    assert response.status_code == 400
+
+    # Every step is safe to re-run
+    result = upgrade(app)
+    assert result.exit_code == 0, result.output
+    assert 'added column' not in result.output
+
+
+def test_collisions_block_the_index(make_legacy_app):
+    app = make_legacy_app([('dave@example.io', 'hash-1', None), ('Dave@example.io', 'hash-2', None)])
+    result = upgrade(app)
+    assert result.exit_code != 0
+    assert 'collision dave@example.io: users 1, 2' in result.output
+    assert 'created unique index' not in result.output
+
+
+def test_merge_keeps_the_account_with_credentials(make_legacy_app):
+    # The older account has no way to log in; the newer one has a password
+    app = make_legacy_app([('Erin@example.io', None, 'Older name'), ('erin@example.io', 'hash-erin', None)])
+    with app.app_context():
+        db.create_all(bind_key=None)
+        db.session.add(LoginAudit(user_id=1, provider='github'))
+        db.session.commit()
+
+    result = upgrade(app, '--merge')
+    assert result.exit_code == 0, result.output
+    assert 'merged users 1 into 2' in result.output
+
+    by_id = users(app)
+    assert list(by_id) == [2]
+    kept = by_id[2]
+    assert kept.password == 'hash-erin'
+    # Profile fields are not copied over either
+    assert kept.name is None
+    assert kept.version == 2
+    with app.app_context():
+        assert [audit.user_id for audit in LoginAudit.query] == [2]
+
+
+def test_merge_never_moves_credentials(make_legacy_app):
+    app = make_legacy_app(
+        [('frank@example.io', None, 'Frank'), ('Frank@example.io', 'attacker-hash', 'Attacker'),
+         ('gina@example.io', 'hash-1', None), ('GINA@example.io', 'hash-2', None)],
+        links=[(0, 'github', '1001')]
+    )
+    result = upgrade(app, '--merge')
+    # A provider login and a password, and two passwords: both by hand
+    assert result.exit_code != 0
+    assert 'collision frank@example.io: users 1, 2 each have a password or provider login' in result.output
+    assert 'collision gina@example.io: users 3, 4 each have a password or provider login' in result.output
+    assert 'created unique index' not in result.output
+
+    by_id = users(app)
+    assert [(user.id, user.password, user.name) for user in by_id.values()] == [
+        (1, None, 'Frank'), (2, 'attacker-hash', 'Attacker'), (3, 'hash-1', None), (4, 'hash-2', None)
+    ]
+    with app.app_context():
+        assert [(link.user_id, link.provider) for link in UserOAuthProvider.query] == [(1, 'github')]
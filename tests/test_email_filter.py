@@ -0,0 +1,108 @@
+"""The Bloom filter and the signup email filter built on it."""
+import time
+import pytest
+from conftest import PASSWORD, register
+from models.user import User, db
+from utils.bloom import BloomFilter
+from utils.email_filter import EmailFilter, email_filter
+
+
+def wait_until_ready(timeout=5):
+    deadline = time.monotonic() + timeout
+    while not email_filter.ready:
+        assert time.monotonic() < deadline, 'email filter did not load'
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    return make_app(EMAIL_FILTER_ENABLED=True, EMAIL_FILTER_CAPACITY=1000, EMAIL_FILTER_ERROR_RATE=1e-6,
+                    EMAIL_FILTER_PATH=str(tmp_path / 'emails.bloom'))
+
+
+def add_users(app, *emails):
+    with app.app_context():
+        for email in emails:
+            db.session.add(User(email=email))
+        db.session.commit()
+
+
+def test_bloom_has_no_false_negatives():
+    bloom = BloomFilter(1000, 0.01)
+    items = ['user%d@example.io' % i for i in range(1000)]
+    for item in items:
+        bloom.add(item)
+    assert all(item in bloom for item in items)
+    assert bloom.count == 1000
+
+
+def test_bloom_false_positive_rate():
+    bloom = BloomFilter.from_items(['user%d@example.io' % i for i in range(1000)], capacity=1000,
+                                   error_rate=0.01)
+    false_positives = sum('other%d@example.io' % i in bloom for i in range(10000))
+    # 1% expected; leave room for the randomness of the hash
+    assert false_positives < 250
+
+
+def test_bloom_bytes_round_trip():
+    bloom = BloomFilter.from_items(['a@example.io', 'b@example.io'], capacity=100)
+    copy = BloomFilter.from_bytes(bloom.to_bytes())
+    assert 'a@example.io' in copy and 'b@example.io' in copy
+    assert (copy.count, copy.capacity, copy.size_bytes) == (2, 100, bloom.size_bytes)
+    with pytest.raises(ValueError):
+        BloomFilter.from_bytes(bloom.to_bytes()[:-1])
+
+
+def test_unloaded_filter_says_maybe(app):
+    add_users(app, 'known@example.io')
+    assert not email_filter.ready
+    # The first lookup starts the load and cannot wait for it
+    assert email_filter.might_exist('unknown@example.io')
+    wait_until_ready()
+    assert email_filter.might_exist('known@example.io')
+    assert not email_filter.might_exist('unknown@example.io')
+
+
+def test_adds_during_load_are_kept(app):
+    email_filter.might_exist('anyone@example.io')
+    email_filter.add('racing@example.io')
+    wait_until_ready()
+    assert email_filter.might_exist('racing@example.io')
+
+
+def test_signup_skips_lookup_for_new_address(app):
+    client = app.test_client()
+    register(client, 'first@example.io')
+    wait_until_ready()
+
+    skipped = email_filter.skipped_lookups
+    register(client, 'second@example.io')
+    assert email_filter.skipped_lookups == skipped + 1
+    assert email_filter.might_exist('second@example.io')
+
+    # A known address still goes to the database and is refused
+    response = client.post('/auth/register', json={'email': 'SECOND@example.io', 'password': PASSWORD})
+    assert response.status_code == 400
+
+
+def test_snapshot_plus_newer_users(app, tmp_path):
+    add_users(app, 'old@example.io')
+    result = app.test_cli_runner().invoke(args=['rebuild-email-filter'])
+    assert result.exit_code == 0, result.output
+    bloom, last_id = EmailFilter.read_snapshot(str(tmp_path / 'emails.bloom'))
+    assert last_id == 1
+    assert 'old@example.io' in bloom
+
+    # Created after the snapshot: picked up by the scan from last_id
+    add_users(app, 'new@example.io')
+    email_filter.might_exist('anyone@example.io')
+    wait_until_ready()
+    assert email_filter.might_exist('old@example.io')
+    assert email_filter.might_exist('new@example.io')
+
+
+def test_unreadable_snapshot_ignored(tmp_path):
+    path = tmp_path / 'broken.bloom'
+    path.write_bytes(b'not a snapshot')
+    assert EmailFilter.read_snapshot(str(path)) is None
+    assert EmailFilter.read_snapshot(str(tmp_path / 'missing.bloom')) is None
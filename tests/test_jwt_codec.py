@@ -0,0 +1,89 @@
+"""HS256Codec against PyJWT: same tokens, same verdicts."""
+import uuid
+from calendar import timegm
+from datetime import datetime, timedelta
+import jwt
+import pytest
+from utils.jwt_codec import HS256Codec
+
+SECRET = 'test-secret-key'
+codec = HS256Codec(SECRET)
+
+ENCODERS = {
+    'codec': codec.encode,
+    'pyjwt': lambda payload: jwt.encode(payload, SECRET, algorithm='HS256')
+}
+DECODERS = {
+    'codec': codec.decode,
+    'pyjwt': lambda token: jwt.decode(token, SECRET, algorithms=['HS256'])
+}
+
+
+def payload(**overrides):
+    values = {
+        'user_id': 42,
+        'exp': datetime.utcnow() + timedelta(minutes=30),
+        'type': 'access',
+        'fam': uuid.uuid4().hex,
+        'jti': uuid.uuid4().hex
+    }
+    values.update(overrides)
+    return values
+
+
+@pytest.mark.parametrize('encoder', ENCODERS)
+@pytest.mark.parametrize('decoder', DECODERS)
+def test_round_trip(encoder, decoder):
+    claims = payload()
+    decoded = DECODERS[decoder](ENCODERS[encoder](claims))
+    assert decoded['user_id'] == 42
+    assert decoded['fam'] == claims['fam']
+    assert decoded['exp'] == timegm(claims['exp'].utctimetuple())
+
+
+def test_tokens_identical():
+    claims = payload(iat=datetime.utcnow())
+    assert codec.encode(claims) == jwt.encode(claims, SECRET, algorithm='HS256')
+    assert jwt.get_unverified_header(codec.encode(claims)) == {'alg': 'HS256', 'typ': 'JWT'}
+
+
+@pytest.mark.parametrize('encoder', ENCODERS)
+@pytest.mark.parametrize('decoder', DECODERS)
+def test_expired_rejected(encoder, decoder):
+    token = ENCODERS[encoder](payload(exp=datetime.utcnow() - timedelta(seconds=10)))
+    with pytest.raises(jwt.ExpiredSignatureError):
+        DECODERS[decoder](token)
+
+
+@pytest.mark.parametrize('encoder', ENCODERS)
+@pytest.mark.parametrize('decoder', DECODERS)
+def test_bad_signature_rejected(encoder, decoder):
+    claims = payload()
+    forged = HS256Codec('another-secret').encode(claims) if encoder == 'codec' else \
+        jwt.encode(claims, 'another-secret', algorithm='HS256')
+    with pytest.raises(jwt.InvalidSignatureError):
+        DECODERS[decoder](forged)
+
+    # A payload swapped under a valid signature
+    header, _, signature = ENCODERS[encoder](claims).split('.')
+    other = ENCODERS[encoder](payload(user_id=1)).split('.')[1]
+    with pytest.raises(jwt.InvalidSignatureError):
+        DECODERS[decoder]('.'.join((header, other, signature)))
+
+
+@pytest.mark.parametrize('encoder', ENCODERS)
+@pytest.mark.parametrize('exp', ['tomorrow', None, [1], True])
+def test_non_numeric_exp_rejected(encoder, exp):
+    token = ENCODERS[encoder](payload(exp=exp))
+    with pytest.raises(jwt.DecodeError):
+        codec.decode(token)
+    # PyJWT runs int(exp): None or a list escape as TypeError and True
+    # reads as 1, so expired; both are still rejections
+    with pytest.raises((jwt.InvalidTokenError, TypeError)):
+        DECODERS['pyjwt'](token)
+
+
+def test_codec_rejects_other_algorithms():
+    token = jwt.encode(payload(), SECRET, algorithm='HS512')
+    with pytest.raises(jwt.DecodeError):
+        codec.decode(token)
@@ -0,0 +1,42 @@
+"""Profile paths and identity mapping of the provider registry."""
+import types
+import pytest
+from flask_oauthlib.client import OAuthException
+from utils.oauth_providers import ProviderRegistry
+
+
+@pytest.fixture
+def providers():
+    registry = ProviderRegistry()
+    registry.init_app(types.SimpleNamespace(config={}), oauth=None)
+    return registry
+
+
+def test_github_public_email_skips_emails_call(providers):
+    user = {'id': 7, 'name': 'Octo', 'email': 'octo@example.io'}
+    assert providers.profile_paths('github') == ['user']
+    assert providers.email_paths('github', [user]) == []
+    assert providers.identity('github', [user]) == ('octo@example.io', 'Octo', 7)
+
+
+def test_github_private_email_reads_emails(providers):
+    user = {'id': 7, 'name': 'Octo', 'email': None}
+    assert providers.email_paths('github', [user]) == ['user/emails']
+    emails = [
+        {'email': 'old@example.io', 'primary': False, 'verified': True},
+        {'email': 'unverified@example.io', 'primary': True, 'verified': False},
+        {'email': 'octo@example.io', 'primary': True, 'verified': True}
+    ]
+    assert providers.identity('github', [user, emails]) == ('octo@example.io', 'Octo', 7)
+
+
+def test_no_email_anywhere(providers):
+    user = {'id': 7, 'name': 'Octo', 'email': None}
+    with pytest.raises(OAuthException):
+        providers.identity('github', [user, []])
+
+
+def test_field_providers_have_no_email_paths(providers):
+    me = {'id': '1', 'name': 'Face', 'email': 'face@example.io'}
+    assert providers.email_paths('facebook', [me]) == []
+    assert providers.identity('facebook', [me]) == ('face@example.io', 'Face', '1')
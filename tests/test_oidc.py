@@ -0,0 +1,198 @@
+"""id_token verification against a stub JWKS endpoint.
+
+Keys are generated locally; the stub HTTP client serves whatever key set
+the test puts in it and counts the fetches.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+import utils.oidc
+from utils.oidc import JWKSCache, OIDCVerifier
+
+CLIENT_ID = 'test-client'
+ISSUER = 'https://issuer.example.io'
+JWKS_URL = ISSUER + '/jwks'
+
+
+def rsa_key(kid):
+    """(private PEM, public JWK) for a fresh 2048-bit RSA key"""
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ).decode()
+    public_pem = private.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    public = jwk.construct(public_pem, 'RS256').to_dict()
+    public = {name: value.decode() if isinstance(value, bytes) else value
+              for name, value in public.items()}
+    public['kid'] = kid
+    return private_pem, public, public_pem
+
+
+class StubResponse:
+    def __init__(self, keys, cache_control):
+        self.status_code = 200
+        self.headers = {'Cache-Control': cache_control} if cache_control else {}
+        self._body = {'keys': keys}
+
+    def json(self):
+        return self._body
+
+
+class StubJWKSClient:
+    """Stands in for the pooled provider client"""
+
+    def __init__(self, keys, cache_control=None):
+        self.keys = keys
+        self.cache_control = cache_control
+        self.fetches = 0
+
+    def request(self, provider, method, url):
+        assert (method, url) == ('GET', JWKS_URL)
+        self.fetches += 1
+        return StubResponse(list(self.keys), self.cache_control)
+
+
+class Clock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(utils.oidc.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture(scope='module')
+def keys():
+    return {kid: rsa_key(kid) for kid in ('k1', 'k2')}
+
+
+def claims(**overrides):
+    now = int(time.time())
+    values = {'iss': ISSUER, 'aud': CLIENT_ID, 'sub': '42', 'iat': now, 'exp': now + 300}
+    values.update(overrides)
+    return values
+
+
+def sign(keys, kid, algorithm='RS256', **overrides):
+    return jwt.encode(claims(**overrides), keys[kid][0], algorithm=algorithm, headers={'kid': kid})
+
+
+def b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def verifier(client, **kwargs):
+    return OIDCVerifier(JWKSCache('test', JWKS_URL, client, **kwargs), CLIENT_ID, [ISSUER])
+
+
+def test_valid_token(keys, clock):
+    client = StubJWKSClient([keys['k1'][1]])
+    assert verifier(client).verify(sign(keys, 'k1'))['sub'] == '42'
+
+
+def test_unknown_kid_refetches(keys, clock):
+    client = StubJWKSClient([keys['k1'][1]])
+    oidc = verifier(client, min_refresh_interval=30)
+    assert oidc.verify(sign(keys, 'k1')) is not None
+    assert client.fetches == 1
+
+    # The provider rotates to k2
+    client.keys = [keys['k1'][1], keys['k2'][1]]
+    token = sign(keys, 'k2')
+    # Too soon after the last fetch: a forged kid must not trigger one
+    clock.now += 10
+    assert oidc.verify(token) is None
+    assert client.fetches == 1
+
+    clock.now += 30
+    assert oidc.verify(token)['sub'] == '42'
+    assert client.fetches == 2
+
+
+def test_cache_control_max_age(keys, clock):
+    client = StubJWKSClient([keys['k1'][1]], cache_control='public, max-age=60')
+    oidc = verifier(client, default_max_age=3600)
+    token = sign(keys, 'k1')
+    assert oidc.verify(token) is not None
+
+    clock.now += 59
+    assert oidc.verify(token) is not None
+    assert client.fetches == 1
+
+    clock.now += 2
+    assert oidc.verify(token) is not None
+    assert client.fetches == 2
+
+
+def test_default_max_age_without_cache_control(keys, clock):
+    client = StubJWKSClient([keys['k1'][1]])
+    oidc = verifier(client, default_max_age=100)
+    token = sign(keys, 'k1')
+    oidc.verify(token)
+    clock.now += 99
+    oidc.verify(token)
+    assert client.fetches == 1
+    clock.now += 2
+    oidc.verify(token)
+    assert client.fetches == 2
+
+
+def test_algorithm_comes_from_jwk(keys, clock):
+    client = StubJWKSClient([keys['k1'][1]])
+    oidc = verifier(client)
+    # Validly signed by the right key, but not with the key's algorithm
+    assert oidc.verify(sign(keys, 'k1', algorithm='RS512')) is None
+
+    # HS256 keyed with the public key, the classic algorithm confusion
+    header = b64(json.dumps({'alg': 'HS256', 'typ': 'JWT', 'kid': 'k1'}).encode())
+    payload = b64(json.dumps(claims()).encode())
+    signature = hmac.new(keys['k1'][2].encode(), ('%s.%s' % (header, payload)).encode(),
+                         hashlib.sha256).digest()
+    assert oidc.verify('%s.%s.%s' % (header, payload, b64(signature))) is None
+
+
+def test_algorithm_inferred_from_key_type(keys, clock):
+    public = dict(keys['k1'][1])
+    del public['alg']
+    client = StubJWKSClient([public])
+    oidc = verifier(client)
+    assert oidc.verify(sign(keys, 'k1')) is not None
+    assert oidc.verify(sign(keys, 'k1', algorithm='RS384')) is None
+
+
+def test_wrong_audience_rejected(keys, clock):
+    client = StubJWKSClient([keys['k1'][1]])
+    assert verifier(client).verify(sign(keys, 'k1', aud='another-client')) is None
+
+
+def test_wrong_issuer_rejected(keys, clock):
+    client = StubJWKSClient([keys['k1'][1]])
+    assert verifier(client).verify(sign(keys, 'k1', iss='https://evil.example.io')) is None
+
+
+def test_expired_token_rejected(keys, clock):
+    client = StubJWKSClient([keys['k1'][1]])
+    now = int(time.time())
+    assert verifier(client).verify(sign(keys, 'k1', iat=now - 600, exp=now - 300)) is None
@@ -0,0 +1,73 @@
+"""SQL statements per request on the hot endpoints.
+
+Runs create_app() against a throwaway SQLite database and counts every
+statement through a before_cursor_execute listener.
+"""
+import pytest
+from sqlalchemy import event
+from conftest import PASSWORD, register
+from models.user import db
+from utils.token_cache import token_cache
+from utils.token_manager import TokenManager
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def statements(app):
+    counter = StatementCounter()
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', counter)
+    yield counter
+    event.remove(engine, 'before_cursor_execute', counter)
+
+
+def test_register(app, statements):
+    client = app.test_client()
+    statements.count = 0
+    register(client, 'register@example.io')
+    # Existence check and the insert
+    assert statements.count == 2
+
+
+def test_login(app, statements):
+    client = app.test_client()
+    register(client, 'login@example.io')
+    statements.count = 0
+    response = client.post('/auth/login', json={'email': 'login@example.io', 'password': PASSWORD})
+    assert response.status_code == 200
+    # User and providers in one query
+    assert statements.count == 1
+
+
+def test_profile_me(app, statements):
+    client = app.test_client()
+    user_id = register(client, 'profile@example.io')
+    with app.app_context():
+        access_token, _ = TokenManager.generate_and_store_tokens(user_id)
+    token_cache.clear()
+    headers = {'Authorization': 'Bearer ' + access_token}
+
+    statements.count = 0
+    response = client.get('/profile/me', headers=headers)
+    assert response.status_code == 200
+    # Token cache miss: the family lookup and the user with its providers
+    assert statements.count == 2
+
+    statements.count = 0
+    response = client.get('/profile/me', headers=headers)
+    assert response.status_code == 200
+    assert response.json['email'] == 'profile@example.io'
+    assert statements.count == 0
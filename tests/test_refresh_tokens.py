@@ -0,0 +1,124 @@
+"""Refresh token rotation, reuse detection and the compare-and-set."""
+import threading
+import pytest
+from conftest import register
+from models.user import UserToken, db
+from routes.profile import REFRESH_ERRORS
+from utils.token_manager import TokenManager
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(app, client, email):
+    user_id = register(client, email)
+    with app.app_context():
+        access_token, refresh_token = TokenManager.generate_and_store_tokens(user_id)
+    return user_id, access_token, refresh_token
+
+
+def refresh(client, refresh_token):
+    return client.post('/profile/refresh-token', json={'refresh_token': refresh_token})
+
+
+def profile(client, access_token):
+    return client.get('/profile/me', headers={'Authorization': 'Bearer ' + access_token})
+
+
+def family(app, user_id):
+    with app.app_context():
+        return db.session.execute(db.select(UserToken).filter_by(user_id=user_id)).scalar_one()
+
+
+def test_refresh_rotates(app, client):
+    user_id, _, refresh_token = login(app, client, 'rotate@example.io')
+    digest = family(app, user_id).refresh_digest
+
+    response = refresh(client, refresh_token)
+    assert response.status_code == 200
+    rotated = response.json['refresh_token']
+    assert rotated != refresh_token
+    assert profile(client, response.json['access_token']).status_code == 200
+
+    token = family(app, user_id)
+    assert token.generation == 1
+    assert token.is_active
+    assert token.refresh_digest != digest
+    assert token.refresh_digest == TokenManager.token_digest(rotated)
+    # The stored digest is never the token itself
+    assert rotated not in (token.refresh_digest, token.family_id)
+
+    response = refresh(client, rotated)
+    assert response.status_code == 200
+    assert family(app, user_id).generation == 2
+
+
+def test_replayed_refresh_token_revokes_family(app, client):
+    user_id, access_token, refresh_token = login(app, client, 'replay@example.io')
+    # Verified once, so it sits in the token cache
+    assert profile(client, access_token).status_code == 200
+
+    response = refresh(client, refresh_token)
+    assert response.status_code == 200
+    rotated_access = response.json['access_token']
+    rotated_refresh = response.json['refresh_token']
+    assert profile(client, rotated_access).status_code == 200
+
+    # The old refresh token comes back: someone kept a copy
+    response = refresh(client, refresh_token)
+    assert response.status_code == 401
+    assert response.json['error'] == REFRESH_ERRORS['reused']
+    assert not family(app, user_id).is_active
+
+    # Every token of the family is dead, cached ones included
+    assert profile(client, access_token).status_code == 401
+    assert profile(client, rotated_access).status_code == 401
+    assert refresh(client, rotated_refresh).status_code == 401
+
+
+def test_refresh_rejects_access_token(app, client):
+    _, access_token, _ = login(app, client, 'wrongtype@example.io')
+    response = refresh(client, access_token)
+    assert response.status_code == 401
+    assert response.json['error'] == REFRESH_ERRORS['invalid']
+
+
+def test_concurrent_refresh_one_winner(app, client, monkeypatch):
+    user_id, _, refresh_token = login(app, client, 'race@example.io')
+    # Both threads reach the compare-and-set UPDATE together
+    barrier = threading.Barrier(2)
+    mint = TokenManager._refresh_token
+
+    def refresh_token_at_barrier(*args):
+        token = mint(*args)
+        barrier.wait(timeout=5)
+        return token
+
+    monkeypatch.setattr(TokenManager, '_refresh_token', staticmethod(refresh_token_at_barrier))
+    results = []
+
+    def run():
+        with app.app_context():
+            results.append(TokenManager.refresh(refresh_token))
+
+    threads = [threading.Thread(target=run) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    assert len(results) == 2
+    winners = [tokens for tokens, error in results if error is None]
+    assert len(winners) == 1
+    # The loser presented a generation that is already gone: reuse
+    assert [error for _, error in results if error is not None] == ['reused']
+    token = family(app, user_id)
+    assert token.generation == 1
+    assert not token.is_active
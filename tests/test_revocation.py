@@ -0,0 +1,91 @@
+"""Stateless access token verification against the revocation event log.
+
+The poll thread is parked with a long interval; the tests call sync()
+themselves, standing in for the poll that follows a revoke in another
+worker.
+"""
+import time
+from datetime import datetime, timedelta
+import pytest
+from conftest import register
+from models.user import RevocationEvent, UserToken, db
+from utils.revocation import RevocationSet, revocation_set
+from utils.token_manager import TokenManager
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app(TOKEN_VERIFICATION_MODE='stateless', REVOCATION_POLL_INTERVAL=3600)
+
+
+def login(app, user_id):
+    with app.app_context():
+        access_token, _ = TokenManager.generate_and_store_tokens(user_id)
+        family_id = UserToken.query.filter_by(user_id=user_id, is_active=True).one().family_id
+    return access_token, family_id
+
+
+def authenticate(app, token):
+    with app.test_request_context():
+        return TokenManager.authenticate(token)[0]
+
+
+def test_unrevoked_token_accepted(app):
+    user_id = register(app.test_client(), 'kept@example.io')
+    access_token, _ = login(app, user_id)
+    assert revocation_set.synced
+    assert authenticate(app, access_token) == user_id
+
+    # Another user's revocation does not touch this family
+    other_id = register(app.test_client(), 'other@example.io')
+    login(app, other_id)
+    login(app, other_id)
+    with app.app_context():
+        revocation_set.sync()
+        assert RevocationEvent.query.count() == 1
+    assert authenticate(app, access_token) == user_id
+
+
+def test_revoked_family_rejected_after_poll(app):
+    user_id = register(app.test_client(), 'revoked@example.io')
+    old_token, old_family = login(app, user_id)
+    # Verified once, so the token cache holds it too
+    assert authenticate(app, old_token) == user_id
+
+    # A new login revokes the user's other families and logs an event
+    new_token, new_family = login(app, user_id)
+    with app.app_context():
+        assert [event.family_id for event in RevocationEvent.query] == [old_family]
+        revocation_set.sync()
+
+    assert revocation_set.is_revoked(old_family)
+    assert not revocation_set.is_revoked(new_family)
+    assert authenticate(app, old_token) is None
+    assert authenticate(app, new_token) == user_id
+
+
+def test_revocation_written_elsewhere_seen_after_poll(app):
+    user_id = register(app.test_client(), 'elsewhere@example.io')
+    access_token, family_id = login(app, user_id)
+    with app.app_context():
+        db.session.add(RevocationEvent(family_id=family_id,
+                                       expires_at=datetime.utcnow() + timedelta(minutes=30)))
+        db.session.commit()
+        revocation_set.sync()
+    assert authenticate(app, access_token) is None
+
+
+def test_unsynced_set_rejects_everything():
+    revoked = RevocationSet()
+    assert revoked.is_revoked('0' * 32)
+
+
+def test_expired_revocations_pruned():
+    revoked = RevocationSet(capacity=100)
+    revoked.synced = True
+    revoked.add('a' * 32, time.time() - 1)
+    revoked.add('b' * 32, time.time() + 60)
+    revoked._prune()
+    assert revoked.stats()['revoked'] == 1
+    assert not revoked.is_revoked('a' * 32)
+    assert revoked.is_revoked('b' * 32)
@@ -0,0 +1,140 @@
+"""The mmap shared cache: seqlock reads, clock eviction and owner versions."""
+import pytest
+from utils.shared_cache import SEQ, SLOT_HEADER, SharedCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = SharedCache()
+    # 8 buckets of 8 slots, so owners 1 and 2 have separate version stamps
+    cache.open(str(tmp_path / 'shared'), slots=64, slot_size=128, schema=b'test')
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def bucket(tmp_path):
+    # One bucket: every key competes for the same 8 slots
+    cache = SharedCache()
+    cache.open(str(tmp_path / 'bucket'), slots=8, slot_size=128, schema=b'test')
+    yield cache
+    cache.close()
+
+
+class ConcurrentRewrite(bytearray):
+    """Table memory where another writer rewrites a slot while its value is read"""
+
+    def __init__(self, data, slot, value_start):
+        super().__init__(data)
+        self.slot = slot
+        self.value_start = value_start
+        self.rewrites = 0
+
+    def __getitem__(self, index):
+        data = super().__getitem__(index)
+        if isinstance(index, slice) and index.start == self.value_start and not self.rewrites:
+            self.rewrites += 1
+            SEQ.pack_into(self, self.slot, SEQ.unpack_from(self, self.slot)[0] + 2)
+        return data
+
+
+def test_get_set(cache):
+    assert cache.set('k', 1, b'value')
+    assert cache.get('k') == (1, b'value')
+    assert cache.get('missing') is None
+
+
+def test_read_during_write_is_a_miss(cache):
+    cache.set('k', 1, b'value')
+    slot = cache._find_slot(b'k')
+    seq = SEQ.unpack_from(cache._mm, slot)[0]
+    assert seq % 2 == 0
+
+    # A writer is half way through the slot
+    SEQ.pack_into(cache._mm, slot, seq + 1)
+    assert cache.get('k') is None
+    SEQ.pack_into(cache._mm, slot, seq)
+    assert cache.get('k') == (1, b'value')
+
+
+def test_read_retries_when_seq_changes(cache):
+    cache.set('k', 1, b'value')
+    slot = cache._find_slot(b'k')
+    mm = cache._mm
+    cache._mm = ConcurrentRewrite(mm, slot, slot + SLOT_HEADER.size + 1)
+    try:
+        misses = cache.misses
+        assert cache.get('k') is None
+        assert cache.misses == misses + 1
+        # Nothing is rewriting any more
+        assert cache.get('k') == (1, b'value')
+    finally:
+        cache._mm = mm
+
+
+def test_seq_wraps_with_even_parity(cache):
+    cache.set('k', 1, b'old')
+    slot = cache._find_slot(b'k')
+    SEQ.pack_into(cache._mm, slot, 0xFFFFFFFE)
+    assert cache.set('k', 1, b'new')
+    assert SEQ.unpack_from(cache._mm, slot)[0] == 0
+    assert cache.get('k') == (1, b'new')
+
+
+def test_clock_evicts_unreferenced_slot(bucket):
+    for i in range(8):
+        assert bucket.set('k%d' % i, 1, b'v')
+    # Referenced entries get a second chance
+    for i in range(4):
+        assert bucket.get('k%d' % i) is not None
+
+    bucket.set('k8', 1, b'v')
+    assert bucket.get('k4') is None
+    assert all(bucket.get('k%d' % i) is not None for i in (0, 1, 2, 3, 5, 6, 7, 8))
+
+    # The hand moved past the victim; every slot is referenced now, so a
+    # full sweep clears them and the hand's next slot goes
+    bucket.set('k9', 1, b'v')
+    assert bucket.get('k5') is None
+    assert bucket.get('k9') is not None
+
+
+def test_expired_slot_reused_before_eviction(bucket):
+    for i in range(8):
+        bucket.set('k%d' % i, 1, b'v', ttl=60)
+    bucket.set('k3', 1, b'v', ttl=-1)
+    bucket.set('k8', 1, b'v')
+    assert all(bucket.get('k%d' % i) is not None for i in (0, 1, 2, 4, 5, 6, 7, 8))
+
+
+def test_invalidate_user_kills_only_its_entries(cache):
+    cache.set('a1', 1, b'one')
+    cache.set('a2', 1, b'one')
+    cache.set('b', 2, b'two')
+    cache.invalidate_user(1)
+    assert cache.get('a1') is None
+    assert cache.get('a2') is None
+    assert cache.get('b') == (2, b'two')
+
+    cache.set('a1', 1, b'fresh')
+    assert cache.get('a1') == (1, b'fresh')
+
+
+def test_set_with_stale_version_is_invisible(cache):
+    # Read the version, then another worker invalidates before the write
+    version = cache.version(1)
+    cache.invalidate_user(1)
+    cache.set('a', 1, b'stale', version=version)
+    assert cache.get('a') is None
+
+
+def test_version_seen_by_other_mapping(cache, tmp_path):
+    other = SharedCache()
+    other.open(str(tmp_path / 'shared'), slots=64, slot_size=128, schema=b'test')
+    try:
+        cache.set('a', 1, b'v')
+        assert other.get('a') == (1, b'v')
+        other.invalidate_user(1)
+        assert cache.get('a') is None
+    finally:
+        other.close()
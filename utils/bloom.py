@@ -0,0 +1,68 @@
+import hashlib
+import math
+import struct
+
+# capacity, error rate and count ahead of the bit array in to_bytes()
+_HEADER = struct.Struct('<QdQ')
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings.
+
+    Sized from an expected capacity and false-positive rate. Bit positions
+    come from double hashing one BLAKE2b digest, so each add or lookup
+    costs a single hash.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / self.capacity * math.log(2))))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def clear(self):
+        self._bits = bytearray(len(self._bits))
+        self.count = 0
+
+    @property
+    def size_bytes(self):
+        return len(self._bits)
+
+    def to_bytes(self):
+        return _HEADER.pack(self.capacity, self.error_rate, self.count) + bytes(self._bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        capacity, error_rate, count = _HEADER.unpack_from(data)
+        bloom = cls(capacity, error_rate)
+        bits = data[_HEADER.size:]
+        if len(bits) != len(bloom._bits):
+            raise ValueError('Bloom filter size does not match its header')
+        bloom._bits = bytearray(bits)
+        bloom.count = count
+        return bloom
+
+    @classmethod
+    def from_items(cls, items, capacity=None, error_rate=0.001):
+        items = list(items)
+        bloom = cls(capacity or len(items) * 2, error_rate)
+        for item in items:
+            bloom.add(item)
+        return bloom
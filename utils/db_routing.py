@@ -0,0 +1,98 @@
+import json
+import random
+from flask import current_app
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Select
+from sqlalchemy.engine import make_url
+
+# SQLite engines use pools that reject sizing arguments
+POOL_SIZING = ('pool_size', 'max_overflow', 'pool_timeout')
+REPLICA_PREFIX = 'replica_'
+
+
+class RoutingSession(Session):
+    """Session that sends plain SELECTs to a read replica.
+
+    A session sticks to one randomly chosen replica, so its reads see one
+    consistent snapshot. The first flush, INSERT/UPDATE/DELETE or locking
+    read pins it to the primary for the rest of its life. Since
+    Flask-SQLAlchemy scopes a session to the app context, a request reads
+    its own writes, including after a commit. Models with their own bind
+    key are left alone.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or self.info.get('db_pinned'):
+            return engine
+
+        replicas = current_app.config.get('SQLALCHEMY_READ_BINDS')
+        engines = self._db.engines
+        if not replicas or engine is not engines.get(None):
+            return engine
+        if self._flushing or not _is_plain_select(clause):
+            self.info['db_pinned'] = True
+            return engine
+
+        key = self.info.get('db_replica')
+        if key is None:
+            key = self.info['db_replica'] = random.choice(replicas)
+        return engines[key]
+
+
+def _is_plain_select(clause):
+    return isinstance(clause, Select) and clause._for_update_arg is None
+
+
+def pin_primary(session):
+    """Send the rest of this session's reads to the primary"""
+    session.info['db_pinned'] = True
+
+
+def has_replicas():
+    return bool(current_app.config.get('SQLALCHEMY_READ_BINDS'))
+
+
+def engine_options(url, options):
+    """Pool options for one bind, without sizing its dialect does not take"""
+    options = {key: value for key, value in options.items() if value is not None}
+    if make_url(url).get_backend_name() == 'sqlite':
+        options = {key: value for key, value in options.items() if key not in POOL_SIZING}
+    return options
+
+
+def configure_binds(app):
+    """Build SQLAlchemy engine options and replica binds from the config.
+
+    DB_POOL_* set the pool for every bind. SQLALCHEMY_BIND_OPTIONS (a dict
+    or JSON) overrides them per bind, keyed by 'primary' or 'replica_<n>'.
+    SQLALCHEMY_REPLICA_URIS lists the replicas. Must run before db.init_app.
+    """
+    pool = {
+        'pool_size': app.config.get('DB_POOL_SIZE'),
+        'max_overflow': app.config.get('DB_MAX_OVERFLOW'),
+        'pool_timeout': app.config.get('DB_POOL_TIMEOUT'),
+        'pool_recycle': app.config.get('DB_POOL_RECYCLE'),
+        'pool_pre_ping': app.config.get('DB_POOL_PRE_PING')
+    }
+    overrides = app.config.get('SQLALCHEMY_BIND_OPTIONS') or {}
+    if isinstance(overrides, str):
+        overrides = json.loads(overrides)
+
+    primary = app.config.get('SQLALCHEMY_DATABASE_URI')
+    if primary:
+        options = engine_options(primary, dict(pool, **overrides.get('primary', {})))
+        options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    replicas = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+    if isinstance(replicas, str):
+        replicas = [uri.strip() for uri in replicas.split(',') if uri.strip()]
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    read_binds = []
+    for i, uri in enumerate(replicas):
+        key = '%s%d' % (REPLICA_PREFIX, i)
+        binds[key] = dict(engine_options(uri, dict(pool, **overrides.get(key, {}))), url=uri)
+        read_binds.append(key)
+    app.config['SQLALCHEMY_BINDS'] = binds
+    app.config['SQLALCHEMY_READ_BINDS'] = read_binds
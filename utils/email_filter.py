@@ -0,0 +1,179 @@
+import os
+import struct
+import threading
+import time
+import click
+from models.user import User, db
+from utils.bloom import BloomFilter
+
+# Snapshot layout: magic, last user id covered (u64), BloomFilter.to_bytes()
+_SNAPSHOT_MAGIC = b'EMF1'
+
+
+class EmailFilter:
+    """Bloom filter of registered emails in front of the signup lookup.
+
+    Answers "definitely new" for most fresh addresses, so registration
+    only reads User.email_normalized when an address might exist. The
+    first lookup starts loading it in the background, from the
+    EMAIL_FILTER_PATH snapshot written by ``flask rebuild-email-filter``
+    plus the users created since, or by scanning the table when there is
+    no snapshot. Until it is loaded every address might exist, and boot
+    and CLI commands never pay for the load.
+
+    Signups in other workers are only seen after a restart, so "definitely
+    new" is a hint: the unique index on email_normalized still decides.
+    """
+
+    def __init__(self, capacity=1000000, error_rate=0.01, batch_size=10000):
+        self.enabled = True
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.batch_size = batch_size
+        self.path = None
+        self._app = None
+        self._bloom = None
+        self._pending = None
+        self._lock = threading.Lock()
+        self.skipped_lookups = 0
+        self.lookups = 0
+        self.load_seconds = None
+
+    def init_app(self, app):
+        self.enabled = app.config.get('EMAIL_FILTER_ENABLED', self.enabled)
+        self.capacity = app.config.get('EMAIL_FILTER_CAPACITY', self.capacity)
+        self.error_rate = app.config.get('EMAIL_FILTER_ERROR_RATE', self.error_rate)
+        self.path = app.config.get('EMAIL_FILTER_PATH')
+        self._app = app
+        self._bloom = None
+        self._pending = None
+
+        @app.cli.command('rebuild-email-filter')
+        @click.option('--path', default=None, help='Snapshot file, defaults to EMAIL_FILTER_PATH')
+        def rebuild_command(path):
+            """Write a fresh snapshot of the email filter from the users table"""
+            path = path or self.path
+            if not path:
+                raise click.UsageError('Set EMAIL_FILTER_PATH or pass --path')
+            bloom, last_id = self.rebuild(path)
+            click.echo('%d emails up to user %d, %d bytes written to %s' % (
+                bloom.count, last_id, bloom.size_bytes, path))
+
+    @property
+    def ready(self):
+        return self._bloom is not None
+
+    def might_exist(self, email_normalized):
+        """False only for addresses that were definitely not registered"""
+        bloom = self._bloom
+        if bloom is None:
+            self._start_load()
+        if bloom is None or email_normalized in bloom:
+            self.lookups += 1
+            return True
+        self.skipped_lookups += 1
+        return False
+
+    def add(self, email_normalized):
+        """Record a newly committed address"""
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(email_normalized)
+            elif self._pending is not None:
+                self._pending.append(email_normalized)
+
+    def rebuild(self, path=None):
+        """Build the filter from the whole table, optionally writing a snapshot"""
+        bloom = self._new_filter()
+        last_id = self._scan(bloom, 0)
+        if path:
+            self.write_snapshot(path, bloom, last_id)
+        return bloom, last_id
+
+    @staticmethod
+    def write_snapshot(path, bloom, last_id):
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(_SNAPSHOT_MAGIC + last_id.to_bytes(8, 'little') + bloom.to_bytes())
+        os.replace(tmp, path)
+
+    @staticmethod
+    def read_snapshot(path):
+        """(BloomFilter, last user id) from a snapshot, or None if missing or unreadable"""
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if not data.startswith(_SNAPSHOT_MAGIC):
+            return None
+        try:
+            bloom = BloomFilter.from_bytes(data[len(_SNAPSHOT_MAGIC) + 8:])
+        except (ValueError, struct.error):
+            return None
+        return bloom, int.from_bytes(data[len(_SNAPSHOT_MAGIC):len(_SNAPSHOT_MAGIC) + 8], 'little')
+
+    def _start_load(self):
+        if not self.enabled or self._app is None:
+            return
+        with self._lock:
+            if self._pending is not None or self._bloom is not None:
+                return
+            # Collects the adds that land while the table is scanned
+            self._pending = []
+        threading.Thread(target=self._load, args=(self._app,), name='email-filter-load',
+                         daemon=True).start()
+
+    def _load(self, app):
+        started = time.monotonic()
+        try:
+            with app.app_context():
+                snapshot = self.read_snapshot(self.path) if self.path else None
+                if snapshot is not None:
+                    bloom, last_id = snapshot
+                else:
+                    bloom, last_id = self._new_filter(), 0
+                self._scan(bloom, last_id)
+        except Exception:
+            # Stay unloaded: every address might exist, so registration still works
+            app.logger.exception('Could not load the email filter, disabled until restart')
+            self.enabled = False
+            with self._lock:
+                self._pending = None
+            return
+        with self._lock:
+            for email in self._pending or ():
+                bloom.add(email)
+            self._pending = None
+            self._bloom = bloom
+        self.load_seconds = time.monotonic() - started
+
+    def _new_filter(self):
+        count = db.session.execute(db.select(db.func.count(User.id))).scalar()
+        # Leave room to grow before the false positive rate degrades
+        return BloomFilter(max(self.capacity, count * 2), self.error_rate)
+
+    def _scan(self, bloom, after_id):
+        """Add every address with a user id above after_id; return the last id seen"""
+        while True:
+            rows = db.session.execute(
+                db.select(User.id, User.email_normalized)
+                .where(User.id > after_id).order_by(User.id).limit(self.batch_size)
+            ).all()
+            if not rows:
+                return after_id
+            for _, email in rows:
+                bloom.add(email)
+            after_id = rows[-1].id
+
+    def stats(self):
+        bloom = self._bloom
+        return {
+            'ready': int(bloom is not None),
+            'size': bloom.count if bloom is not None else 0,
+            'lookups': self.lookups,
+            'skipped_lookups': self.skipped_lookups
+        }
+
+
+email_filter = EmailFilter()
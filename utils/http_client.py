@@ -0,0 +1,222 @@
+import asyncio
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask_oauthlib.client import OAuthRemoteApp, OAuthException, prepare_request, parse_response
+from flask_oauthlib.utils import to_bytes
+from utils.metrics import LatencyHistogram, metrics
+
+
+class ProviderHTTPClient:
+    """Pooled keep-alive HTTP client for outbound OAuth provider calls.
+
+    One requests.Session keeps a connection pool per host, so repeated
+    token exchanges and userinfo calls reuse TCP+TLS connections. Every
+    call has connect/read timeouts and a bounded retry policy, and its
+    latency is recorded per provider.
+    """
+
+    def __init__(self, pool_size=20, connect_timeout=3.0, read_timeout=10.0, retries=2):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._session = self._build_session()
+
+    def init_app(self, app):
+        self.pool_size = app.config.get('OAUTH_HTTP_POOL_SIZE', self.pool_size)
+        self.connect_timeout = app.config.get('OAUTH_HTTP_CONNECT_TIMEOUT', self.connect_timeout)
+        self.read_timeout = app.config.get('OAUTH_HTTP_READ_TIMEOUT', self.read_timeout)
+        self.retries = app.config.get('OAUTH_HTTP_RETRIES', self.retries)
+        self._session.close()
+        self._session = self._build_session()
+
+    def _build_session(self):
+        # POST is not in the default allowed methods, so a token exchange
+        # is only retried when the connection could not be established
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=0.1,
+            status_forcelist=(502, 503, 504),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size,
+                              max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def request(self, provider, method, url, headers=None, data=None):
+        """Send a request on behalf of a provider and time it"""
+        started = time.perf_counter()
+        try:
+            return self._session.request(
+                method, url, headers=headers, data=data,
+                timeout=(self.connect_timeout, self.read_timeout)
+            )
+        except requests.RequestException as e:
+            raise OAuthException('Request to %s failed: %s' % (provider, e),
+                                 type='provider_unavailable')
+        finally:
+            elapsed = time.perf_counter() - started
+            self.histogram(provider).observe(elapsed)
+            if metrics.enabled:
+                metrics.observe('oauth_provider_request_duration_seconds', elapsed,
+                                (('provider', provider),))
+
+    def histogram(self, provider):
+        histogram = self.histograms.get(provider)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(provider, LatencyHistogram())
+        return histogram
+
+    def stats(self):
+        """Latency histograms per provider"""
+        return {name: histogram.snapshot() for name, histogram in list(self.histograms.items())}
+
+
+class AsyncProviderHTTPClient:
+    """Shared httpx.AsyncClient for the async OAuth callback pipeline.
+
+    Same timeouts, retry budget and per-provider latency histograms as
+    ProviderHTTPClient, but calls are awaited, so a slow provider holds a
+    coroutine instead of a worker thread. The client is bound to the event
+    loop it was first used on and is rebuilt if the loop changes.
+    """
+
+    def __init__(self, sync_client, max_connections=100):
+        self.sync_client = sync_client
+        self.max_connections = max_connections
+        self._client = None
+        self._loop = None
+
+    def init_app(self, app):
+        self.max_connections = app.config.get('ASYNC_HTTP_MAX_CONNECTIONS', self.max_connections)
+
+    def _get_client(self):
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            import httpx
+            sync = self.sync_client
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(sync.read_timeout, connect=sync.connect_timeout),
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=sync.pool_size),
+                transport=httpx.AsyncHTTPTransport(retries=sync.retries)
+            )
+            self._loop = loop
+        return self._client
+
+    async def request(self, provider, method, url, headers=None, data=None):
+        """Send a request on behalf of a provider and time it"""
+        # Imported here so WSGI-only deployments never load httpx
+        import httpx
+        started = time.perf_counter()
+        try:
+            return await self._get_client().request(method, url, headers=headers, content=data)
+        except httpx.HTTPError as e:
+            raise OAuthException('Request to %s failed: %s' % (provider, e),
+                                 type='provider_unavailable')
+        finally:
+            elapsed = time.perf_counter() - started
+            self.sync_client.histogram(provider).observe(elapsed)
+            if metrics.enabled:
+                metrics.observe('oauth_provider_request_duration_seconds', elapsed,
+                                (('provider', provider),))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class _Response:
+    # The subset of the urllib response that flask_oauthlib reads
+    def __init__(self, response):
+        self.code = response.status_code
+        self.headers = response.headers
+
+
+class PooledRemoteApp(OAuthRemoteApp):
+    """flask_oauthlib remote app that sends requests through ProviderHTTPClient"""
+
+    def __init__(self, oauth, name, http_client, **kwargs):
+        super().__init__(oauth, name, **kwargs)
+        self.http_client = http_client
+
+    def http_request(self, uri, headers=None, data=None, method=None):
+        uri, headers, data, method = prepare_request(uri, headers, data, method)
+        response = self.http_client.request(self.name, method.upper(), uri, headers=headers, data=data)
+        return _Response(response), response.content
+
+    def authorize_url_for(self, callback, state, **params):
+        """OAuth2 authorization URL, built without writing to the session"""
+        request_params = dict(self.request_token_params or {})
+        request_params.update(params)
+        scope = request_params.pop('scope', None)
+        return self.make_client().prepare_request_uri(
+            self.expand_url(self.authorize_url),
+            redirect_uri=callback,
+            scope=scope,
+            state=state,
+            **request_params
+        )
+
+    def exchange_code(self, code, callback, **params):
+        """Trade an authorization code for a token response.
+
+        Same request as handle_oauth2_response, but the redirect_uri and
+        any extra parameters (e.g. a PKCE code_verifier) come from the
+        caller instead of the session.
+        """
+        method, url, headers, data = self.token_request(code, callback, **params)
+        resp, content = self.http_request(url, headers=headers, data=data, method=method)
+        return self.token_response(resp, content)
+
+    async def exchange_code_async(self, code, callback, **params):
+        """exchange_code through an AsyncProviderHTTPClient"""
+        method, url, headers, data = self.token_request(code, callback, **params)
+        response = await async_provider_http.request(self.name, method, url, headers=headers, data=data)
+        return self.token_response(_Response(response), response.content)
+
+    def token_request(self, code, callback, **params):
+        """(method, url, headers, body) of a code exchange"""
+        client = self.make_client()
+        remote_args = {'code': code, 'client_secret': self.consumer_secret, 'redirect_uri': callback}
+        remote_args.update(self.access_token_params)
+        remote_args.update(params)
+        headers = dict(self._access_token_headers)
+        body = client.prepare_request_body(**remote_args)
+        url = self.expand_url(self.access_token_url)
+        if self.access_token_method == 'POST':
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            return 'POST', url, headers, to_bytes(body, self.encoding)
+        url += ('?' in url and '&' or '?') + body
+        return 'GET', url, headers, None
+
+    def token_response(self, resp, content):
+        data = parse_response(resp, content, content_type=self.content_type)
+        if resp.code not in (200, 201):
+            raise OAuthException('Invalid response from %s' % self.name,
+                                 type='invalid_response', data=data)
+        return data
+
+    async def get_async(self, url, token):
+        """OAuth2 GET of a provider API path with a bearer token, parsed like OAuthResponse.data"""
+        uri, headers, _ = self.make_client(token).add_token(self.expand_url(url), http_method='GET')
+        response = await async_provider_http.request(self.name, 'GET', uri, headers=headers)
+        data = parse_response(_Response(response), response.content, content_type=self.content_type)
+        if response.status_code not in (200, 201):
+            raise OAuthException('Invalid response from %s' % self.name,
+                                 type='invalid_response', data=data)
+        return data
+
+
+provider_http = ProviderHTTPClient()
+async_provider_http = AsyncProviderHTTPClient(provider_http)
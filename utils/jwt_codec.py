@@ -0,0 +1,101 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+from calendar import timegm
+from datetime import datetime
+import jwt
+
+# PyJWT's serialization of the HS256 header, so tokens stay interchangeable
+HS256_HEADER = base64.urlsafe_b64encode(b'{"alg":"HS256","typ":"JWT"}').rstrip(b'=').decode('ascii')
+REQUIRED_CLAIMS = ('user_id', 'exp')
+TIME_CLAIMS = ('exp', 'nbf', 'iat')
+
+
+class HS256Codec:
+    """Encoder/decoder for the HS256 tokens this service issues.
+
+    The header never changes, so it is serialized once; the HMAC is keyed
+    once and copied per token. Decoding only accepts that exact header,
+    compares signatures in constant time before parsing the payload and
+    then validates the claims strictly: ``user_id`` and a numeric ``exp``
+    are required, ``nbf``/``iat`` must be numeric when present, and a
+    ``type`` must be a string. Raises the same PyJWT exceptions as
+    jwt.decode.
+    """
+
+    def __init__(self, secret):
+        if isinstance(secret, str):
+            secret = secret.encode('utf-8')
+        self._mac = hmac.new(secret, digestmod=hashlib.sha256)
+        self._prefix = HS256_HEADER + '.'
+
+    def _sign(self, signing_input):
+        mac = self._mac.copy()
+        mac.update(signing_input)
+        return _b64encode(mac.digest())
+
+    def handles(self, token):
+        """Whether token carries the header this codec signs with"""
+        return token.startswith(self._prefix)
+
+    def encode(self, payload):
+        claims = dict(payload)
+        for claim in TIME_CLAIMS:
+            if isinstance(claims.get(claim), datetime):
+                claims[claim] = timegm(claims[claim].utctimetuple())
+        signing_input = (self._prefix + _b64encode(
+            json.dumps(claims, separators=(',', ':')).encode('utf-8')
+        )).encode('ascii')
+        return signing_input.decode('ascii') + '.' + self._sign(signing_input)
+
+    def decode(self, token):
+        if not self.handles(token):
+            raise jwt.DecodeError('Not an HS256 token')
+        signing_input, _, signature = token.rpartition('.')
+        if signing_input.count('.') != 1:
+            raise jwt.DecodeError('Not enough segments')
+        try:
+            expected = self._sign(signing_input.encode('ascii'))
+        except UnicodeEncodeError:
+            raise jwt.DecodeError('Invalid token encoding')
+        if not hmac.compare_digest(expected, signature):
+            raise jwt.InvalidSignatureError('Signature verification failed')
+
+        try:
+            payload = json.loads(_b64decode(signing_input[len(self._prefix):]))
+        except ValueError:
+            raise jwt.DecodeError('Invalid payload')
+        if not isinstance(payload, dict):
+            raise jwt.DecodeError('Invalid payload')
+        _validate(payload)
+        return payload
+
+
+def _validate(payload, now=None):
+    for claim in REQUIRED_CLAIMS:
+        if claim not in payload:
+            raise jwt.MissingRequiredClaimError(claim)
+    for claim in TIME_CLAIMS:
+        value = payload.get(claim)
+        if claim in payload and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            raise jwt.DecodeError('The %s claim must be a number' % claim)
+    if 'type' in payload and not isinstance(payload['type'], str):
+        raise jwt.InvalidTokenError('Invalid type claim')
+
+    now = now or time.time()
+    if payload['exp'] <= now:
+        raise jwt.ExpiredSignatureError('Signature has expired')
+    if payload.get('nbf', 0) > now:
+        raise jwt.ImmatureSignatureError('The token is not yet valid (nbf)')
+    if payload.get('iat', 0) > now:
+        raise jwt.ImmatureSignatureError('The token is not yet valid (iat)')
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data):
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
@@ -0,0 +1,181 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+import click
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+from utils.jwt_codec import HS256Codec
+
+ASYMMETRIC_ALGORITHMS = ('ES256', 'EdDSA')
+
+
+class SigningKey:
+    """A parsed key and the window in which it signs or verifies"""
+
+    def __init__(self, kid, algorithm, signing_key, verifying_key, not_before=0, not_after=None):
+        self.kid = kid
+        self.algorithm = algorithm
+        self.signing_key = signing_key
+        self.verifying_key = verifying_key
+        self.not_before = not_before
+        self.not_after = not_after
+
+    def is_retired(self, now):
+        return self.not_after is not None and now >= self.not_after
+
+
+class KeyRing:
+    """JWT signing keys with scheduled rotation.
+
+    Without JWT_KEY_RING tokens are HS256-signed with SECRET_KEY, as
+    before. With it, JWT_KEY_RING names a JSON manifest of ES256/EdDSA
+    private keys, each with a kid and an optional not_before/not_after::
+
+        [{"kid": "2026-10", "algorithm": "ES256",
+          "private_key_file": "keys/2026-10.pem",
+          "not_before": "2026-10-01T00:00:00Z"}]
+
+    The newest key whose not_before has passed signs. Keys are published
+    in the JWKS ahead of activation (JWT_KEY_PUBLISH_AHEAD) so verifiers
+    already have them, and every unretired key keeps verifying. PEMs are
+    parsed once at load, so verification never re-parses a key. HS256
+    tokens go through HS256Codec instead of PyJWT.
+    """
+
+    def __init__(self):
+        self._keys = {}
+        self._legacy_key = None
+        self._hs256 = None
+        self._publish_ahead = 0
+        self._jwks = None
+        self._jwks_built_at = 0
+        self._lock = threading.Lock()
+        self.max_age = 3600
+
+    def init_app(self, app):
+        self._publish_ahead = app.config.get('JWT_KEY_PUBLISH_AHEAD', 0)
+        if hasattr(self._publish_ahead, 'total_seconds'):
+            self._publish_ahead = self._publish_ahead.total_seconds()
+        self.max_age = app.config.get('JWKS_MAX_AGE', self.max_age)
+
+        hs256 = SigningKey(None, 'HS256', app.config['SECRET_KEY'], app.config['SECRET_KEY'])
+        self._hs256 = HS256Codec(app.config['SECRET_KEY'])
+        manifest = app.config.get('JWT_KEY_RING')
+        if manifest:
+            self._keys = self.load_manifest(manifest)
+            # Keep accepting kid-less HS256 tokens while they age out
+            self._legacy_key = hs256 if app.config.get('JWT_ACCEPT_LEGACY_HS256') else None
+        else:
+            self._keys = {None: hs256}
+            self._legacy_key = None
+        self._jwks = None
+
+        @app.cli.command('jwt-generate-key')
+        @click.argument('kid')
+        @click.option('--algorithm', type=click.Choice(ASYMMETRIC_ALGORITHMS), default='ES256')
+        @click.option('--out-dir', default='keys', help='Directory to write the PEM to')
+        def generate_key(kid, algorithm, out_dir):
+            """Write a new private key and print its manifest entry"""
+            if algorithm == 'ES256':
+                private_key = ec.generate_private_key(ec.SECP256R1())
+            else:
+                private_key = ed25519.Ed25519PrivateKey.generate()
+            os.makedirs(out_dir, exist_ok=True)
+            path = os.path.join(out_dir, '%s.pem' % kid)
+            with open(path, 'wb') as f:
+                f.write(private_key.private_bytes(
+                    serialization.Encoding.PEM,
+                    serialization.PrivateFormat.PKCS8,
+                    serialization.NoEncryption()
+                ))
+            os.chmod(path, 0o600)
+            click.echo(json.dumps({'kid': kid, 'algorithm': algorithm, 'private_key_file': path}))
+
+    @staticmethod
+    def load_manifest(path):
+        """Parse a key ring manifest into SigningKeys by kid"""
+        base = os.path.dirname(os.path.abspath(path))
+        with open(path) as f:
+            entries = json.load(f)
+        keys = {}
+        for entry in entries:
+            algorithm = entry.get('algorithm', 'ES256')
+            if algorithm not in ASYMMETRIC_ALGORITHMS:
+                raise ValueError('Unsupported JWT algorithm %r for key %r' % (algorithm, entry['kid']))
+            key_file = os.path.join(base, entry['private_key_file'])
+            with open(key_file, 'rb') as f:
+                private_key = serialization.load_pem_private_key(f.read(), password=None)
+            keys[entry['kid']] = SigningKey(
+                entry['kid'],
+                algorithm,
+                private_key,
+                private_key.public_key(),
+                not_before=_timestamp(entry.get('not_before')) or 0,
+                not_after=_timestamp(entry.get('not_after'))
+            )
+        return keys
+
+    def signing_key(self, now=None):
+        """The newest active key"""
+        now = now or time.time()
+        active = [key for key in self._keys.values() if key.not_before <= now and not key.is_retired(now)]
+        if not active:
+            raise RuntimeError('No active JWT signing key')
+        return max(active, key=lambda key: key.not_before)
+
+    def encode(self, payload):
+        key = self.signing_key()
+        if key.algorithm == 'HS256':
+            return self._hs256.encode(payload)
+        headers = {'kid': key.kid} if key.kid else None
+        return jwt.encode(payload, key.signing_key, algorithm=key.algorithm, headers=headers)
+
+    def decode(self, token):
+        """Verify a token with the key named by its kid header"""
+        if self._hs256 is not None and self._hs256.handles(token):
+            # Kid-less HS256, verified without parsing the header
+            if self._keys.get(None) is None and self._legacy_key is None:
+                raise jwt.InvalidTokenError('Unknown signing key')
+            return self._hs256.decode(token)
+        kid = jwt.get_unverified_header(token).get('kid')
+        key = self._keys.get(kid)
+        if key is None and kid is None:
+            key = self._legacy_key
+        if key is None or key.is_retired(time.time()):
+            raise jwt.InvalidTokenError('Unknown signing key')
+        return jwt.decode(token, key.verifying_key, algorithms=[key.algorithm])
+
+    def jwks(self):
+        """Serialized public JWKS, rebuilt at most once per max_age"""
+        now = time.time()
+        if self._jwks is not None and now - self._jwks_built_at < self.max_age:
+            return self._jwks
+        with self._lock:
+            keys = []
+            for key in self._keys.values():
+                if key.algorithm not in ASYMMETRIC_ALGORITHMS or key.is_retired(now):
+                    continue
+                if key.not_before - self._publish_ahead > now:
+                    continue
+                entry = jwt.get_algorithm_by_name(key.algorithm).to_jwk(key.verifying_key, as_dict=True)
+                entry.update({'kid': key.kid, 'alg': key.algorithm, 'use': 'sig'})
+                keys.append(entry)
+            self._jwks = json.dumps({'keys': keys}, sort_keys=True)
+            self._jwks_built_at = now
+        return self._jwks
+
+
+def _timestamp(value):
+    # ISO 8601 to epoch seconds, naive values are taken as UTC
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+key_ring = KeyRing()
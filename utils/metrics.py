@@ -0,0 +1,178 @@
+import bisect
+import functools
+import threading
+import time
+
+# Upper bounds in seconds, Prometheus style
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class LatencyHistogram:
+    """Thread-safe cumulative latency histogram"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += seconds
+            self._count += 1
+
+    def snapshot(self):
+        """Return cumulative bucket counts, sum and count"""
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative = []
+        running = 0
+        for bound, value in zip(self.buckets + (float('inf'),), counts):
+            running += value
+            cumulative.append((bound, running))
+        return {'buckets': cumulative, 'sum': total, 'count': count}
+
+
+class Metrics:
+    """Process-wide registry of latency histograms and counters.
+
+    Disabled by default; timed() wrappers then cost a single attribute
+    check. When METRICS_ENABLED is set, init_app hooks request timing,
+    SQLAlchemy statement timing and a Prometheus text /metrics endpoint,
+    which answers only to the METRICS_TOKEN bearer token.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._histograms = {}
+        self._counters = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS_ENABLED', False)
+        # Collectors belong to the app being set up, not to earlier ones
+        self._collectors = []
+        if not self.enabled:
+            return
+
+        from flask import Response, g, request
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        from middleware.auth_middleware import static_token_required
+
+        @app.before_request
+        def start_timer():
+            g._metrics_started = time.perf_counter()
+            g._metrics_sql = 0
+
+        @app.after_request
+        def record_request(response):
+            started = g.pop('_metrics_started', None)
+            if started is not None:
+                labels = (('endpoint', request.endpoint or 'unmatched'), ('method', request.method))
+                self.observe('http_request_duration_seconds', time.perf_counter() - started, labels)
+                self.observe('http_request_sql_queries', g.pop('_metrics_sql', 0), labels,
+                             buckets=SQL_COUNT_BUCKETS)
+                self.inc('http_requests_total', labels + (('status', str(response.status_code)),))
+            return response
+
+        if not getattr(self, '_sql_hooked', False):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            self._sql_hooked = True
+
+        @app.route('/metrics')
+        @static_token_required('METRICS_TOKEN')
+        def metrics_endpoint():
+            return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('_metrics_query_started', None)
+        if started is None:
+            return
+        self.observe('sql_query_duration_seconds', time.perf_counter() - started,
+                     (('statement', statement.split(None, 1)[0].upper()),))
+        from flask import g, has_app_context
+        if has_app_context() and '_metrics_sql' in g:
+            g._metrics_sql += 1
+
+    def timed(self, name):
+        """Decorator recording a function's duration as ``<name>_duration_seconds``"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe('%s_duration_seconds' % name, time.perf_counter() - started)
+            return wrapper
+        return decorator
+
+    def observe(self, name, value, labels=(), buckets=DEFAULT_BUCKETS):
+        key = (name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, LatencyHistogram(buckets))
+        histogram.observe(value)
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def register_collector(self, collector):
+        """Add a callable returning [(name, labels, value)] gauges at scrape time"""
+        self._collectors.append(collector)
+
+    def register_stats(self, prefix, stats):
+        """Export the numeric values of a stats() dict as ``<prefix>_<key>`` gauges"""
+        self.register_collector(lambda: [
+            ('%s_%s' % (prefix, key), (), value) for key, value in stats().items()
+            if isinstance(value, (int, float))
+        ])
+
+    def render(self):
+        """Prometheus text exposition of everything recorded"""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        for (name, labels), histogram in histograms:
+            snapshot = histogram.snapshot()
+            for bound, count in snapshot['buckets']:
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('%s_bucket%s %d' % (name, _labels(labels + (('le', le),)), count))
+            lines.append('%s_sum%s %f' % (name, _labels(labels), snapshot['sum']))
+            lines.append('%s_count%s %d' % (name, _labels(labels), snapshot['count']))
+        for (name, labels), value in counters:
+            lines.append('%s%s %d' % (name, _labels(labels), value))
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                lines.append('%s%s %s' % (name, _labels(labels), value))
+        return '\n'.join(lines) + '\n'
+
+
+# Buckets for per-request statement counts rather than seconds
+SQL_COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 8, 13, 21)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['_metrics_query_started'] = time.perf_counter()
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (key, str(value).replace('"', '\\"')) for key, value in labels)
+
+
+metrics = Metrics()
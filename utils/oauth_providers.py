@@ -0,0 +1,210 @@
+import json
+import os
+import threading
+from flask import session
+from flask_oauthlib.client import OAuthException
+from utils.http_client import PooledRemoteApp, provider_http
+
+# Endpoints and profile shape of the providers we support out of the box.
+# OAUTH_PROVIDERS (a dict or JSON) overrides these per key or adds new
+# providers. ``profile`` lists the API paths a callback reads,
+# ``email_profile`` the ones it only reads when those carry no email,
+# ``fields`` names the email/name/id keys in the first response, and
+# ``mapper`` picks a function from PROFILE_MAPPERS for anything less regular.
+BUILTIN_PROVIDERS = {
+    'google': {
+        'base_url': 'https://www.googleapis.com/oauth2/v1/',
+        'authorize_url': 'https://accounts.google.com/o/oauth2/auth',
+        'access_token_url': 'https://accounts.google.com/o/oauth2/token',
+        'access_token_method': 'POST',
+        'scope': 'email profile',
+        'profile': ['userinfo']
+    },
+    'facebook': {
+        'base_url': 'https://graph.facebook.com/',
+        'authorize_url': 'https://www.facebook.com/dialog/oauth',
+        'access_token_url': '/oauth/access_token',
+        'access_token_method': 'GET',
+        'scope': 'email',
+        'profile': ['me?fields=id,name,email']
+    },
+    'github': {
+        'base_url': 'https://api.github.com/',
+        'authorize_url': 'https://github.com/login/oauth/authorize',
+        'access_token_url': 'https://github.com/login/oauth/access_token',
+        'access_token_method': 'POST',
+        'scope': 'user:email',
+        'profile': ['user'],
+        'email_profile': ['user/emails'],
+        'mapper': 'github'
+    },
+    'linkedin': {
+        'base_url': 'https://api.linkedin.com/v2/',
+        'authorize_url': 'https://www.linkedin.com/oauth/v2/authorization',
+        'access_token_url': 'https://www.linkedin.com/oauth/v2/accessToken',
+        'access_token_method': 'POST',
+        'scope': 'r_liteprofile r_emailaddress',
+        'profile': ['people/~'],
+        'fields': {'email': 'emailAddress', 'name': 'formattedName'}
+    }
+}
+
+DEFAULT_FIELDS = {'email': 'email', 'name': 'name', 'id': 'id'}
+
+
+def _github_identity(spec, user, emails=()):
+    # A private address is only in /user/emails
+    email = user.get('email') or next(
+        (entry['email'] for entry in emails if entry.get('primary') and entry.get('verified')), None
+    )
+    return email, user.get('name'), user['id']
+
+
+def _field_identity(spec, me, *rest):
+    fields = dict(DEFAULT_FIELDS, **spec.get('fields', {}))
+    return me[fields['email']], me.get(fields['name']), me[fields['id']]
+
+
+# Turn a provider's profile responses into (email, name, provider id)
+PROFILE_MAPPERS = {
+    'fields': _field_identity,
+    'github': _github_identity
+}
+
+
+class ProviderRegistry:
+    """OAuth providers built from config on first use.
+
+    A provider is enabled when <NAME>_CLIENT_ID is set, in the app config
+    or, for providers only known from OAUTH_PROVIDERS, in the environment;
+    the same goes for every other <NAME>_ setting. Its remote app,
+    and its OIDC verifier when <NAME>_OIDC and <NAME>_JWKS_URL are set
+    (<NAME>_OIDC_ALGORITHMS lists the accepted algorithms, RS256 by default),
+    are only built the first time a request needs them, so startup does
+    no per-provider work. <NAME>_BASE_URL, <NAME>_ACCESS_TOKEN_URL and
+    <NAME>_AUTHORIZE_URL override the endpoints, e.g. to point at a local
+    stub server.
+    """
+
+    def __init__(self):
+        self._oauth = None
+        self._config = {}
+        self._specs = {}
+        self._remotes = {}
+        self._verifiers = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app, oauth):
+        specs = {name: dict(spec) for name, spec in BUILTIN_PROVIDERS.items()}
+        overrides = app.config.get('OAUTH_PROVIDERS') or {}
+        if isinstance(overrides, str):
+            overrides = json.loads(overrides)
+        for name, spec in overrides.items():
+            specs[name] = dict(specs.get(name, {}), **spec)
+        self._specs = specs
+        self._oauth = oauth
+        self._config = app.config
+        self._remotes = {}
+        self._verifiers = {}
+
+    def get(self, name):
+        """The provider's remote app, or None when unknown or not configured"""
+        remote = self._remotes.get(name)
+        if remote is not None:
+            return remote
+        if name not in self._specs or not self._setting(name, 'CLIENT_ID'):
+            return None
+        with self._lock:
+            if name not in self._remotes:
+                self._remotes[name] = self._build(name)
+        return self._remotes[name]
+
+    def oidc(self, name):
+        """OIDCVerifier for providers that verify the id_token locally, else None"""
+        if name in self._verifiers:
+            return self._verifiers[name]
+        verifier = None
+        jwks_url = self._setting(name, 'JWKS_URL')
+        if self._flag(name, 'OIDC') and jwks_url:
+            # python-jose is only needed once an OIDC callback comes in
+            from utils.oidc import JWKSCache, OIDCVerifier
+            verifier = OIDCVerifier(
+                JWKSCache(name, jwks_url, provider_http),
+                client_id=self._setting(name, 'CLIENT_ID'),
+                issuers=self._list(name, 'OIDC_ISSUERS'),
+                algorithms=self._list(name, 'OIDC_ALGORITHMS') or ('RS256',)
+            )
+        with self._lock:
+            return self._verifiers.setdefault(name, verifier)
+
+    def profile_paths(self, name):
+        """API paths a callback reads the profile from"""
+        return self._specs[name].get('profile', [])
+
+    def email_paths(self, name, responses):
+        """API paths still to read when the responses of profile_paths carry no email"""
+        paths = self._specs[name].get('email_profile', [])
+        if paths and self._map(name, responses)[0]:
+            return []
+        return paths
+
+    def identity(self, name, responses):
+        """(email, name, provider id) from the responses of profile_paths and email_paths"""
+        email, display_name, provider_id = self._map(name, responses)
+        if not email:
+            raise OAuthException('No email in %s profile' % name, type='invalid_profile')
+        return email, display_name, provider_id
+
+    def _map(self, name, responses):
+        spec = self._specs[name]
+        try:
+            return PROFILE_MAPPERS[spec.get('mapper', 'fields')](spec, *responses)
+        except (KeyError, TypeError, IndexError, AttributeError):
+            return None, None, None
+
+    def _build(self, name):
+        spec = self._specs[name]
+        scope = spec.get('scope', '')
+        if self._flag(name, 'OIDC') and 'openid' not in scope.split():
+            scope = ('openid ' + scope).strip()
+        kwargs = {
+            'base_url': spec.get('base_url'),
+            'authorize_url': spec.get('authorize_url'),
+            'access_token_url': spec.get('access_token_url'),
+            'access_token_method': spec.get('access_token_method', 'POST')
+        }
+        for key in kwargs:
+            kwargs[key] = self._setting(name, key.upper()) or kwargs[key]
+        remote = PooledRemoteApp(
+            self._oauth,
+            name,
+            http_client=provider_http,
+            consumer_key=self._setting(name, 'CLIENT_ID'),
+            consumer_secret=self._setting(name, 'CLIENT_SECRET'),
+            request_token_params={'scope': scope},
+            request_token_url=None,
+            **kwargs
+        )
+        # Session-based flow keeps the provider token in the session
+        remote.tokengetter(lambda: session.get('%s_token' % name))
+        self._oauth.remote_apps[name] = remote
+        return remote
+
+    def _setting(self, name, key):
+        key = '%s_%s' % (name.upper(), key)
+        value = self._config.get(key)
+        if value is None:
+            # Providers added through OAUTH_PROVIDERS have no Config attributes
+            value = os.environ.get(key)
+        return value
+
+    def _flag(self, name, key):
+        value = self._setting(name, key)
+        return value.lower() == 'true' if isinstance(value, str) else bool(value)
+
+    def _list(self, name, key):
+        value = self._setting(name, key)
+        return value.split(',') if isinstance(value, str) else value
+
+
+providers = ProviderRegistry()
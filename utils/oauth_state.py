@@ -0,0 +1,79 @@
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+
+class OAuthHandshake:
+    """OAuth login state carried by the browser instead of the session.
+
+    The login leg generates a random ``state`` and a PKCE verifier and seals
+    them, together with the provider and next_url, into a short-lived
+    Fernet (encrypted + MACed) cookie. The callback leg opens the cookie,
+    checks the returned ``state`` against it and sends the verifier with
+    the code exchange. Nothing is read from or written to the session store.
+    """
+
+    cookie_name = 'oauth_handshake'
+
+    def __init__(self, max_age=600):
+        self.enabled = False
+        self.max_age = max_age
+        self.secure = False
+        self._fernet = None
+
+    def init_app(self, app):
+        self.enabled = app.config.get('OAUTH_STATELESS_STATE', False)
+        self.max_age = app.config.get('OAUTH_STATE_MAX_AGE', self.max_age)
+        self.secure = app.config.get('SESSION_COOKIE_SECURE', False)
+        # Own key, so a leaked handshake cookie says nothing about SECRET_KEY
+        key = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b'oauth-handshake').derive(
+            app.config['SECRET_KEY'].encode('utf-8')
+        )
+        self._fernet = Fernet(base64.urlsafe_b64encode(key))
+
+    def begin(self, provider, next_url=None):
+        """Return (state, code_challenge, sealed cookie value)"""
+        state = secrets.token_urlsafe(24)
+        verifier = secrets.token_urlsafe(48)
+        challenge = base64.urlsafe_b64encode(hashlib.sha256(verifier.encode('ascii')).digest())
+        sealed = self._fernet.encrypt(json.dumps({
+            'provider': provider,
+            'state': state,
+            'verifier': verifier,
+            'next': next_url
+        }, separators=(',', ':')).encode('utf-8'))
+        return state, challenge.rstrip(b'=').decode('ascii'), sealed.decode('ascii')
+
+    def complete(self, provider, state, sealed):
+        """Open the cookie and check it belongs to this callback.
+
+        Returns the handshake dict, or None when the cookie is missing,
+        tampered with, expired or for a different provider or state.
+        """
+        if not sealed or not state:
+            return None
+        try:
+            handshake = json.loads(self._fernet.decrypt(sealed.encode('ascii'), ttl=self.max_age))
+        except (InvalidToken, ValueError):
+            return None
+        if handshake.get('provider') != provider:
+            return None
+        if not hmac.compare_digest(handshake.get('state', ''), state):
+            return None
+        return handshake
+
+    def set_cookie(self, response, sealed):
+        response.set_cookie(self.cookie_name, sealed, max_age=self.max_age,
+                            httponly=True, secure=self.secure, samesite='Lax')
+
+    def clear_cookie(self, response):
+        response.delete_cookie(self.cookie_name, httponly=True, secure=self.secure, samesite='Lax')
+        return response
+
+
+oauth_handshake = OAuthHandshake()
@@ -0,0 +1,97 @@
+import threading
+import time
+from flask_oauthlib.client import OAuthException
+from jose import jwt, JWTError
+from werkzeug.http import parse_cache_control_header
+
+# Signing algorithm implied by a JWK that does not name one
+_KEY_ALGORITHMS = {
+    ('RSA', None): 'RS256',
+    ('EC', 'P-256'): 'ES256',
+    ('EC', 'P-384'): 'ES384',
+    ('EC', 'P-521'): 'ES512'
+}
+
+
+class JWKSCache:
+    """Cached provider key set, fetched through the pooled HTTP client.
+
+    Keys are kept for the max-age the provider sends in Cache-Control.
+    An unknown kid triggers an early refresh, at most once per
+    ``min_refresh_interval`` so forged kids cannot hammer the provider.
+    """
+
+    def __init__(self, provider, url, http_client, default_max_age=3600, min_refresh_interval=30):
+        self.provider = provider
+        self.url = url
+        self.http_client = http_client
+        self.default_max_age = default_max_age
+        self.min_refresh_interval = min_refresh_interval
+        self._keys = {}
+        self._expires_at = 0
+        self._fetched_at = 0
+        self._lock = threading.Lock()
+
+    def get_key(self, kid):
+        """Return the JWK for a kid, refreshing the set when needed"""
+        now = time.time()
+        if now >= self._expires_at:
+            self._refresh(now)
+        elif kid not in self._keys and now - self._fetched_at >= self.min_refresh_interval:
+            self._refresh(now)
+        return self._keys.get(kid)
+
+    def _refresh(self, now):
+        with self._lock:
+            # Another thread may have refreshed while we waited
+            if self._fetched_at > now:
+                return
+            try:
+                response = self.http_client.request(self.provider, 'GET', self.url)
+                keys = response.json().get('keys', []) if response.status_code == 200 else None
+            except (OAuthException, ValueError, AttributeError):
+                keys = None
+            self._fetched_at = time.time()
+            if keys is None:
+                # Keep serving the old keys, retry after the minimum interval
+                self._expires_at = self._fetched_at + self.min_refresh_interval
+                return
+            self._keys = {key['kid']: key for key in keys if 'kid' in key}
+            cache_control = parse_cache_control_header(response.headers.get('Cache-Control'))
+            max_age = cache_control.max_age if cache_control.max_age is not None else self.default_max_age
+            self._expires_at = self._fetched_at + max_age
+
+
+class OIDCVerifier:
+    """Verifies provider id_tokens locally against a cached JWKS.
+
+    The algorithm comes from the provider's key, never from the token
+    header, and must be one of ``algorithms``.
+    """
+
+    def __init__(self, jwks, client_id, issuers, algorithms=('RS256',)):
+        self.jwks = jwks
+        self.client_id = client_id
+        self.issuers = issuers
+        self.algorithms = tuple(algorithms)
+
+    def verify(self, id_token, access_token=None):
+        """Return the verified claims, or None if the token is not valid"""
+        try:
+            header = jwt.get_unverified_header(id_token)
+            key = self.jwks.get_key(header.get('kid'))
+            if key is None:
+                return None
+            algorithm = key.get('alg') or _KEY_ALGORITHMS.get((key.get('kty'), key.get('crv')))
+            if algorithm not in self.algorithms:
+                return None
+            return jwt.decode(
+                id_token,
+                key,
+                algorithms=[algorithm],
+                audience=self.client_id,
+                issuer=self.issuers,
+                access_token=access_token
+            )
+        except JWTError:
+            return None
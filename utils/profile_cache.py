@@ -0,0 +1,71 @@
+import json
+import threading
+from collections import OrderedDict
+
+
+class ProfileCache:
+    """Bounded LRU of serialized profile payloads, one per user.
+
+    An entry is only served for the User.version it was built from, so a
+    bumped version (login, new provider link) makes it stale without any
+    cross-worker signal. The ETag is derived from id and version alone,
+    which lets a conditional GET be answered before anything is
+    serialized.
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # user_id -> (version, payload bytes)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.max_size = app.config.get('PROFILE_CACHE_SIZE', self.max_size)
+        self.clear()
+
+    @staticmethod
+    def etag(user):
+        return '%d-%d' % (user.id, user.version or 0)
+
+    def payload(self, user):
+        """JSON bytes of user.to_dict(), serialized once per version"""
+        with self._lock:
+            entry = self._entries.get(user.id)
+            if entry is not None and entry[0] == user.version:
+                self._entries.move_to_end(user.id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        payload = json.dumps(user.to_dict(), separators=(',', ':')).encode('utf-8')
+        if self.max_size > 0:
+            with self._lock:
+                current = self._entries.get(user.id)
+                # Never replace a newer version built by another thread
+                if current is None or (current[0] or 0) <= (user.version or 0):
+                    self._entries[user.id] = (user.version, payload)
+                    self._entries.move_to_end(user.id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return payload
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+profile_cache = ProfileCache()
@@ -0,0 +1,150 @@
+import threading
+import time
+from datetime import datetime
+from sqlalchemy.exc import DBAPIError
+from models.user import RevocationEvent, db
+from utils.bloom import BloomFilter
+
+
+class RevocationSet:
+    """In-process set of revoked token families for stateless verification.
+
+    A Bloom filter answers "definitely not revoked" for almost every
+    token without touching the exact set. Filter hits are confirmed
+    against an exact dict of family id -> expiry. Workers stay current by
+    polling RevocationEvent for ids above the last one seen, so memory
+    only holds revocations whose tokens could still be presented.
+
+    Until the first sync succeeds every family counts as revoked. A
+    database without the table yet (before ``flask init-db``) therefore
+    does not stop the app from booting, and no token is accepted unchecked.
+    """
+
+    def __init__(self, capacity=100000, error_rate=0.001, poll_interval=1.0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.poll_interval = poll_interval
+        self._revoked = {}
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._last_id = 0
+        self.synced = False
+        self._lock = threading.Lock()
+        self._app = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.bloom_hits = 0
+        self.false_positives = 0
+
+    def init_app(self, app):
+        self.capacity = app.config.get('REVOCATION_BLOOM_CAPACITY', self.capacity)
+        self.error_rate = app.config.get('REVOCATION_BLOOM_ERROR_RATE', self.error_rate)
+        self.poll_interval = app.config.get('REVOCATION_POLL_INTERVAL', self.poll_interval)
+        if app.config.get('TOKEN_VERIFICATION_MODE') != 'stateless':
+            return
+        # Another app may use another database: start over from its events
+        with self._lock:
+            self._revoked = {}
+            self._bloom = BloomFilter(self.capacity, self.error_rate)
+            self._last_id = 0
+            self.synced = False
+        with app.app_context():
+            try:
+                self.sync()
+            except DBAPIError as e:
+                db.session.remove()
+                app.logger.warning('Revocation events not readable yet (%s), retrying in the background',
+                                   e.orig)
+        self.start(app)
+
+    def is_revoked(self, family_id):
+        if not self.synced:
+            return True
+        if family_id not in self._bloom:
+            return False
+        self.bloom_hits += 1
+        expires_at = self._revoked.get(family_id)
+        if expires_at is None:
+            self.false_positives += 1
+            return False
+        return expires_at > time.time()
+
+    def add(self, family_id, expires_at):
+        with self._lock:
+            if family_id in self._revoked:
+                self._revoked[family_id] = max(self._revoked[family_id], expires_at)
+                return
+            self._revoked[family_id] = expires_at
+            self._bloom.add(family_id)
+
+    def sync(self, batch_size=5000, overlap=100):
+        """Pull new revocation events and drop expired ones.
+
+        The last ``overlap`` ids are re-read so rows from transactions that
+        committed out of id order are not skipped; add() is idempotent.
+        """
+        floor = max(self._last_id - overlap, 0)
+        while True:
+            events = RevocationEvent.query.filter(
+                RevocationEvent.id > floor,
+                RevocationEvent.expires_at > datetime.utcnow()
+            ).order_by(RevocationEvent.id).limit(batch_size).all()
+            for event in events:
+                self.add(event.family_id, _epoch(event.expires_at))
+            if events:
+                floor = events[-1].id
+                self._last_id = max(self._last_id, floor)
+            if len(events) < batch_size:
+                break
+        db.session.remove()
+        self._prune()
+        self.synced = True
+
+    def _prune(self):
+        # A Bloom filter cannot delete, so rebuild it from the survivors
+        now = time.time()
+        with self._lock:
+            if len(self._revoked) == self._bloom.count and len(self._revoked) <= self.capacity:
+                if all(expires_at > now for expires_at in self._revoked.values()):
+                    return
+            self._revoked = {family_id: expires_at for family_id, expires_at in self._revoked.items()
+                             if expires_at > now}
+            capacity = max(self.capacity, len(self._revoked) * 2)
+            self._bloom = BloomFilter.from_items(self._revoked, capacity, self.error_rate)
+
+    def start(self, app):
+        """Poll the events table on a daemon thread, for the latest app passed in"""
+        self._app = app
+        if self._thread is not None:
+            return
+
+        def run():
+            while not self._stop.wait(self.poll_interval):
+                app = self._app
+                with app.app_context():
+                    try:
+                        self.sync()
+                    except Exception:
+                        db.session.rollback()
+                        app.logger.exception('Revocation sync failed')
+
+        self._thread = threading.Thread(target=run, name='revocation-sync', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            'revoked': len(self._revoked),
+            'bloom_bytes': self._bloom.size_bytes,
+            'bloom_hits': self.bloom_hits,
+            'false_positives': self.false_positives,
+            'last_event_id': self._last_id
+        }
+
+
+def _epoch(value):
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+revocation_set = RevocationSet()
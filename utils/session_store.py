@@ -0,0 +1,246 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from flask.sessions import SessionInterface
+from flask_session.sessions import ServerSideSession
+from itsdangerous import Signer, BadSignature, want_bytes
+from uuid import uuid4
+
+
+class ShardedSessionStore:
+    """Sharded in-memory session store persisted to a single SQLite file.
+
+    Reads are served from memory. Every write goes through to SQLite (WAL,
+    no fsync per commit) so sessions survive restarts and are visible to
+    other worker processes on the same host. Each shard keeps at most
+    ``max_entries / shards`` sessions in memory and evicts the least
+    recently used; evicted sessions are re-read from SQLite, or lost when
+    there is no file. A background compactor drops expired entries in
+    bulk from both tiers.
+    """
+
+    def __init__(self, path=None, shards=16, compact_interval=60, max_entries=100000):
+        self.path = path
+        self._shards = [(OrderedDict(), threading.Lock()) for _ in range(shards)]
+        self.shard_size = max(max_entries // shards, 1)
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._compactor = None
+        self._stop = threading.Event()
+        self.compact_interval = compact_interval
+        if path:
+            self._open_db(path)
+
+    def _open_db(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            'sid TEXT PRIMARY KEY, generation INTEGER NOT NULL, '
+            'expires REAL NOT NULL, data BLOB NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS ix_sessions_expires ON sessions (expires)')
+
+    def _shard(self, sid):
+        return self._shards[zlib.crc32(sid.encode('utf-8')) % len(self._shards)]
+
+    def get(self, sid, generation=None):
+        """Return (generation, data) or None.
+
+        When the caller knows the generation it last saw (from the cookie),
+        a memory entry of a different generation was written by another
+        worker and is re-read from SQLite.
+        """
+        now = time.time()
+        entries, lock = self._shard(sid)
+        with lock:
+            entry = entries.get(sid)
+            if entry is not None and entry[1] <= now:
+                del entries[sid]
+                entry = None
+            elif entry is not None:
+                entries.move_to_end(sid)
+        if entry is not None and (generation is None or entry[0] == generation):
+            return entry[0], pickle.loads(entry[2])
+        if self._db is None:
+            return None
+
+        with self._db_lock:
+            row = self._db.execute(
+                'SELECT generation, expires, data FROM sessions WHERE sid = ? AND expires > ?',
+                (sid, now)
+            ).fetchone()
+        if row is None:
+            return None
+        with lock:
+            self._put(entries, sid, (row[0], row[1], row[2]))
+        return row[0], pickle.loads(row[2])
+
+    def set(self, sid, data, ttl, generation):
+        expires = time.time() + ttl
+        blob = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+        entries, lock = self._shard(sid)
+        with lock:
+            self._put(entries, sid, (generation, expires, blob))
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO sessions (sid, generation, expires, data) VALUES (?, ?, ?, ?)',
+                    (sid, generation, expires, blob)
+                )
+
+    def _put(self, entries, sid, entry):
+        # Caller holds the shard lock
+        entries[sid] = entry
+        entries.move_to_end(sid)
+        while len(entries) > self.shard_size:
+            entries.popitem(last=False)
+
+    def delete(self, sid):
+        entries, lock = self._shard(sid)
+        with lock:
+            entries.pop(sid, None)
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+    def compact(self):
+        """Drop expired sessions from memory and disk, return how many"""
+        now = time.time()
+        removed = 0
+        for entries, lock in self._shards:
+            with lock:
+                expired = [sid for sid, entry in entries.items() if entry[1] <= now]
+                for sid in expired:
+                    del entries[sid]
+            removed += len(expired)
+        if self._db is not None:
+            with self._db_lock:
+                removed += self._db.execute('DELETE FROM sessions WHERE expires <= ?', (now,)).rowcount
+        return removed
+
+    def start_compactor(self):
+        """Run compact() periodically on a daemon thread"""
+        if self._compactor is not None or not self.compact_interval:
+            return
+
+        def run():
+            while not self._stop.wait(self.compact_interval):
+                self.compact()
+
+        self._compactor = threading.Thread(target=run, name='session-compactor', daemon=True)
+        self._compactor.start()
+
+    def stop_compactor(self):
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+
+    def close(self):
+        """Stop the compactor and release the SQLite file"""
+        self.stop_compactor()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+    def __len__(self):
+        return sum(len(entries) for entries, _ in self._shards)
+
+
+class ShardedSessionInterface(SessionInterface):
+    """Flask session interface backed by ShardedSessionStore.
+
+    The cookie carries a signed ``<sid>.<generation>`` value. The generation
+    is bumped on every write, which lets a worker tell whether its in-memory
+    copy is the one the client last saw.
+    """
+
+    session_class = ServerSideSession
+
+    def __init__(self, store, permanent=True):
+        self.store = store
+        self.permanent = permanent
+
+    def _get_signer(self, app):
+        return Signer(app.secret_key, salt='flask-session', key_derivation='hmac')
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(app.config['SESSION_COOKIE_NAME'])
+        if cookie:
+            try:
+                value = self._get_signer(app).unsign(cookie).decode()
+                sid, generation = value.rsplit('.', 1)
+                found = self.store.get(sid, int(generation))
+            except (BadSignature, ValueError):
+                found = None
+            if found is not None:
+                session = self.session_class(found[1], sid=sid)
+                session.generation = found[0]
+                return session
+
+        session = self.session_class(sid=str(uuid4()), permanent=self.permanent)
+        session.generation = 0
+        return session
+
+    def save_session(self, app, session, response):
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not session:
+            if session.modified:
+                self.store.delete(session.sid)
+                response.delete_cookie(app.config['SESSION_COOKIE_NAME'], domain=domain, path=path)
+            return
+        if not session.modified:
+            return
+
+        session.generation += 1
+        self.store.set(session.sid, dict(session),
+                       app.permanent_session_lifetime.total_seconds(), session.generation)
+        cookie = self._get_signer(app).sign(want_bytes('%s.%d' % (session.sid, session.generation)))
+        response.set_cookie(
+            app.config['SESSION_COOKIE_NAME'],
+            cookie.decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+
+
+_store = None
+
+
+def init_session_store(app):
+    """Install the sharded session backend on the app.
+
+    The store replaces the one from any earlier create_app call, whose
+    compactor is stopped first. SESSION_STORE_PATH defaults to a file in
+    the app's instance folder.
+    """
+    global _store
+    if _store is not None:
+        _store.close()
+    path = app.config.get('SESSION_STORE_PATH') or os.path.join(app.instance_path, 'sessions.sqlite3')
+    store = _store = ShardedSessionStore(
+        path=path,
+        shards=app.config.get('SESSION_SHARDS', 16),
+        compact_interval=app.config.get('SESSION_COMPACT_INTERVAL', 60),
+        max_entries=app.config.get('SESSION_MEMORY_SIZE', 100000)
+    )
+    store.start_compactor()
+    app.session_interface = ShardedSessionInterface(
+        store, permanent=app.config.get('SESSION_PERMANENT', True)
+    )
+    return store
@@ -0,0 +1,243 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: the shared tier is simply unavailable
+    fcntl = None
+
+MAGIC = b'SHC2'
+# magic, num_buckets, ways, slot_size, num_versions, value schema digest
+FILE_HEADER = struct.Struct('<4sIIII8s')
+FILE_HEADER_SIZE = 64
+# seq, owner, version, expires, ref, key_len, value_len
+SLOT_HEADER = struct.Struct('<IQQdBBH')
+REF_OFFSET = 28
+VERSION = struct.Struct('<Q')
+SEQ = struct.Struct('<I')
+
+
+class SharedCache:
+    """Host-wide cache shared by every worker through a memory-mapped file.
+
+    The file is a fixed-slot, set-associative hash table: a key hashes to
+    a bucket of ``ways`` slots, and a full bucket evicts with the clock
+    (second chance) policy. Each entry has an owner user_id and the owner's
+    version stamp at write time. Bumping the stamp invalidates all of that
+    user's entries in every process at once.
+
+    Writers serialize on an flock. Readers take no lock: each slot carries
+    a sequence number that is odd while a write is in progress, and a
+    read retries as a miss if it changed underneath.
+
+    The file name carries a digest of the table layout and of the value
+    schema the caller passes (the packed snapshot columns), so a deploy
+    that changes either starts on a new file. A file is never truncated
+    under workers that still have it mapped.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.ttl = 300
+        self._mm = None
+        self._fd = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app, schema=b''):
+        path = app.config.get('SHARED_CACHE_PATH')
+        if not path or fcntl is None:
+            self.enabled = False
+            return
+        self.ttl = app.config.get('SHARED_CACHE_TTL', self.ttl)
+        if hasattr(self.ttl, 'total_seconds'):
+            self.ttl = self.ttl.total_seconds()
+        try:
+            self.open(
+                path,
+                slots=app.config.get('SHARED_CACHE_SLOTS', 65536),
+                slot_size=app.config.get('SHARED_CACHE_SLOT_SIZE', 512),
+                schema=schema
+            )
+        except (OSError, ValueError):
+            # Run without the shared tier rather than trust an unknown file
+            app.logger.exception('Shared cache disabled')
+            self.close()
+
+    def open(self, path, slots=65536, slot_size=512, ways=8, schema=b''):
+        self.ways = ways
+        self.num_buckets = max(slots // ways, 1)
+        self.slot_size = slot_size
+        self.num_versions = self.num_buckets
+        self._slots_offset = FILE_HEADER_SIZE + self.num_versions * VERSION.size
+        self._hands_offset = self._slots_offset + self.num_buckets * ways * slot_size
+        size = self._hands_offset + self.num_buckets
+        self.close()
+
+        expected = FILE_HEADER.pack(MAGIC, self.num_buckets, ways, slot_size, self.num_versions,
+                                    hashlib.blake2b(schema, digest_size=8).digest())
+        self.path = '%s.%s' % (path, hashlib.blake2b(expected, digest_size=6).hexdigest())
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                current = os.pread(fd, FILE_HEADER.size, 0)
+                file_size = os.fstat(fd).st_size
+                if file_size == 0 or (file_size == size and not any(current)):
+                    # First worker on this layout; a zeroed table is empty
+                    os.ftruncate(fd, size)
+                    os.pwrite(fd, expected, 0)
+                elif current != expected or file_size != size:
+                    raise ValueError('%s does not hold a shared cache of this layout' % self.path)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            self._mm = mmap.mmap(fd, size)
+        except Exception:
+            os.close(fd)
+            raise
+        self._fd = fd
+        self.enabled = True
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            os.close(self._fd)
+        self._mm = None
+        self._fd = None
+        self.enabled = False
+
+    def get(self, key):
+        """Return (owner, value) for a live entry, or None"""
+        if not self.enabled:
+            return None
+        key = _key_bytes(key)
+        mm = self._mm
+        for offset in self._bucket_slots(key):
+            seq, owner, version, expires, ref, key_len, value_len = SLOT_HEADER.unpack_from(mm, offset)
+            if seq & 1 or key_len != len(key):
+                continue
+            start = offset + SLOT_HEADER.size
+            if mm[start:start + key_len] != key:
+                continue
+            value = mm[start + key_len:start + key_len + value_len]
+            if SEQ.unpack_from(mm, offset)[0] != seq:
+                break
+            if expires <= time.time() or version != self.version(owner):
+                break
+            if not ref:
+                mm[offset + REF_OFFSET] = 1
+            self.hits += 1
+            return owner, value
+        self.misses += 1
+        return None
+
+    def set(self, key, owner, value, ttl=None, version=None):
+        """Store value for key, stamped with the owner's version.
+
+        Pass the version read *before* loading the value so a concurrent
+        invalidation cannot be overwritten with stale data.
+        """
+        if not self.enabled:
+            return False
+        key = _key_bytes(key)
+        if SLOT_HEADER.size + len(key) + len(value) > self.slot_size or len(key) > 255:
+            return False
+        if version is None:
+            version = self.version(owner)
+        expires = time.time() + (ttl or self.ttl)
+
+        with self._locked():
+            offset = self._find_slot(key)
+            mm = self._mm
+            # Odd while the slot is rewritten; the even seq is stored last
+            seq = SEQ.unpack_from(mm, offset)[0] | 1
+            SEQ.pack_into(mm, offset, seq)
+            start = offset + SLOT_HEADER.size
+            mm[start:start + len(key)] = key
+            mm[start + len(key):start + len(key) + len(value)] = value
+            SLOT_HEADER.pack_into(mm, offset, seq, owner, version, expires, 0, len(key), len(value))
+            # 2**32 is even, so wrapping keeps the parity
+            SEQ.pack_into(mm, offset, (seq + 1) & 0xFFFFFFFF)
+        return True
+
+    def version(self, owner):
+        return VERSION.unpack_from(self._mm, self._version_offset(owner))[0]
+
+    def invalidate_user(self, owner):
+        """Bump the owner's version stamp, killing all of its entries everywhere"""
+        if not self.enabled:
+            return
+        with self._locked():
+            offset = self._version_offset(owner)
+            VERSION.pack_into(self._mm, offset, VERSION.unpack_from(self._mm, offset)[0] + 1)
+
+    def stats(self):
+        return {'enabled': int(self.enabled), 'hits': self.hits, 'misses': self.misses}
+
+    def _find_slot(self, key):
+        # Caller holds the lock. Prefer the key's own slot, then a dead one,
+        # then let the clock hand pick a victim.
+        now = time.time()
+        slots = list(self._bucket_slots(key))
+        free = None
+        for offset in slots:
+            _, owner, version, expires, _, key_len, _ = SLOT_HEADER.unpack_from(self._mm, offset)
+            start = offset + SLOT_HEADER.size
+            if key_len == len(key) and self._mm[start:start + key_len] == key:
+                return offset
+            if free is None and (key_len == 0 or expires <= now or version != self.version(owner)):
+                free = offset
+        if free is not None:
+            return free
+
+        hand_offset = self._hands_offset + self._bucket(key)
+        hand = self._mm[hand_offset]
+        while True:
+            offset = slots[hand % self.ways]
+            hand = (hand + 1) % self.ways
+            if self._mm[offset + REF_OFFSET]:
+                self._mm[offset + REF_OFFSET] = 0
+                continue
+            self._mm[hand_offset] = hand
+            return offset
+
+    def _bucket(self, key):
+        return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little') % self.num_buckets
+
+    def _bucket_slots(self, key):
+        base = self._slots_offset + self._bucket(key) * self.ways * self.slot_size
+        return range(base, base + self.ways * self.slot_size, self.slot_size)
+
+    def _version_offset(self, owner):
+        return FILE_HEADER_SIZE + (owner % self.num_versions) * VERSION.size
+
+    def _locked(self):
+        return _FileLock(self._lock, self._fd)
+
+
+class _FileLock:
+    # Thread lock for this process plus flock for the other workers
+    def __init__(self, lock, fd):
+        self.lock = lock
+        self.fd = fd
+
+    def __enter__(self):
+        self.lock.acquire()
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.lock.release()
+
+
+def _key_bytes(key):
+    return key.encode('utf-8') if isinstance(key, str) else key
+
+
+shared_cache = SharedCache()
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenCache:
+    """Bounded in-process LRU cache of verified access tokens.
+
+    Entries are keyed by token digest and hold the verified user_id and
+    token family together with a snapshot of the user row. An entry never outlives the token's own
+    ``exp`` claim, and all entries of a user are dropped as soon as that
+    user's tokens are deactivated.
+
+    Each entry also keeps the user's shared cache version from when it was
+    filled, so TokenManager can reject it once another worker revokes the
+    user's tokens. Without a shared cache there is no such signal, and a
+    revocation made in another worker is only seen after ``ttl`` seconds.
+    """
+
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # digest -> (expires_at, user_id, user_snapshot, family_id, version)
+        self._by_user = {}             # user_id -> set of digests
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        """Read cache sizing from the app config"""
+        self.max_size = app.config.get('TOKEN_CACHE_SIZE', self.max_size)
+        ttl = app.config.get('TOKEN_CACHE_TTL')
+        if ttl is not None:
+            self.ttl = ttl.total_seconds() if hasattr(ttl, 'total_seconds') else ttl
+        self.clear()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def get(self, digest):
+        """Return (user_id, user_snapshot, family_id, version) for a cached token or None"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= now:
+                self._remove(digest)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry[1:]
+
+    def set(self, digest, user_id, user_snapshot, token_exp, family_id=None, version=None):
+        """Cache a verified token until min(now + ttl, token exp)"""
+        if not self.enabled:
+            return
+        expires_at = min(time.time() + self.ttl, token_exp)
+        with self._lock:
+            if digest in self._entries:
+                self._remove(digest)
+            self._entries[digest] = (expires_at, user_id, user_snapshot, family_id, version)
+            self._by_user.setdefault(user_id, set()).add(digest)
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id):
+        """Drop every cached token belonging to a user"""
+        with self._lock:
+            for digest in self._by_user.pop(user_id, ()):
+                self._entries.pop(digest, None)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+    def _remove(self, digest):
+        # Caller must hold the lock
+        entry = self._entries.pop(digest, None)
+        if entry is None:
+            return
+        digests = self._by_user.get(entry[1])
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._by_user[entry[1]]
+
+
+token_cache = TokenCache()
@@ -1,59 +1,234 @@
-from datetime import datetime, timedelta
+from datetime import datetime
+import hashlib
+import struct
+import time
+import uuid
 import jwt
 from flask import current_app
-from models.user import UserToken, db
+from models.user import User, UserToken, RevocationEvent, db
+from services.user_service import UserService
+from utils.token_cache import token_cache
+from utils.metrics import metrics
+from utils.key_ring import key_ring
+from utils.revocation import revocation_set
+from utils.shared_cache import shared_cache
+from utils.db_routing import pin_primary
+
+# Shared cache value for a verified token: its exp claim and family id
+_TOKEN_RECORD = struct.Struct('<d16s')
 
 class TokenManager:
     @staticmethod
-    def generate_and_store_tokens(user_id):
-        """Generate and store both access and refresh tokens in the database"""
-        # Generate tokens
-        access_token = jwt.encode({
-            'user_id': user_id,
-            'exp': datetime.utcnow() + current_app.config['ACCESS_TOKEN_LIFETIME'],
-            'type': 'access'
-        }, current_app.config['SECRET_KEY'], algorithm='HS256')
-        
-        refresh_token = jwt.encode({
-            'user_id': user_id,
-            'exp': datetime.utcnow() + current_app.config['REFRESH_TOKEN_LIFETIME'],
-            'type': 'refresh'
-        }, current_app.config['SECRET_KEY'], algorithm='HS256')
+    def generate_and_store_tokens(user_id, commit=True):
+        """Start a new token family and return its access and refresh tokens.
+
+        The user's other families are revoked. With commit=False the caller
+        owns the transaction and must call UserService.invalidate(user_id)
+        once it has committed.
+        """
+        family_id = uuid.uuid4().hex
+        access_token = TokenManager.mint_access_token(user_id, family_id)
+        refresh_token, expires_at = TokenManager._refresh_token(user_id, family_id, 0)
         
-        # Deactivate old tokens
-        UserToken.query.filter_by(user_id=user_id, is_active=True).update({'is_active': False})
+        TokenManager._revoke_families(UserToken.user_id == user_id)
         
-        # Store new tokens
+        # Store the new family
         token = UserToken(
             user_id=user_id,
-            access_token=access_token,
-            refresh_token=refresh_token,
-            expires_at=datetime.utcnow() + current_app.config['REFRESH_TOKEN_LIFETIME']
+            family_id=family_id,
+            refresh_digest=TokenManager.token_digest(refresh_token),
+            generation=0,
+            expires_at=expires_at
         )
         db.session.add(token)
-        db.session.commit()
+        
+        if commit:
+            db.session.commit()
+            # Old tokens are no longer valid, drop them from the verify caches
+            UserService.invalidate(user_id)
         
         return access_token, refresh_token
     
+    @staticmethod
+    def mint_access_token(user_id, family_id):
+        """Sign an access token for an existing family, without touching the database"""
+        return TokenManager.encode({
+            'user_id': user_id,
+            'exp': datetime.utcnow() + current_app.config['ACCESS_TOKEN_LIFETIME'],
+            'type': 'access',
+            'fam': family_id,
+            'jti': uuid.uuid4().hex
+        })
+    
+    @staticmethod
+    def refresh(refresh_token):
+        """Rotate a refresh token: return ((access_token, refresh_token), None)
+        or (None, error) with error one of 'expired', 'invalid' or 'reused'.
+
+        The family row is advanced with a single compare-and-set UPDATE on
+        its generation. Presenting a refresh token from an older generation
+        means it was copied, so the whole family is revoked.
+        """
+        try:
+            payload = TokenManager.decode(refresh_token)
+        except jwt.ExpiredSignatureError:
+            return None, 'expired'
+        except jwt.InvalidTokenError:
+            return None, 'invalid'
+        if payload.get('type') != 'refresh' or 'fam' not in payload or 'gen' not in payload:
+            return None, 'invalid'
+        
+        user_id, family_id, generation = payload['user_id'], payload['fam'], payload['gen']
+        new_refresh, expires_at = TokenManager._refresh_token(user_id, family_id, generation + 1)
+        rotated = UserToken.query.filter_by(
+            family_id=family_id,
+            user_id=user_id,
+            generation=generation,
+            refresh_digest=TokenManager.token_digest(refresh_token),
+            is_active=True
+        ).update({
+            'generation': generation + 1,
+            'refresh_digest': TokenManager.token_digest(new_refresh),
+            'expires_at': expires_at
+        }, synchronize_session=False)
+        
+        if not rotated:
+            current = db.session.query(UserToken.generation, UserToken.is_active).filter_by(
+                family_id=family_id, user_id=user_id
+            ).first()
+            if current is None or not current.is_active or current.generation <= generation:
+                db.session.rollback()
+                return None, 'invalid'
+            # An already rotated token came back: assume theft, kill the family
+            TokenManager._revoke_families(UserToken.family_id == family_id)
+            db.session.commit()
+            UserService.invalidate(user_id)
+            return None, 'reused'
+        
+        db.session.commit()
+        return (TokenManager.mint_access_token(user_id, family_id), new_refresh), None
+    
+    @staticmethod
+    def _refresh_token(user_id, family_id, generation):
+        expires_at = datetime.utcnow() + current_app.config['REFRESH_TOKEN_LIFETIME']
+        token = TokenManager.encode({
+            'user_id': user_id,
+            'exp': expires_at,
+            'type': 'refresh',
+            'fam': family_id,
+            'gen': generation,
+            'jti': uuid.uuid4().hex
+        })
+        return token, expires_at
+    
+    @staticmethod
+    def _revoke_families(criterion):
+        """Deactivate the active families matching criterion, in the current transaction"""
+        if current_app.config.get('TOKEN_VERIFICATION_MODE') == 'stateless':
+            # Stateless verifiers learn about the deactivation from the event log
+            now = datetime.utcnow()
+            revoked = db.select(
+                UserToken.family_id,
+                db.literal(now + current_app.config['ACCESS_TOKEN_LIFETIME'], db.DateTime),
+                db.literal(now, db.DateTime)
+            ).where(criterion, UserToken.is_active == True)
+            db.session.execute(db.insert(RevocationEvent).from_select(
+                ['family_id', 'expires_at', 'created_at'], revoked
+            ))
+        UserToken.query.filter(criterion, UserToken.is_active == True).update(
+            {'is_active': False}, synchronize_session=False
+        )
+    
     @staticmethod
     def verify_token(token, token_type='access'):
         """Verify token and return user_id if valid"""
+        user_id, _ = TokenManager.authenticate(token, token_type)
+        return user_id
+    
+    @staticmethod
+    def authenticate(token, token_type='access'):
+        """Verify token and return (user_id, user).
+
+        A token is valid while its family is active. Verified access tokens
+        are served from the in-process token cache, then from the host-wide
+        shared cache, so a hit costs neither the family lookup nor the user
+        lookup. A token cache entry is only trusted while the user's shared
+        cache version is the one it was filled under, so a revocation in
+        any worker takes effect on the next request.
+        """
+        digest = TokenManager.token_digest(token)
+        stateless = token_type == 'access' and \
+            current_app.config.get('TOKEN_VERIFICATION_MODE') == 'stateless'
+        if token_type == 'access':
+            cached = token_cache.get(digest)
+            if cached is not None:
+                user_id, snapshot, family_id, version = cached
+                if stateless and revocation_set.is_revoked(family_id):
+                    return None, None
+                if not shared_cache.enabled or shared_cache.version(user_id) == version:
+                    user = User.from_snapshot(snapshot)
+                    UserService.remember(user)
+                    return user_id, user
+            shared = shared_cache.get('t:' + digest)
+            if shared is not None:
+                user_id, record = shared
+                exp, family = _TOKEN_RECORD.unpack(record)
+                if stateless and revocation_set.is_revoked(family.hex()):
+                    return None, None
+                version = shared_cache.version(user_id)
+                user = UserService.get_user(user_id)
+                if user:
+                    token_cache.set(digest, user_id, user.to_snapshot(), exp, family.hex(), version)
+                    return user_id, user
+        
         try:
-            payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-            if payload.get('type') != token_type:
-                return None
-                
-            # Check if token exists and is active in database
-            stored_token = UserToken.query.filter_by(
-                user_id=payload.get('user_id'),
-                is_active=True
-            ).first()
+            payload = TokenManager.decode(token)
+            if payload.get('type') != token_type or 'jti' not in payload or 'fam' not in payload:
+                return None, None
             
-            if not stored_token:
-                return None
+            user_id = payload.get('user_id')
+            family_id = payload['fam']
+            if stateless and revocation_set.is_revoked(family_id):
+                return None, None
+            # Read before the lookups so a concurrent revoke wins over this fill
+            version = shared_cache.version(user_id) if shared_cache.enabled else None
                 
-            return payload.get('user_id')
+            if not stateless:
+                # Point lookup of the token's family; refresh tokens must also be the current one
+                lookup = {'family_id': family_id, 'user_id': user_id, 'is_active': True}
+                if token_type == 'refresh':
+                    lookup['refresh_digest'] = digest
+                # A lagging replica could still show a revoked family as active
+                pin_primary(db.session)
+                stored_token = db.session.query(UserToken.id).filter_by(**lookup).first()
+                
+                if not stored_token:
+                    return None, None
+            
+            user = UserService.get_user(user_id)
+            if user and token_type == 'access':
+                token_cache.set(digest, user_id, user.to_snapshot(), payload['exp'], family_id, version)
+                shared_cache.set('t:' + digest, user_id,
+                                 _TOKEN_RECORD.pack(payload['exp'], bytes.fromhex(family_id)),
+                                 ttl=min(shared_cache.ttl, payload['exp'] - time.time()),
+                                 version=version)
+            return user_id, user
         except jwt.ExpiredSignatureError:
-            return 'expired'
+            return 'expired', None
         except jwt.InvalidTokenError:
-            return None
+            return None, None
+    
+    @staticmethod
+    @metrics.timed('jwt_encode')
+    def encode(payload):
+        return key_ring.encode(payload)
+    
+    @staticmethod
+    @metrics.timed('jwt_decode')
+    def decode(token):
+        return key_ring.decode(token)
+    
+    @staticmethod
+    def token_digest(token):
+        """Fixed-size digest used to key tokens"""
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()